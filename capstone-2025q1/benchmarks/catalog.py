@@ -0,0 +1,109 @@
+"""
+Synthetic catalog generator for the benchmarks
+
+Scales ./data/sample_data.csv to an arbitrary number of rows. The original rows
+are always kept first and unchanged, so queries such as "Carrot" / "FreshFarm"
+hit the same products at every catalog size.
+"""
+
+import math
+import os
+
+import numpy as np
+import pandas as pd
+
+BASE_DATA_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "data",
+    "sample_data.csv",
+)
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+
+# fmt: off
+# Words used to derive new product types from the base ones (e.g. "Organic Carrot")
+PRODUCT_MODIFIERS = [
+    "Organic", "Baby", "Premium", "Classic", "Fresh", "Mini", "Family Size",
+    "Low Fat", "Spicy", "Sweet", "Smoked", "Wild", "Heirloom", "Value",
+    "Gourmet", "Light", "Extra", "Seasonal", "Local", "Imported",
+]
+
+# Suffixes used to derive new brands from the base ones (e.g. "FreshFarm Select")
+BRAND_SUFFIXES = [
+    "Select", "Organics", "Market", "Kitchen", "Harvest", "Reserve", "Basics",
+    "Gold", "Farms", "Pantry", "Choice",
+]
+# fmt: on
+
+# Number of brands sold for every synthetic product type
+BRANDS_PER_PRODUCT = 8
+
+CATALOG_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+
+
+def generate_catalog(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Builds a catalog with n_rows rows and the same columns as sample_data.csv.
+
+    Args:
+        n_rows (int): Number of rows in the generated catalog.
+        seed (int, optional): Seed for ratings, reviews, prices and stock. Default is 0.
+
+    Returns:
+        pd.DataFrame: The generated catalog.
+    """
+    base = pd.read_csv(BASE_DATA_PATH)
+    if n_rows <= len(base):
+        return base.head(n_rows).reset_index(drop=True)
+
+    rng = np.random.default_rng(seed)
+    base_products = base.drop_duplicates("product_type").reset_index(drop=True)
+    base_brands = base["product_brand"].unique().tolist()
+    brand_pool = base_brands + [
+        f"{brand} {suffix}" for suffix in BRAND_SUFFIXES for brand in base_brands
+    ]
+
+    # Derive new product types: "<modifier> <base product>[ <serial>]"
+    extra_rows = n_rows - len(base)
+    n_products = math.ceil(extra_rows / BRANDS_PER_PRODUCT)
+    product_idx = np.arange(n_products)
+    parent = product_idx % len(base_products)
+    variant = product_idx // len(base_products)
+    modifier = variant % len(PRODUCT_MODIFIERS)
+    serial = variant // len(PRODUCT_MODIFIERS)
+    product_names = [
+        f"{PRODUCT_MODIFIERS[m]} {base_products.at[p, 'product_type']}"
+        + (f" {s + 1}" if s else "")
+        for p, m, s in zip(parent, modifier, serial)
+    ]
+
+    # Every product is sold by BRANDS_PER_PRODUCT distinct brands
+    row_product = np.repeat(product_idx, BRANDS_PER_PRODUCT)[:extra_rows]
+    row_slot = np.tile(np.arange(BRANDS_PER_PRODUCT), n_products)[:extra_rows]
+    row_brand = (row_product * 7 + row_slot) % len(brand_pool)
+    row_parent = parent[row_product]
+
+    base_price = base_products["product_price"].to_numpy()[row_parent]
+    extra = pd.DataFrame(
+        {
+            "category_type": base_products["category_type"].to_numpy()[row_parent],
+            "product_type": np.asarray(product_names, dtype=object)[row_product],
+            "product_brand": np.asarray(brand_pool, dtype=object)[row_brand],
+            "product_rating": np.round(rng.uniform(3.0, 5.0, extra_rows), 1),
+            "product_review": rng.lognormal(4.5, 1.0, extra_rows).astype(int) + 1,
+            "product_price": np.round(
+                base_price * rng.uniform(0.6, 1.8, extra_rows), 2
+            ),
+            "product_stock": rng.integers(20, 500, extra_rows),
+        }
+    )
+    return pd.concat([base, extra], ignore_index=True)
+
+
+def write_catalog(n_rows: int, seed: int = 0, directory: str = CACHE_DIR) -> str:
+    """Writes (or reuses) a generated catalog as CSV and returns its path"""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"catalog_{n_rows}_{seed}.csv")
+    if not os.path.exists(path):
+        print(f"[INFO] Generating synthetic catalog with {n_rows} rows -> {path}")
+        generate_catalog(n_rows, seed).to_csv(path, index=False)
+    return path
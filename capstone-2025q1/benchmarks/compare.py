@@ -0,0 +1,101 @@
+"""
+Compares stored benchmark results between two commits
+
+Usage (from capstone-2025q1):
+    python -m benchmarks.compare graph
+    python -m benchmarks.compare graph --base abc1234 --head def5678
+    python -m benchmarks.compare tools --gate --threshold 15
+"""
+
+import argparse
+import json
+import sys
+
+from benchmarks.results import flatten, load_results
+
+# Metrics where a larger value is an improvement (everything else: smaller is better)
+HIGHER_IS_BETTER = ("ops_per_sec", "turns_per_sec")
+# Metrics that describe the run rather than its performance
+IGNORED_METRICS = ("count", "turns", "sessions")
+
+
+def is_regression(name, change, threshold):
+    """Returns True if a relative change of a metric is worse than the threshold"""
+    leaf = name.rsplit(".", 1)[-1]
+    if leaf in IGNORED_METRICS:
+        return False
+    if leaf in HIGHER_IS_BETTER:
+        return change <= -threshold
+    return change >= threshold
+
+
+def latest_by_params(records, commit):
+    """Returns {params key: metrics} of the latest run of every param set on a commit"""
+    latest = {}
+    for record in records:
+        if record["commit"] == commit:
+            latest[json.dumps(record["params"], sort_keys=True)] = record["metrics"]
+    return latest
+
+
+def compare(suite: str, base: str = None, head: str = None, threshold: float = 10.0):
+    """
+    Prints the relative change of every metric between two commits.
+
+    Changes larger than threshold percent are marked with '!', and regressions
+    with 'R'. If base / head are not given, the two most recent commits with
+    results are used.
+
+    Returns:
+        int: Number of regressions found.
+    """
+    records = load_results(suite)
+    commits = list(dict.fromkeys(record["commit"] for record in records))
+    if head is None:
+        head = commits[-1] if commits else None
+    if base is None:
+        older = [c for c in commits if c != head]
+        base = older[-1] if older else None
+    if not base or not head:
+        print(f"[INFO] Need results from two commits to compare (found: {commits})")
+        return 0
+
+    base_runs = latest_by_params(records, base)
+    head_runs = latest_by_params(records, head)
+    print(f"[INFO] Suite '{suite}': {base} -> {head}")
+    regressions = 0
+    for key in base_runs.keys() & head_runs.keys():
+        print(f"\n  params: {key}")
+        base_metrics = flatten(base_runs[key])
+        head_metrics = flatten(head_runs[key])
+        for name in sorted(base_metrics.keys() & head_metrics.keys()):
+            old, new = base_metrics[name], head_metrics[name]
+            change = (new - old) / old * 100 if old else 0.0
+            flag = "!" if abs(change) >= threshold else " "
+            if is_regression(name, change, threshold):
+                flag = "R"
+                regressions += 1
+            print(f"  {flag} {name:<48} {old:>14.3f} {new:>14.3f} {change:>+8.1f}%")
+    print(f"\n[INFO] {regressions} regression(s) above {threshold}%")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("suite", help="Result suite name (e.g. 'graph', 'tools')")
+    parser.add_argument("--base", help="Base commit (default: previous commit)")
+    parser.add_argument("--head", help="Head commit (default: latest commit)")
+    parser.add_argument(
+        "--threshold", type=float, default=10.0, help="Flag changes above this %%"
+    )
+    parser.add_argument(
+        "--gate", action="store_true", help="Exit with status 1 on any regression"
+    )
+    args = parser.parse_args()
+    regressions = compare(args.suite, args.base, args.head, args.threshold)
+    if args.gate and regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
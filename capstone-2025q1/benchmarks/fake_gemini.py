@@ -0,0 +1,305 @@
+"""
+Local fake of the Gemini REST API for the benchmarks
+
+Serves `POST /v1beta/models/<model>:generateContent` with a short text answer and
+enforces requests/tokens-per-minute quotas over a sliding window, answering 429
+(RESOURCE_EXHAUSTED) when they are exceeded. It can also inject random 503s and
+latency. Point the chatbot at it with CHATBOT_LLM_ENDPOINT=http://127.0.0.1:<port>.
+
+The context-caching API is served too (`/v1beta/cachedContents`: create, get,
+update of the TTL, delete). A generateContent request that references a cache
+is billed the cached tokens as `cachedContentTokenCount`, and only the uncached
+tokens add prefill latency; an unknown or expired cache is answered with 403,
+like the real API.
+"""
+
+import datetime
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeGeminiServer:
+    """Fake Gemini endpoint with quota enforcement, running in a background thread"""
+
+    def __init__(
+        self,
+        requests_per_minute=0,
+        tokens_per_minute=0,
+        window_seconds=60.0,
+        latency_ms=0.0,
+        error_rate=0.0,
+        seed=0,
+        port=0,
+        prefill_ms_per_1k_tokens=0.0,
+        min_cache_tokens=0,
+    ):
+        # Quotas are scaled to the window (0 = unlimited)
+        scale = window_seconds / 60.0
+        self.request_limit = requests_per_minute * scale
+        self.token_limit = tokens_per_minute * scale
+        self.window_seconds = window_seconds
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.prefill_ms_per_1k_tokens = prefill_ms_per_1k_tokens
+        self.min_cache_tokens = min_cache_tokens
+        self.stats = {
+            "requests": 0,
+            "ok": 0,
+            "rate_limited": 0,
+            "unavailable": 0,
+            "input_tokens": 0,
+            "cached_tokens": 0,
+            "caches_created": 0,
+            "cache_misses": 0,
+        }
+        self._caches = {}  # name -> {"tokens", "expires", "model"}
+        self._cache_ids = itertools.count(1)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._window = deque()  # (timestamp, tokens) of accepted requests
+        self._window_tokens = 0
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def admit(self, tokens):
+        """Returns the HTTP status for a request of the given size"""
+        now = time.monotonic()
+        with self._lock:
+            self.stats["requests"] += 1
+            while self._window and now - self._window[0][0] > self.window_seconds:
+                self._window_tokens -= self._window.popleft()[1]
+            if (self.request_limit and len(self._window) + 1 > self.request_limit) or (
+                self.token_limit and self._window_tokens + tokens > self.token_limit
+            ):
+                self.stats["rate_limited"] += 1
+                return 429
+            if self.error_rate and self._random.random() < self.error_rate:
+                self.stats["unavailable"] += 1
+                return 503
+            self._window.append((now, tokens))
+            self._window_tokens += tokens
+            self.stats["ok"] += 1
+            return 200
+
+    def respond(self, request, cached_tokens=0):
+        """Builds a generateContent response for a request body"""
+        prompt_tokens = prompt_size(request)
+        text = "This is a reply from the fake Gemini server."
+        with self._lock:
+            self.stats["input_tokens"] += prompt_tokens
+            self.stats["cached_tokens"] += cached_tokens
+        return {
+            "candidates": [
+                {
+                    "content": {"role": "model", "parts": [{"text": text}]},
+                    "finishReason": "STOP",
+                }
+            ],
+            "usageMetadata": {
+                "promptTokenCount": prompt_tokens + cached_tokens,
+                "cachedContentTokenCount": cached_tokens,
+                "candidatesTokenCount": len(text) // 4,
+                "totalTokenCount": prompt_tokens + cached_tokens + len(text) // 4,
+            },
+        }
+
+    # --- Context caching ---
+    def create_cache(self, body):
+        """Stores a cached prefix; returns (status, CachedContent or error)"""
+        tokens = prompt_size(body)
+        if tokens < self.min_cache_tokens:
+            return 400, (
+                f"Cached content is too small. total_token_count={tokens}, "
+                f"min_total_token_count={self.min_cache_tokens}",
+                "INVALID_ARGUMENT",
+            )
+        with self._lock:
+            name = f"cachedContents/fake-{next(self._cache_ids)}"
+            self._caches[name] = {
+                "tokens": tokens,
+                "expires": time.time() + parse_ttl(body),
+                "model": body.get("model", ""),
+            }
+            self.stats["caches_created"] += 1
+        return 200, self._cache_resource(name)
+
+    def update_cache(self, name, body):
+        with self._lock:
+            cache = self._live_cache(name)
+            if cache is None:
+                return 403, (_CACHE_NOT_FOUND, "PERMISSION_DENIED")
+            cache["expires"] = time.time() + parse_ttl(body)
+        return 200, self._cache_resource(name)
+
+    def get_cache(self, name):
+        with self._lock:
+            if self._live_cache(name) is None:
+                return 403, (_CACHE_NOT_FOUND, "PERMISSION_DENIED")
+        return 200, self._cache_resource(name)
+
+    def delete_cache(self, name):
+        with self._lock:
+            self._caches.pop(name, None)
+        return 200, {}
+
+    def expire_cache(self, name):
+        """Expires a cache immediately (to test recovery)"""
+        with self._lock:
+            if name in self._caches:
+                self._caches[name]["expires"] = 0.0
+
+    def cached_tokens(self, name):
+        """Returns the token count of a live cache, or None"""
+        with self._lock:
+            cache = self._live_cache(name)
+            if cache is None:
+                self.stats["cache_misses"] += 1
+                return None
+            return cache["tokens"]
+
+    def _live_cache(self, name):
+        cache = self._caches.get(name)
+        if cache is not None and cache["expires"] <= time.time():
+            del self._caches[name]
+            cache = None
+        return cache
+
+    def _cache_resource(self, name):
+        with self._lock:
+            cache = self._caches[name]
+            expires = datetime.datetime.fromtimestamp(
+                cache["expires"], datetime.timezone.utc
+            )
+            return {
+                "name": name,
+                "model": cache["model"],
+                "expireTime": expires.strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+                "usageMetadata": {"totalTokenCount": cache["tokens"]},
+            }
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, so pooled connections are reused
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                request = json.loads(body or b"{}")
+                if self._cache_name() == "":
+                    self._send_result(*server.create_cache(request))
+                    return
+                cached_tokens = 0
+                if request.get("cachedContent"):
+                    cached_tokens = server.cached_tokens(request["cachedContent"])
+                    if cached_tokens is None:
+                        self._send_error(403, _CACHE_NOT_FOUND, "PERMISSION_DENIED")
+                        return
+                status = server.admit(max(1, len(body) // 4))
+                if status == 200:
+                    # Only the uncached part of the prompt costs prefill time
+                    delay_ms = server.latency_ms + (
+                        server.prefill_ms_per_1k_tokens * prompt_size(request) / 1000
+                    )
+                    if delay_ms:
+                        time.sleep(delay_ms / 1000)
+                    self._send(200, server.respond(request, cached_tokens))
+                elif status == 429:
+                    self._send_error(
+                        429,
+                        "Resource has been exhausted (e.g. check quota).",
+                        "RESOURCE_EXHAUSTED",
+                    )
+                else:
+                    self._send_error(503, "The model is overloaded.", "UNAVAILABLE")
+
+            def do_PATCH(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                name = self._cache_name()
+                request = json.loads(body or b"{}")
+                self._send_result(*server.update_cache(name, request))
+
+            def do_GET(self):
+                self._send_result(*server.get_cache(self._cache_name()))
+
+            def do_DELETE(self):
+                self._send_result(*server.delete_cache(self._cache_name()))
+
+            def _cache_name(self):
+                """Returns the cache name of a cachedContents path ("" = collection)"""
+                match = re.match(r"/v1beta/(cachedContents(?:/[^/?:]+)?)", self.path)
+                if not match:
+                    return None
+                return match.group(1) if "/" in match.group(1) else ""
+
+            def _send_result(self, code, result):
+                if code == 200:
+                    self._send(200, result)
+                else:
+                    self._send_error(code, *result)
+
+            def _send_error(self, code, message, status):
+                error = {"code": code, "message": message, "status": status}
+                self._send(code, {"error": error})
+
+            def _send(self, code, payload):
+                data = json.dumps(payload).encode()
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+_CACHE_NOT_FOUND = "CachedContent not found (or permission denied)"
+
+
+def prompt_size(request):
+    """Token estimate of the prompt parts of a request body (4 characters per token)"""
+    parts = {
+        key: request.get(key)
+        for key in ("contents", "systemInstruction", "tools", "toolConfig")
+        if request.get(key)
+    }
+    return max(1, len(json.dumps(parts)) // 4)
+
+
+def parse_ttl(body, default=3600.0):
+    """Returns the lifetime in seconds of a CachedContent body ("300s" or expireTime)"""
+    if body.get("ttl"):
+        return float(str(body["ttl"]).rstrip("s"))
+    if body.get("expireTime"):
+        expire_time = body["expireTime"].replace("Z", "+00:00")
+        return datetime.datetime.fromisoformat(expire_time).timestamp() - time.time()
+    return default
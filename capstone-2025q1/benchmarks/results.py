@@ -0,0 +1,95 @@
+"""
+Result storage for the benchmarks
+
+Every run is appended to ./benchmarks/results/<suite>.jsonl together with the git
+commit it was measured on, so runs of different commits can be compared with
+`python -m benchmarks.compare <suite>`.
+"""
+
+import json
+import math
+import os
+import subprocess
+import time
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def git_revision():
+    """Returns (short commit hash, dirty flag) of the working tree"""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+        dirty = bool(
+            subprocess.run(
+                ["git", "status", "--porcelain", "--untracked-files=no"],
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout.strip()
+        )
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", False
+
+
+def summarize(samples_ms):
+    """Returns count / mean / percentiles of a list of latencies in milliseconds"""
+    if not samples_ms:
+        return {"count": 0}
+    ordered = sorted(samples_ms)
+
+    def percentile(p):
+        index = min(len(ordered) - 1, max(0, math.ceil(p / 100 * len(ordered)) - 1))
+        return round(ordered[index], 3)
+
+    return {
+        "count": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered), 3),
+        "p50_ms": percentile(50),
+        "p95_ms": percentile(95),
+        "p99_ms": percentile(99),
+        "max_ms": round(ordered[-1], 3),
+    }
+
+
+def save_result(suite: str, params: dict, metrics: dict) -> dict:
+    """Appends one benchmark result to the suite's result file and returns it"""
+    commit, dirty = git_revision()
+    record = {
+        "suite": suite,
+        "commit": commit,
+        "dirty": dirty,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "params": params,
+        "metrics": metrics,
+    }
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    with open(os.path.join(RESULTS_DIR, f"{suite}.jsonl"), "a", encoding="utf-8") as f:
+        f.write(json.dumps(record) + "\n")
+    return record
+
+
+def load_results(suite: str):
+    """Loads all stored results of a suite (oldest first)"""
+    path = os.path.join(RESULTS_DIR, f"{suite}.jsonl")
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def flatten(metrics: dict, prefix: str = ""):
+    """Flattens nested metric dicts into {'a.b.c': number}"""
+    flat = {}
+    for key, value in metrics.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{name}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
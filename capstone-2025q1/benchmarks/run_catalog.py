@@ -0,0 +1,96 @@
+"""
+Benchmark of the catalog representation: untyped pd.read_csv vs the typed schema
+
+For every catalog size, loads the generated CSV once as plain pd.read_csv
+(object strings, float64/int64 numbers) and once with the loader's schema
+(categorical strings, float32/int32 numbers). Reports resident bytes per SKU,
+load time, the time to build the equality index of a string column, and an
+equality lookup through the index and through a pandas string filter.
+
+Usage (from capstone-2025q1):
+    python -m benchmarks.run_catalog
+    python -m benchmarks.run_catalog --sizes 1000,100000 --repeats 20
+"""
+
+import argparse
+import contextlib
+import io
+import time
+
+import pandas as pd
+
+from benchmarks.catalog import CATALOG_SIZES, write_catalog
+from benchmarks.results import save_result, summarize
+
+with contextlib.redirect_stdout(io.StringIO()):
+    from chatbot.data_loader import catalog_memory_report, load_catalog
+    from chatbot.query import CatalogIndex
+
+
+def timed(func, repeats):
+    """Returns the result of func and the latency summary of repeats calls"""
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return result, summarize(samples)
+
+
+def measure(mode, path, repeats):
+    start = time.perf_counter()
+    if mode == "typed":
+        frame, _ = load_catalog(path)
+    else:
+        frame = pd.read_csv(path)
+    load_ms = (time.perf_counter() - start) * 1000
+
+    # Index build (first use of a column) and lookups of one product type
+    _, build = timed(lambda: CatalogIndex(frame).key_positions("product_type"), 3)
+    index = CatalogIndex(frame)
+    positions, lookup = timed(lambda: index.positions("product_type", "milk"), repeats)
+    column = frame["product_type"]
+    _, scan = timed(lambda: frame[column.str.lower() == "milk"], repeats)
+    return {
+        "memory": catalog_memory_report(frame),
+        "load_ms": round(load_ms, 3),
+        "index_build": build,
+        "index_lookup": lookup,
+        "pandas_filter": scan,
+        "matches": len(positions),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--sizes",
+        default=",".join(str(s) for s in CATALOG_SIZES),
+        help="Comma-separated catalog sizes (rows)",
+    )
+    parser.add_argument("--modes", default="untyped,typed", help="untyped,typed")
+    parser.add_argument("--repeats", type=int, default=10, help="Lookups per mode")
+    parser.add_argument("--seed", type=int, default=0, help="Catalog generator seed")
+    parser.add_argument("--no-save", action="store_true", help="Do not store results")
+    args = parser.parse_args()
+
+    for size in (int(s) for s in args.sizes.split(",")):
+        path = write_catalog(size, args.seed)
+        print(f"\n=== catalog rows: {size} ===")
+        for mode in args.modes.split(","):
+            metrics = measure(mode, path, args.repeats)
+            memory = metrics["memory"]
+            print(
+                f"{mode:<8} {memory['bytes_per_sku']:>7.1f} B/SKU "
+                f"({memory['bytes'] / 2**20:.1f} MiB)  load {metrics['load_ms']:.0f} ms  "
+                f"index build {metrics['index_build']['p50_ms']:.1f} ms  "
+                f"lookup {metrics['index_lookup']['p50_ms']:.4f} ms  "
+                f"pandas filter {metrics['pandas_filter']['p50_ms']:.2f} ms"
+            )
+            if not args.no_save:
+                params = {"rows": size, "mode": mode, "seed": args.seed}
+                save_result("catalog", params, metrics)
+
+
+if __name__ == "__main__":
+    main()
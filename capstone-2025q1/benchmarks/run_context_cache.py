@@ -0,0 +1,127 @@
+"""
+Benchmark of context caching against a local fake Gemini server
+
+Replays the user messages of the conversation scripts as chat sessions with the
+real system prompt and tool declarations, once sending the full prompt on every
+request and once referencing the prefix cached with the context-caching API.
+Reports per-turn billed input tokens and latency for both modes.
+
+Usage (from capstone-2025q1):
+    python -m benchmarks.run_context_cache
+    python -m benchmarks.run_context_cache --sessions 5 --prefill-ms 50 --expire-turn 10
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import time
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from benchmarks.fake_gemini import FakeGeminiServer
+from benchmarks.results import save_result, summarize
+from benchmarks.scripts import list_scripts, load_script
+
+os.environ.setdefault("GOOGLE_API_KEY", "fake-key")  # The fake server ignores it
+
+# Price of a cached input token relative to a regular one (Gemini: 25%)
+CACHED_TOKEN_RATE = 0.25
+
+
+def run_mode(mode, user_turns, args):
+    from chatbot.configs import SYSTEM_PROMPT
+    from chatbot.gateway import LLMGateway
+    from chatbot.llm import ContextCache, create_llm
+    from chatbot.tools import all_tools
+
+    server = FakeGeminiServer(
+        latency_ms=args.latency_ms, prefill_ms_per_1k_tokens=args.prefill_ms
+    )
+    with server, contextlib.redirect_stdout(io.StringIO()):
+        model = create_llm(api_endpoint=server.url)
+        gateway = LLMGateway()
+        model_with_tools = model.bind_tools(all_tools)
+        cache = None
+        if mode == "cached":
+            cache = ContextCache(model, SYSTEM_PROMPT, all_tools)
+
+        latencies, uncached_tokens, cached_tokens = [], [], []
+        turn = 0
+        for _ in range(args.sessions):
+            messages = [SystemMessage(content=SYSTEM_PROMPT)]
+            for text in user_turns:
+                turn += 1
+                if cache and turn == args.expire_turn and cache.name:
+                    server.expire_cache(cache.name)  # Simulates a server-side expiry
+                messages.append(HumanMessage(content=text))
+                start = time.perf_counter()
+                if cache:
+                    response = cache.invoke(gateway, messages, model_with_tools)
+                else:
+                    response = gateway.invoke(model_with_tools, messages)
+                latencies.append((time.perf_counter() - start) * 1000)
+                usage = response.usage_metadata or {}
+                cache_read = usage.get("input_token_details", {}).get("cache_read", 0)
+                uncached_tokens.append(usage.get("input_tokens", 0) - cache_read)
+                cached_tokens.append(cache_read)
+                messages.append(AIMessage(content=response.content))
+        if cache:
+            cache.close()
+
+    billed = [u + CACHED_TOKEN_RATE * c for u, c in zip(uncached_tokens, cached_tokens)]
+    return {
+        "turns": len(latencies),
+        "latency": summarize(latencies),
+        "uncached_input_tokens_per_turn": round(sum(uncached_tokens) / turn, 1),
+        "cached_input_tokens_per_turn": round(sum(cached_tokens) / turn, 1),
+        "billed_input_tokens_per_turn": round(sum(billed) / turn, 1),
+        "first_turn_billed_input_tokens": billed[0],
+        "server": dict(server.stats),
+        "cache": dict(cache.stats) if cache else {},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--modes", default="uncached,cached", help="uncached,cached")
+    parser.add_argument("--scripts", default=",".join(list_scripts()))
+    parser.add_argument("--sessions", type=int, default=3, help="Sessions per mode")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Base latency")
+    parser.add_argument(
+        "--prefill-ms", type=float, default=20.0, help="Latency per 1k uncached tokens"
+    )
+    parser.add_argument(
+        "--expire-turn", type=int, default=0, help="Expire the cache at this turn"
+    )
+    parser.add_argument("--no-save", action="store_true", help="Do not store results")
+    args = parser.parse_args()
+
+    user_turns = [
+        turn["user"]
+        for name in args.scripts.split(",")
+        for turn in load_script(name)["turns"]
+    ]
+    for mode in args.modes.split(","):
+        metrics = run_mode(mode, user_turns, args)
+        print(f"\n=== {mode} ({metrics['turns']} turns) ===")
+        print(
+            f"input tokens   {metrics['uncached_input_tokens_per_turn']:.0f} "
+            f"uncached + {metrics['cached_input_tokens_per_turn']:.0f} cached per turn -> "
+            f"{metrics['billed_input_tokens_per_turn']:.0f} billed "
+            f"(cached at {CACHED_TOKEN_RATE:.0%})"
+        )
+        latency = metrics["latency"]
+        print(
+            f"latency        p50 {latency['p50_ms']:.1f} ms  "
+            f"p95 {latency['p95_ms']:.1f} ms"
+        )
+        if metrics["cache"]:
+            print(f"cache          {metrics['cache']}")
+        if not args.no_save:
+            params = {k: v for k, v in vars(args).items() if k not in ("modes", "no_save")}
+            save_result("context_cache", dict(params, mode=mode), metrics)
+
+
+if __name__ == "__main__":
+    main()
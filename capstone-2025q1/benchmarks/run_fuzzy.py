@@ -0,0 +1,186 @@
+"""
+Benchmark of fuzzy matching in the serving threads vs. in a process pool
+
+For every catalog size, misspelled product names (a letter dropped from catalog
+products) are matched against the product column with chatbot.fuzzy.FuzzyMatcher,
+once in the calling thread and once in a process pool. Reports:
+
+- cold (uncached) and cached lookup latency
+- responsiveness: while typo sessions run cold lookups back to back, I/O
+  sessions sleep io-ms in a loop (like a session waiting for the model) and
+  record how late they wake up; lookups per second of the typo sessions
+
+Usage (from capstone-2025q1):
+    python -m benchmarks.run_fuzzy
+    python -m benchmarks.run_fuzzy --sizes 100000,1000000 --pool-workers 2 --typo-sessions 4
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import random
+import threading
+import time
+
+from benchmarks.catalog import CATALOG_SIZES
+from benchmarks.results import save_result, summarize
+from benchmarks.worker import run_worker_process
+
+
+def typos(keys, n, seed):
+    """n distinct misspellings of random catalog values (one letter dropped)"""
+    rng = random.Random(seed)
+    result = set()
+    while len(result) < n:
+        key = rng.choice(keys)
+        if len(key) > 3:
+            i = rng.randrange(len(key))
+            result.add(key[:i] + key[i + 1 :])
+    return sorted(result)
+
+
+def measure_responsiveness(matcher, index, queries, args):
+    """I/O wake-up lateness and lookups/s while typo sessions scan"""
+    stop = threading.Event()
+    lateness, lookups = [], []
+    lock = threading.Lock()
+
+    def io_session():
+        samples = []
+        while not stop.is_set():
+            start = time.perf_counter()
+            time.sleep(args.io_ms / 1000)
+            samples.append((time.perf_counter() - start) * 1000 - args.io_ms)
+        with lock:
+            lateness.extend(samples)
+
+    def typo_session(chunk):
+        for query in chunk:
+            start = time.perf_counter()
+            matcher.extract_column(query, index, "product_type")
+            with lock:
+                lookups.append((time.perf_counter() - start) * 1000)
+
+    io_threads = [
+        threading.Thread(target=io_session) for _ in range(args.io_sessions)
+    ]
+    typo_threads = [
+        threading.Thread(target=typo_session, args=(queries[i :: args.typo_sessions],))
+        for i in range(args.typo_sessions)
+    ]
+    for thread in io_threads:
+        thread.start()
+    start = time.perf_counter()
+    for thread in typo_threads:
+        thread.start()
+    for thread in typo_threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    for thread in io_threads:
+        thread.join()
+    return {
+        "io_lateness": summarize(lateness),
+        "lookup": summarize(lookups),
+        "lookups_per_sec": round(len(lookups) / elapsed, 2),
+    }
+
+
+def run_worker(args):
+    with contextlib.redirect_stdout(io.StringIO()):
+        from chatbot.fuzzy import FuzzyMatcher
+        from chatbot.query import get_catalog_index
+
+        index = get_catalog_index()
+    keys = index.keys("product_type")
+    queries = typos(keys, args.lookups * 2, args.seed)
+    workers = args.pool_workers if args.mode == "pool" else 0
+    with contextlib.redirect_stdout(io.StringIO()):
+        matcher = FuzzyMatcher(workers=workers, min_choices=args.min_choices)
+        matcher.start(index)
+        cold, warm = [], []
+        for query in queries[: args.lookups]:
+            start = time.perf_counter()
+            matcher.extract_column(query, index, "product_type")
+            cold.append((time.perf_counter() - start) * 1000)
+            start = time.perf_counter()
+            matcher.extract_column(query, index, "product_type")
+            warm.append((time.perf_counter() - start) * 1000)
+        busy = measure_responsiveness(matcher, index, queries[args.lookups :], args)
+    matcher.close()
+
+    metrics = {
+        "choices": len(keys),
+        "cold": summarize(cold),
+        "cached": summarize(warm),
+        **busy,
+        "stats": dict(matcher.stats),
+    }
+    with open(args.worker_output, "w", encoding="utf-8") as f:
+        json.dump(metrics, f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--sizes",
+        default=",".join(str(s) for s in CATALOG_SIZES),
+        help="Comma-separated catalog sizes (rows)",
+    )
+    parser.add_argument("--modes", default="inline,pool", help="inline,pool")
+    parser.add_argument("--pool-workers", type=int, default=2, help="Pool processes")
+    parser.add_argument(
+        "--min-choices", type=int, default=5000, help="Smallest scan sent to the pool"
+    )
+    parser.add_argument("--lookups", type=int, default=8, help="Cold lookups")
+    parser.add_argument("--typo-sessions", type=int, default=2, help="Scanning threads")
+    parser.add_argument("--io-sessions", type=int, default=8, help="Waiting threads")
+    parser.add_argument("--io-ms", type=float, default=20.0, help="I/O wait per loop")
+    parser.add_argument("--seed", type=int, default=0, help="Catalog generator seed")
+    parser.add_argument("--verbose", action="store_true", help="Show chatbot logs")
+    parser.add_argument("--no-save", action="store_true", help="Do not store results")
+    parser.add_argument("--mode", help=argparse.SUPPRESS)
+    parser.add_argument("--worker-output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker_output:
+        run_worker(args)
+        return
+
+    options = {
+        option: getattr(args, option)
+        for option in (
+            "pool_workers",
+            "min_choices",
+            "lookups",
+            "typo_sessions",
+            "io_sessions",
+            "io_ms",
+        )
+    }
+    for size in (int(s) for s in args.sizes.split(",")):
+        print(f"\n=== catalog rows: {size} ===")
+        for mode in args.modes.split(","):
+            metrics = run_worker_process(
+                "benchmarks.run_fuzzy",
+                size,
+                args.seed,
+                dict(options, mode=mode),
+                args.verbose,
+            )
+            print(
+                f"{mode:<7} {metrics['choices']} products  "
+                f"cold p50 {metrics['cold']['p50_ms']:.1f} ms  "
+                f"cached p50 {metrics['cached']['p50_ms']:.3f} ms  "
+                f"{metrics['lookups_per_sec']:.2f} lookups/s  "
+                f"I/O lateness p50 {metrics['io_lateness']['p50_ms']:.2f} ms "
+                f"p99 {metrics['io_lateness']['p99_ms']:.2f} ms"
+            )
+            if not args.no_save:
+                params = dict(options, rows=size, mode=mode, seed=args.seed)
+                save_result("fuzzy", params, metrics)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Benchmark of the LLM gateway against a local fake Gemini server that injects 429s
+
+Many client threads call the model for a fixed duration, once through the gateway
+and once directly (the model's own retries only). Reports accepted requests/sec
+against the quota, 429s seen by the server, client failures and latency per
+priority.
+
+Usage (from capstone-2025q1):
+    python -m benchmarks.run_gateway
+    python -m benchmarks.run_gateway --rpm 1200 --window 10 --clients 64 --error-rate 0.02
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import threading
+import time
+
+from langchain_core.messages import HumanMessage
+
+from benchmarks.fake_gemini import FakeGeminiServer
+from benchmarks.results import save_result, summarize
+
+os.environ.setdefault("GOOGLE_API_KEY", "fake-key")  # The fake server ignores it
+
+
+def run_clients(call, clients, duration):
+    """Runs client threads for duration seconds; returns latencies and failures"""
+    deadline = time.monotonic() + duration
+    lock = threading.Lock()
+    latencies = {"interactive": [], "background": []}
+    failures = []
+
+    def client(i):
+        kind = "interactive" if i % 4 == 0 else "background"
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            try:
+                call(kind, f"Client {i}: find me some cheap milk")
+            except Exception as e:
+                with lock:
+                    failures.append(e.__class__.__name__)
+                continue
+            with lock:
+                latencies[kind].append((time.perf_counter() - start) * 1000)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, failures, time.monotonic() - start
+
+
+def run_mode(mode, args):
+    from chatbot.gateway import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, LLMGateway
+    from chatbot.llm import create_llm
+
+    server = FakeGeminiServer(
+        requests_per_minute=args.rpm,
+        tokens_per_minute=args.tpm,
+        window_seconds=args.window,
+        latency_ms=args.latency_ms,
+        error_rate=args.error_rate,
+    )
+    with server, contextlib.redirect_stdout(io.StringIO()):
+        model = create_llm(api_endpoint=server.url)
+        gateway = LLMGateway(
+            requests_per_minute=args.rpm,
+            tokens_per_minute=args.tpm,
+            max_concurrency=args.concurrency,
+            max_retries=args.retries,
+            backoff_base=0.2,
+            backoff_max=5.0,
+            burst_seconds=1.0,  # Paced: the fake server counts requests per window
+        )
+        priorities = {
+            "interactive": PRIORITY_INTERACTIVE,
+            "background": PRIORITY_BACKGROUND,
+        }
+
+        if mode == "gateway":
+
+            def call(kind, text):
+                return gateway.invoke(
+                    model, [HumanMessage(content=text)], priority=priorities[kind]
+                )
+
+        else:
+            # Previous behavior: the model's own exponential retries, no quota control
+            model.max_retries = args.retries + 1
+
+            def call(kind, text):
+                return model.invoke([HumanMessage(content=text)])
+
+        latencies, failures, elapsed = run_clients(call, args.clients, args.duration)
+
+    succeeded = sum(len(samples) for samples in latencies.values())
+    return {
+        "succeeded": succeeded,
+        "succeeded_per_sec": round(succeeded / elapsed, 2),
+        "quota_per_sec": round(args.rpm / 60, 2),
+        "server": dict(server.stats),
+        "failed": len(failures),
+        "latency": {kind: summarize(samples) for kind, samples in latencies.items()},
+        "gateway": dict(gateway.stats) if mode == "gateway" else {},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--modes", default="gateway,direct", help="gateway,direct")
+    parser.add_argument("--rpm", type=int, default=600, help="Requests/minute quota")
+    parser.add_argument("--tpm", type=int, default=0, help="Tokens/minute quota")
+    parser.add_argument(
+        "--window", type=float, default=10.0, help="Server quota window (seconds)"
+    )
+    parser.add_argument("--clients", type=int, default=32, help="Client threads")
+    parser.add_argument("--concurrency", type=int, default=16, help="Gateway pool size")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds per mode")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Server latency")
+    parser.add_argument("--error-rate", type=float, default=0.01, help="Random 503s")
+    parser.add_argument("--retries", type=int, default=5, help="Retries per request")
+    parser.add_argument("--no-save", action="store_true", help="Do not store results")
+    args = parser.parse_args()
+
+    for mode in args.modes.split(","):
+        metrics = run_mode(mode, args)
+        server = metrics["server"]
+        print(f"\n=== {mode} ===")
+        print(
+            f"accepted       {metrics['succeeded_per_sec']:.2f} req/s "
+            f"(quota {metrics['quota_per_sec']:.2f} req/s)"
+        )
+        print(
+            f"server         {server['requests']} requests, {server['rate_limited']} x 429, "
+            f"{server['unavailable']} x 503"
+        )
+        print(f"client errors  {metrics['failed']}")
+        for kind, stats in metrics["latency"].items():
+            if stats["count"]:
+                print(
+                    f"latency        {kind:<12} p50 {stats['p50_ms']:.0f} ms  "
+                    f"p95 {stats['p95_ms']:.0f} ms  ({stats['count']} calls)"
+                )
+        if metrics["gateway"]:
+            print(f"gateway        {metrics['gateway']}")
+        if not args.no_save:
+            params = {k: v for k, v in vars(args).items() if k not in ("modes", "no_save")}
+            save_result("gateway", dict(params, mode=mode), metrics)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,451 @@
+"""
+End-to-end benchmark of chatbot.graph.app with a scripted stand-in LLM
+
+Every catalog size runs in its own worker process (the chatbot loads its catalog
+at import time), with the scripted model installed in place of chatbot.llm.llm.
+
+With --tiers fast,strong a second, faster stand-in model that sometimes misplans
+(--fast-fallback-rate) is installed as the lighter model tier, to measure the
+routing: calls and latency per tier, escalations, token cost and whether the
+executed tool plans still match the scripts.
+
+Usage (from capstone-2025q1):
+    python -m benchmarks.run_graph
+    python -m benchmarks.run_graph --sizes 1000,1000000 --concurrency 1,8,32 --llm-latency-ms 200
+    python -m benchmarks.run_graph --sizes 1000 --llm-latency-ms 200 --tiers fast,strong
+"""
+
+import argparse
+import gc
+import json
+import os
+import resource
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from benchmarks.catalog import CATALOG_SIZES
+from benchmarks.results import save_result, summarize
+from benchmarks.scripts import list_scripts, load_script, session_turns
+from benchmarks.stub_llm import ScriptedChatModel
+from benchmarks.worker import run_worker_process
+
+
+class ToolTimer(BaseCallbackHandler):
+    """Callback handler that records the latency of every tool execution"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._running = {}
+        self.samples = defaultdict(list)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        with self._lock:
+            self._running[run_id] = (serialized.get("name"), time.perf_counter())
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        with self._lock:
+            name, start = self._running.pop(run_id, (None, None))
+            if name:
+                self.samples[name].append((time.perf_counter() - start) * 1000)
+
+    on_tool_error = on_tool_end
+
+
+def load_chatbot(model, tiers=None):
+    """
+    Installs the stand-in model (and lighter model tiers, by name) and imports
+    the chatbot, which builds the graph.
+    """
+    import chatbot.llm
+
+    chatbot.llm.llm = model
+    chatbot.llm.llm_tiers = dict(tiers or {})
+    from chatbot import main
+
+    return main
+
+
+def run_session(chatbot_main, turns, config=None, on_turn=None):
+    """Plays one session and returns the latency of every turn in milliseconds"""
+    current_state, conversation_history = chatbot_main.new_session()
+    latencies = []
+    for i, user_input in enumerate(turns):
+        start = time.perf_counter()
+        current_state, _, _ = chatbot_main.chat_turn(
+            current_state, conversation_history, user_input, config=config
+        )
+        latencies.append((time.perf_counter() - start) * 1000)
+        if on_turn:
+            on_turn(i, current_state, conversation_history)
+    return latencies
+
+
+def measure_latency(chatbot_main, turns, repeats):
+    """Per-turn and per-tool latency over sequential sessions"""
+    timer = ToolTimer()
+    turn_latencies = []
+    for _ in range(repeats):
+        turn_latencies += run_session(chatbot_main, turns, {"callbacks": [timer]})
+    return {
+        "turn": summarize(turn_latencies),
+        "tools": {name: summarize(s) for name, s in sorted(timer.samples.items())},
+    }
+
+
+def measure_memory(chatbot_main, turns, sample_every):
+    """Traced memory growth over one long session"""
+    samples = []
+
+    def on_turn(i, current_state, conversation_history):
+        if (i + 1) % sample_every == 0:
+            gc.collect()
+            samples.append((i + 1, tracemalloc.get_traced_memory()[0]))
+
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    run_session(chatbot_main, turns, on_turn=on_turn)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    final_turn, final_bytes = samples[-1] if samples else (len(turns), baseline)
+    return {
+        "turns": len(turns),
+        "growth_bytes": final_bytes - baseline,
+        "growth_bytes_per_turn": round((final_bytes - baseline) / final_turn, 1),
+        "peak_bytes": peak - baseline,
+        "samples": [[turn, size - baseline] for turn, size in samples],
+    }
+
+
+def measure_throughput(chatbot_main, turns, sessions):
+    """Turns per second with the given number of concurrent sessions"""
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as pool:
+        futures = [
+            pool.submit(run_session, chatbot_main, turns) for _ in range(sessions)
+        ]
+        latencies = [latency for f in futures for latency in f.result()]
+    elapsed = time.perf_counter() - start
+    return {
+        "sessions": sessions,
+        "turns_per_sec": round(len(latencies) / elapsed, 2),
+        "turn": summarize(latencies),
+    }
+
+
+def measure_routing(chatbot_main, scripts):
+    """
+    Model routing over one session of every script: calls, latency and tokens per
+    tier, escalations, cost and the share of turns whose executed tool plan
+    matches the script.
+    """
+    from chatbot import graph
+    from chatbot.configs import MODEL_TIERS
+    from chatbot.routing import ModelRouter
+
+    router = graph.model_router = ModelRouter(graph.model_router.tiers)  # Fresh stats
+    accepted = []
+    invoke = router.invoke
+
+    def recording_invoke(*args, **kwargs):
+        response = invoke(*args, **kwargs)
+        accepted.append(response)
+        return response
+
+    router.invoke = recording_invoke
+    correct = total = 0
+    for script in scripts:
+        current_state, conversation_history = chatbot_main.new_session()
+        for turn in script["turns"]:
+            accepted.clear()
+            current_state, _, _ = chatbot_main.chat_turn(
+                current_state, conversation_history, turn["user"]
+            )
+            plan = [
+                [{"name": call["name"], "args": call["args"]} for call in m.tool_calls]
+                for m in accepted
+                if m.tool_calls
+            ]
+            expected = [
+                [{"name": c["name"], "args": c.get("args", {})} for c in step]
+                for step in turn["steps"]
+            ]
+            correct += plan == expected
+            total += 1
+
+    summary = router.summary()
+    prices = {tier["name"]: tier for tier in MODEL_TIERS}
+    cost = 0.0
+    for name, stats in summary["tiers"].items():
+        price = prices.get(name, MODEL_TIERS[-1])
+        cost += stats["input_tokens"] * price["input_price"] / 1e6
+        cost += stats["output_tokens"] * price["output_price"] / 1e6
+    calls = sum(stats["calls"] for stats in summary["tiers"].values())
+    summary.update(
+        turns=total,
+        plan_accuracy=round(correct / total, 4),
+        calls=calls,
+        cost_usd_per_1k_turns=round(cost / total * 1000, 4),
+        model_ms_per_turn=round(
+            sum(s["calls"] * s["mean_ms"] for s in summary["tiers"].values()) / total, 3
+        ),
+    )
+    return summary
+
+
+def measure_loops(chatbot_main, scripts):
+    """
+    Repeated tool calls over one session of every script: redundant model calls
+    (steps asking only for results the turn already has), duplicate tool calls
+    (re-run, or answered from earlier results with loop detection) and loops
+    broken with a direct answer, per turn.
+    """
+    from chatbot import graph
+
+    graph.loop_detector.reset()
+    turns = 0
+    for script in scripts:
+        current_state, conversation_history = chatbot_main.new_session()
+        for turn in script["turns"]:
+            current_state, _, _ = chatbot_main.chat_turn(
+                current_state, conversation_history, turn["user"]
+            )
+            turns += 1
+
+    enabled = graph.loop_detector.enabled
+    stats = graph.loop_detector.summary()
+    duplicates = stats.get("duplicate_tool_calls", 0)
+    reused = stats.get("reused_tool_calls", 0)
+    return {
+        "enabled": enabled,
+        "turns": turns,
+        "redundant_llm_calls_per_turn": round(
+            stats.get("redundant_llm_calls", 0) / turns, 4
+        ),
+        "redundant_tool_runs_per_turn": round((duplicates - reused) / turns, 4),
+        "reused_tool_calls_per_turn": round(reused / turns, 4),
+        "loops_broken": stats.get("loops_detected", 0) if enabled else 0,
+        **stats,
+    }
+
+
+def run_worker(args):
+    """Runs all measurements against the catalog given by CHATBOT_DATA_FILE"""
+    scripts = [load_script(name) for name in args.scripts.split(",")]
+    if args.turn_deadline > 0:
+        os.environ["CHATBOT_TURN_DEADLINE"] = str(args.turn_deadline)
+    os.environ["CHATBOT_LOOP_DETECTION"] = str(args.loop_detection)
+    hangs = {
+        "hang_rate": args.llm_hang_rate,
+        "hang_ms": args.llm_hang_ms,
+        "repeat_rate": args.llm_repeat_rate,
+    }
+    model = ScriptedChatModel.from_scripts(
+        scripts, latency_ms=args.llm_latency_ms, **hangs
+    )
+    tiers = {}
+    if args.tiers != "strong":
+        tiers["fast"] = ScriptedChatModel.from_scripts(
+            scripts,
+            latency_ms=args.llm_latency_ms * args.fast_latency_ratio,
+            fallback_rate=args.fast_fallback_rate,
+            **hangs,
+        )
+
+    start = time.perf_counter()
+    chatbot_main = load_chatbot(model, tiers)
+    import_ms = (time.perf_counter() - start) * 1000
+    import chatbot.llm
+
+    turns = session_turns(scripts)
+    run_session(chatbot_main, turns)  # warm-up
+
+    metrics = {
+        "import_ms": round(import_ms, 3),
+        "latency": measure_latency(chatbot_main, turns, args.repeats),
+        "memory": measure_memory(
+            chatbot_main, session_turns(scripts, args.long_turns), args.sample_every
+        ),
+        "throughput": {
+            str(n): measure_throughput(chatbot_main, turns, n)
+            for n in (int(n) for n in args.concurrency.split(","))
+        },
+        "routing": measure_routing(chatbot_main, scripts),
+        "loops": measure_loops(chatbot_main, scripts),
+        "gateway": dict(chatbot.llm.llm_gateway.stats),
+        "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+    with open(args.worker_output, "w", encoding="utf-8") as f:
+        json.dump(metrics, f)
+
+
+def run_size(size, args):
+    """Runs the worker for one catalog size in a fresh process"""
+    options = {
+        option: getattr(args, option)
+        for option in (
+            "scripts",
+            "repeats",
+            "long_turns",
+            "sample_every",
+            "concurrency",
+            "llm_latency_ms",
+            "tiers",
+            "fast_latency_ratio",
+            "fast_fallback_rate",
+            "llm_hang_rate",
+            "llm_hang_ms",
+            "turn_deadline",
+            "llm_repeat_rate",
+            "loop_detection",
+        )
+    }
+    return run_worker_process(
+        "benchmarks.run_graph", size, args.seed, options, args.verbose
+    )
+
+
+def print_report(size, metrics):
+    turn = metrics["latency"]["turn"]
+    memory = metrics["memory"]
+    print(f"\n=== catalog rows: {size} (import {metrics['import_ms']:.0f} ms) ===")
+    print(
+        f"turn latency   mean {turn['mean_ms']:.2f} ms  p50 {turn['p50_ms']:.2f}  "
+        f"p95 {turn['p95_ms']:.2f}  p99 {turn['p99_ms']:.2f}"
+    )
+    print("tool latency (mean / p95 ms):")
+    for name, stats in metrics["latency"]["tools"].items():
+        print(f"  {name:<32} {stats['mean_ms']:>10.3f} {stats['p95_ms']:>10.3f}")
+    print(
+        f"memory         +{memory['growth_bytes_per_turn']:.0f} B/turn over "
+        f"{memory['turns']} turns (peak +{memory['peak_bytes'] / 1024:.0f} KiB), "
+        f"max RSS {metrics['max_rss_kb'] / 1024:.0f} MiB"
+    )
+    for sessions, result in metrics["throughput"].items():
+        print(
+            f"throughput     {sessions:>4} sessions: {result['turns_per_sec']:>9.2f} turns/s "
+            f"(p95 {result['turn']['p95_ms']:.2f} ms)"
+        )
+    routing = metrics["routing"]
+    print(
+        f"routing        plan accuracy {routing['plan_accuracy']:.1%} over "
+        f"{routing['turns']} turns, {routing['calls']} model calls, "
+        f"{routing['model_ms_per_turn']:.1f} ms model time/turn, "
+        f"${routing['cost_usd_per_1k_turns']:.4f} per 1k turns"
+    )
+    for tier, stats in routing["tiers"].items():
+        print(
+            f"  {tier:<12} {stats['calls']:>5} calls  mean {stats['mean_ms']:.2f} ms  "
+            f"{stats['input_tokens']} in / {stats['output_tokens']} out tokens"
+        )
+    if routing["escalations"]:
+        print(f"  escalations  {routing['escalations']}")
+    loops = metrics["loops"]
+    print(
+        f"repeats        {loops['redundant_llm_calls_per_turn']:.3f} redundant model "
+        f"calls/turn, {loops['redundant_tool_runs_per_turn']:.3f} redundant tool "
+        f"runs/turn, {loops['reused_tool_calls_per_turn']:.3f} reused results/turn, "
+        f"{loops['loops_broken']} loops broken "
+        f"(detection {'on' if loops['enabled'] else 'off'})"
+    )
+    if metrics["gateway"]["timeouts"]:
+        print(f"timeouts       {metrics['gateway']['timeouts']} LLM calls cut at the deadline")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--sizes",
+        default=",".join(str(s) for s in CATALOG_SIZES),
+        help="Comma-separated catalog sizes (rows)",
+    )
+    parser.add_argument(
+        "--scripts",
+        default=",".join(list_scripts()),
+        help="Comma-separated script names or paths",
+    )
+    parser.add_argument("--repeats", type=int, default=5, help="Sessions for latency")
+    parser.add_argument(
+        "--long-turns", type=int, default=200, help="Turns of the long session"
+    )
+    parser.add_argument(
+        "--sample-every", type=int, default=20, help="Memory sample interval (turns)"
+    )
+    parser.add_argument(
+        "--concurrency", default="1,4,16", help="Comma-separated concurrent sessions"
+    )
+    parser.add_argument(
+        "--llm-latency-ms", type=float, default=0.0, help="Simulated model latency"
+    )
+    parser.add_argument(
+        "--tiers", default="strong", help="Model tiers: strong or fast,strong"
+    )
+    parser.add_argument(
+        "--fast-latency-ratio", type=float, default=0.4, help="Fast tier latency share"
+    )
+    parser.add_argument(
+        "--fast-fallback-rate", type=float, default=0.1, help="Fast tier misplans"
+    )
+    parser.add_argument(
+        "--llm-hang-rate", type=float, default=0.0, help="Share of stalled model calls"
+    )
+    parser.add_argument(
+        "--llm-hang-ms", type=float, default=10000.0, help="Stall of a hung call"
+    )
+    parser.add_argument(
+        "--turn-deadline", type=float, default=0.0, help="Turn budget (s, 0 = config)"
+    )
+    parser.add_argument(
+        "--llm-repeat-rate", type=float, default=0.0, help="Share of repeated steps"
+    )
+    parser.add_argument(
+        "--loop-detection", type=int, default=1, help="Duplicate/loop detection (0/1)"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Catalog generator seed")
+    parser.add_argument("--verbose", action="store_true", help="Show chatbot logs")
+    parser.add_argument("--no-save", action="store_true", help="Do not store results")
+    parser.add_argument("--worker-output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker_output:
+        run_worker(args)
+        return
+
+    for size in (int(s) for s in args.sizes.split(",")):
+        metrics = run_size(size, args)
+        print_report(size, metrics)
+        if not args.no_save:
+            params = {
+                "rows": size,
+                "scripts": args.scripts,
+                "repeats": args.repeats,
+                "long_turns": args.long_turns,
+                "concurrency": args.concurrency,
+                "llm_latency_ms": args.llm_latency_ms,
+                "tiers": args.tiers,
+                "seed": args.seed,
+            }
+            if args.llm_hang_rate:
+                params.update(
+                    llm_hang_rate=args.llm_hang_rate,
+                    llm_hang_ms=args.llm_hang_ms,
+                    turn_deadline=args.turn_deadline,
+                )
+            if args.llm_repeat_rate:
+                params["llm_repeat_rate"] = args.llm_repeat_rate
+            if not args.loop_detection:
+                params["loop_detection"] = args.loop_detection
+            if args.tiers != "strong":
+                params["fast_latency_ratio"] = args.fast_latency_ratio
+                params["fast_fallback_rate"] = args.fast_fallback_rate
+            save_result("graph", params, metrics)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,332 @@
+"""
+Benchmark of stock reservations under contention on hot SKUs
+
+Client threads (in one or more processes sharing one database) hold carts of a
+few sessions each and, for a fixed duration, reserve units of random SKUs of
+the sample catalog for one of their sessions, or release every unit of a
+session (a cleared cart). --hot-rate of the reservations go to --hot-skus SKUs
+with --hot-stock units, which sell out and are given back in turn. Once per
+mode:
+
+- locked: the stock and reservation are read, checked and written in one
+  transaction that holds the database write lock from the first read (other
+  clients wait for it: busy timeout)
+- optimistic: read without the lock, then a compare-and-swap on the version
+  of the stock row; a row changed meanwhile is read again and retried
+- inventory: chatbot.inventory.Inventory (snapshot read, then one upsert of
+  the reservation: the check and the decrement are one statement, never
+  retried)
+
+In every mode the stock row follows the reservation rows through the triggers
+of the schema (a release is one DELETE). Every client has its own connection.
+Reports operations/sec, latency, out-of-stock answers and retries, and checks
+that no SKU was oversold (stock left + units held = initial stock) and that
+releasing every expired reservation gives all the stock back.
+
+Usage (from capstone-2025q1):
+    python -m benchmarks.run_inventory
+    python -m benchmarks.run_inventory --clients 1,16,64 --processes 4 --duration 5
+"""
+
+import argparse
+import contextlib
+import io
+import multiprocessing
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+from benchmarks.results import save_result, summarize
+
+
+def locked_reserve(connection, session_id, sku, quantity, ttl):
+    """One reservation in its own transaction: read, check, write"""
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        stock = connection.execute(
+            "SELECT quantity FROM stock WHERE product_type = ? AND product_brand = ?",
+            sku,
+        ).fetchone()[0]
+        row = connection.execute(
+            "SELECT quantity FROM reservations WHERE session_id = ? "
+            "AND product_type = ? AND product_brand = ?",
+            (session_id, *sku),
+        ).fetchone()
+        held = row[0] if row else 0
+        if quantity > stock + held:
+            return "out_of_stock"
+        connection.execute(  # The schema triggers move the difference off the stock
+
+            "INSERT INTO reservations (session_id, product_type, product_brand, "
+            "quantity, expires) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (session_id, product_type, product_brand) "
+            "DO UPDATE SET quantity = excluded.quantity, expires = excluded.expires",
+            (session_id, *sku, quantity, time.time() + ttl),
+        )
+        return "reserved"
+    finally:
+        connection.execute("COMMIT")
+
+
+def optimistic_reserve(connection, session_id, sku, quantity, ttl, retries):
+    """One reservation with a compare-and-swap on the stock row version"""
+    while True:
+        stock, version = connection.execute(
+            "SELECT quantity, version FROM stock "
+            "WHERE product_type = ? AND product_brand = ?",
+            sku,
+        ).fetchone()
+        row = connection.execute(
+            "SELECT quantity FROM reservations WHERE session_id = ? "
+            "AND product_type = ? AND product_brand = ?",
+            (session_id, *sku),
+        ).fetchone()
+        held = row[0] if row else 0
+        if quantity > stock + held:
+            return "out_of_stock"
+        connection.execute("BEGIN IMMEDIATE")
+        cursor = connection.execute(
+            "UPDATE stock SET version = version + 1 "
+            "WHERE product_type = ? AND product_brand = ? AND version = ?",
+            (*sku, version),
+        )
+        if cursor.rowcount == 1:
+            break
+        connection.execute("ROLLBACK")
+        retries[0] += 1  # Changed since the read
+    connection.execute(  # The schema triggers move the difference off the stock
+        "INSERT INTO reservations (session_id, product_type, product_brand, "
+        "quantity, expires) VALUES (?, ?, ?, ?, ?) "
+        "ON CONFLICT (session_id, product_type, product_brand) "
+        "DO UPDATE SET quantity = excluded.quantity, expires = excluded.expires",
+        (session_id, *sku, quantity, time.time() + ttl),
+    )
+    connection.execute("COMMIT")
+    return "reserved"
+
+
+def run_clients(mode, path, process, clients, args, skus):
+    """
+    Runs the client threads of one process for the duration, started with the
+    other processes. Returns (latencies, statuses, usage, elapsed seconds).
+    """
+    with contextlib.redirect_stdout(io.StringIO()):  # Catalog load logs
+        from chatbot.inventory import Inventory
+        from chatbot.orders import OrderStore
+
+    store = OrderStore(path)
+    inventory = Inventory(store, ttl_seconds=args.ttl, synchronous=args.sync)
+    hot, cold = skus[: args.hot_skus], skus[args.hot_skus :]
+    lock = threading.Lock()
+    latencies, statuses, retries = [], {}, [0]
+    inventory.release("warm-up")  # Catalog stock loaded (every SKU has its row)
+    if _start_barrier is not None:
+        _start_barrier.wait()  # The clock starts once every process is ready
+    deadline = time.time() + args.duration
+
+    def client(i):
+        rng = random.Random(process * 100003 + i)
+        sessions = [f"p{process}-c{i}-s{s}" for s in range(args.sessions)]
+        held = {session_id: {} for session_id in sessions}
+        connection = None
+        if mode != "inventory":
+            connection = store.connect(args.sync)
+        tries = [0]
+        while time.time() < deadline:
+            session_id = rng.choice(sessions)
+            start = time.perf_counter()
+            if rng.random() < args.release_rate:
+                if mode == "inventory":
+                    inventory.release(session_id)
+                else:  # The triggers give the units back
+                    connection.execute(
+                        "DELETE FROM reservations WHERE session_id = ?", (session_id,)
+                    )
+                held[session_id] = {}
+                status = "released"
+            else:
+                sku = rng.choice(hot if rng.random() < args.hot_rate else cold)
+                quantity = held[session_id].get(sku, 0) + rng.randint(1, 3)
+                if mode == "inventory":
+                    status = inventory.reserve(session_id, *sku, quantity)["status"]
+                elif mode == "optimistic":
+                    status = optimistic_reserve(
+                        connection, session_id, sku, quantity, args.ttl, tries
+                    )
+                else:
+                    status = locked_reserve(
+                        connection, session_id, sku, quantity, args.ttl
+                    )
+                if status == "reserved":
+                    held[session_id][sku] = quantity
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                latencies.append(elapsed)
+                statuses[status] = statuses.get(status, 0) + 1
+        if connection is not None:
+            connection.close()
+        with lock:
+            retries[0] += tries[0]
+
+    start = time.time()
+    with contextlib.redirect_stdout(io.StringIO()):
+        threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    elapsed = time.time() - start
+    store.close()
+    usage = dict(inventory.usage(), retries=retries[0])
+    usage.pop("active_sessions")
+    return latencies, statuses, usage, elapsed
+
+
+_start_barrier = None  # Shared by the client processes of a run
+
+
+def _init_process(barrier):
+    global _start_barrier
+    _start_barrier = barrier
+
+
+def _run_process(task):
+    return run_clients(*task)
+
+
+def run_mode(mode, clients, args, skus):
+    from chatbot.inventory import Inventory
+    from chatbot.orders import OrderStore
+
+    directory = tempfile.mkdtemp(prefix="chatbot-inventory-")
+    path = os.path.join(directory, "orders.db")
+    store = OrderStore(path)
+    stock = {sku: args.cold_stock for sku in skus}
+    stock.update({sku: args.hot_stock for sku in skus[: args.hot_skus]})
+    store.set_stock(stock)
+
+    tasks = [
+        (mode, path, process, clients, args, skus) for process in range(args.processes)
+    ]
+    if args.processes == 1:
+        results = [_run_process(tasks[0])]
+    else:
+        context = multiprocessing.get_context("spawn")
+        barrier = context.Barrier(args.processes)
+        with context.Pool(args.processes, _init_process, (barrier,)) as pool:
+            results = pool.map(_run_process, tasks, chunksize=1)
+    elapsed = max(result[3] for result in results)
+
+    latencies, statuses, usage = [], {}, {}
+    for process_latencies, process_statuses, process_usage, _ in results:
+        latencies += process_latencies
+        for counts, more in ((statuses, process_statuses), (usage, process_usage)):
+            for name, value in more.items():
+                counts[name] = counts.get(name, 0) + value
+
+    # Stock left + units held must equal the initial stock of every SKU
+    with contextlib.closing(sqlite3.connect(path)) as connection:
+        left = dict(
+            ((t, b), q)
+            for t, b, q in connection.execute(
+                "SELECT product_type, product_brand, quantity FROM stock"
+            )
+        )
+        reserved = dict(
+            ((t, b), q)
+            for t, b, q in connection.execute(
+                "SELECT product_type, product_brand, SUM(quantity) FROM reservations "
+                "GROUP BY 1, 2"
+            )
+        )
+    oversold = sum(quantity < 0 for quantity in left.values())
+    mismatched = sum(
+        left[sku] + reserved.get(sku, 0) != initial for sku, initial in stock.items()
+    )
+    # Every reservation expired: all the stock goes back
+    with contextlib.redirect_stdout(io.StringIO()):
+        Inventory(store).release_expired(now=float("inf"))
+    restored = store.stock_levels(stock)
+    store.close()
+    shutil.rmtree(directory, ignore_errors=True)
+
+    operations = sum(statuses.values())
+    return {
+        "operations_per_sec": round(operations / elapsed, 1),
+        "reservations_per_sec": round(statuses.get("reserved", 0) / elapsed, 1),
+        "latency": summarize(latencies),
+        "statuses": statuses,
+        "retries": usage.pop("retries", 0),
+        "inventory": usage,
+        "units_held": sum(reserved.values()),
+        "oversold_skus": oversold,
+        "stock_mismatches": mismatched,
+        "unrestored_skus": sum(restored[sku][0] != stock[sku] for sku in stock),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--modes", default="locked,optimistic,inventory", help="Comma-separated modes"
+    )
+    parser.add_argument(
+        "--clients", default="1,16,64", help="Comma-separated clients per process"
+    )
+    parser.add_argument("--processes", type=int, default=1, help="Client processes")
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds per run")
+    parser.add_argument("--sessions", type=int, default=5, help="Carts per client")
+    parser.add_argument("--hot-skus", type=int, default=5, help="Contended SKUs")
+    parser.add_argument("--hot-stock", type=int, default=200, help="Their stock")
+    parser.add_argument("--cold-stock", type=int, default=1000000, help="Other SKUs")
+    parser.add_argument(
+        "--hot-rate", type=float, default=0.5, help="Share of reservations on hot SKUs"
+    )
+    parser.add_argument(
+        "--release-rate", type=float, default=0.1, help="Share of cleared carts"
+    )
+    parser.add_argument("--ttl", type=float, default=900, help="Reservation TTL")
+    parser.add_argument("--sync", default="NORMAL", help="SQLite synchronous pragma")
+    parser.add_argument("--no-save", action="store_true", help="Do not store results")
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        from chatbot import data_loader
+    catalog = data_loader.data.drop_duplicates(["product_type", "product_brand"])
+    skus = list(
+        zip(
+            catalog["product_type"].astype(str).str.lower(),
+            catalog["product_brand"].astype(str).str.lower(),
+        )
+    )
+
+    for clients in (int(c) for c in args.clients.split(",")):
+        print(f"\n=== clients: {clients} x {args.processes} process(es) ===")
+        for mode in args.modes.split(","):
+            metrics = run_mode(mode, clients, args, skus)
+            latency, statuses = metrics["latency"], metrics["statuses"]
+            print(
+                f"{mode:<10}  {metrics['operations_per_sec']:>8.1f} ops/s  "
+                f"p50 {latency['p50_ms']:.2f} ms  p99 {latency['p99_ms']:.2f} ms  "
+                f"reserved {statuses.get('reserved', 0)}  "
+                f"out of stock {statuses.get('out_of_stock', 0)}  "
+                f"retries {metrics['retries']}  "
+                f"oversold {metrics['oversold_skus']}  "
+                f"stock mismatches {metrics['stock_mismatches']}  "
+                f"unrestored {metrics['unrestored_skus']}"
+            )
+            if not args.no_save:
+                params = {
+                    k: v for k, v in vars(args).items() if k not in ("modes", "no_save")
+                }
+                save_result(
+                    "inventory", dict(params, mode=mode, clients=clients), metrics
+                )
+
+
+if __name__ == "__main__":
+    main()
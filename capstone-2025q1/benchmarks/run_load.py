@@ -0,0 +1,418 @@
+"""
+Load test of the chatbot: simulated shoppers arriving at increasing rates
+
+For every catalog size, a worker process serves chatbot turns from a pool of
+threads (--serving-threads), with the sessions in a chatbot.sessions.SessionStore
+and the scripted stand-in model in place of chatbot.llm.llm (--llm-latency-ms per
+call, spread by --llm-jitter). An asyncio load generator plays synthetic shopper
+scripts (benchmarks.scripts.shopper_scripts: browse, compare, add, modify or
+remove, view cart): at every rate of --rates, shoppers arrive as a Poisson
+process for --step-seconds and wait --think-ms on average between their turns.
+Reports per rate:
+
+- turns requested per second, and served (within --slo-ms after the arrival
+  window), turn latency percentiles, error rate (failed turns and best-effort
+  answers)
+- time per turn waiting for a serving thread (queue), in the model, the tools,
+  the session store and the rest of the graph
+- memory over time: RSS, bytes of the resident sessions, open sessions
+
+The saturation point is the first rate at which the p95 latency exceeds
+--slo-ms, the error rate exceeds --max-error-rate, or fewer than 90% of the
+requested turns are served. The component (model, tools, session store or
+graph) whose time per turn grew the most since the lowest rate is reported as
+the bottleneck; a growing queue alone means the serving threads are the limit.
+
+Usage (from capstone-2025q1):
+    python -m benchmarks.run_load
+    python -m benchmarks.run_load --sizes 1000,100000 --rates 2,4,8,16,32 --llm-latency-ms 300
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+from langchain_core.callbacks import BaseCallbackHandler
+
+from benchmarks.results import save_result, summarize
+from benchmarks.scripts import shopper_scripts
+from benchmarks.stub_llm import ScriptedChatModel
+from benchmarks.worker import run_worker_process
+
+COMPONENTS = ("queue", "model", "tools", "session", "graph")
+
+
+class TurnTimer(BaseCallbackHandler):
+    """
+    Adds up the tool time (callbacks) and the model time (time_model_calls) of
+    the turn running on the current serving thread
+    """
+
+    current = threading.local()
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._running = {}
+        self.ms = {"model": 0.0, "tools": 0.0}
+
+    def add(self, component, ms):
+        with self._lock:
+            self.ms[component] += ms
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        with self._lock:
+            self._running[run_id] = time.perf_counter()
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        with self._lock:
+            start = self._running.pop(run_id, None)
+        if start is not None:
+            self.add("tools", (time.perf_counter() - start) * 1000)
+
+    on_tool_error = on_tool_end
+
+
+def time_model_calls(gateway):
+    """
+    Times the model calls of the gateway for the turn timers. The calls run on
+    a gateway thread (outside the callbacks of the turn) but are made, and
+    waited for, by the serving thread of the turn.
+    """
+    invoke = gateway.invoke
+
+    def timed_invoke(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return invoke(*args, **kwargs)
+        finally:
+            timer = getattr(TurnTimer.current, "timer", None)
+            if timer is not None:
+                timer.add("model", (time.perf_counter() - start) * 1000)
+
+    gateway.invoke = timed_invoke
+
+
+class TurnServer:
+    """Runs the turns of the shoppers on serving threads and times their parts"""
+
+    def __init__(self, chatbot_main, store, threads):
+        self.main = chatbot_main
+        self.store = store
+        self.pool = ThreadPoolExecutor(threads, thread_name_prefix="serving")
+        self._lock = threading.Lock()
+        self.in_flight = 0
+
+    def submit(self, session_id, user_input):
+        with self._lock:
+            self.in_flight += 1
+        return self.pool.submit(self._turn, session_id, user_input, time.perf_counter())
+
+    def end_session(self, session_id):
+        self.store.drop(session_id)
+
+    def _turn(self, session_id, user_input, submitted):
+        start = time.perf_counter()
+        sample = {"queue": (start - submitted) * 1000, "error": None}
+        timer = TurnTimer.current.timer = TurnTimer()
+        try:
+            state, history = self.store.get(session_id)
+            got = time.perf_counter()
+            state, message, _ = self.main.chat_turn(
+                state, history, user_input, config={"callbacks": [timer]}
+            )
+            ran = time.perf_counter()
+            self.store.put(session_id, state, history)
+            end = time.perf_counter()
+            if message is None:
+                sample["error"] = "no_answer"
+            elif message.response_metadata.get("best_effort"):
+                sample["error"] = message.response_metadata["best_effort"]
+            sample["session"] = ((got - start) + (end - ran)) * 1000
+            sample.update(timer.ms)
+            sample["graph"] = max(
+                0.0, (ran - got) * 1000 - timer.ms["model"] - timer.ms["tools"]
+            )
+        except Exception as e:
+            end = time.perf_counter()
+            sample["error"] = type(e).__name__
+        sample["latency"] = (end - submitted) * 1000
+        sample["submitted"], sample["done"] = submitted, end
+        TurnTimer.current.timer = None
+        with self._lock:
+            self.in_flight -= 1
+        return sample
+
+
+async def shopper(server, session_id, script, think_ms, rng, requests, samples):
+    """Plays one shopper script, thinking between the turns"""
+    for turn in script["turns"]:
+        if think_ms > 0:
+            await asyncio.sleep(rng.expovariate(1000 / think_ms))
+        requests.append(time.perf_counter())
+        sample = await asyncio.wrap_future(server.submit(session_id, turn["user"]))
+        samples.append(sample)
+    server.end_session(session_id)
+
+
+async def run_step(server, scripts, rate, args, rng, shopper_ids):
+    """Shoppers arriving at rate per second for step_seconds, then drained"""
+    requests, samples, shoppers = [], [], []
+    start = time.perf_counter()
+    arrival = rng.expovariate(rate)
+    while arrival < args.step_seconds:
+        await asyncio.sleep(max(0.0, start + arrival - time.perf_counter()))
+        script = scripts[rng.randrange(len(scripts))]
+        session_id = f"shopper-{next(shopper_ids)}"
+        shoppers.append(
+            asyncio.create_task(
+                shopper(
+                    server, session_id, script, args.think_ms, rng, requests, samples
+                )
+            )
+        )
+        arrival += rng.expovariate(rate)
+    window_end = start + args.step_seconds
+    await asyncio.sleep(max(0.0, window_end - time.perf_counter()))
+    done, pending = await asyncio.wait(shoppers, timeout=args.drain_seconds)
+    for task in pending:
+        task.cancel()
+
+    # Turns requested in the window, and those of them served within the SLO
+    # after its end (the others are a backlog the node could not keep up with)
+    requested = sum(1 for t in requests if t <= window_end)
+    served_by = window_end + args.slo_ms / 1000
+    served = sum(
+        1 for s in samples if s["submitted"] <= window_end and s["done"] <= served_by
+    )
+
+    errors = [s for s in samples if s["error"]]
+    ok = [s for s in samples if not s["error"]]
+    return {
+        "rate": rate,
+        "shoppers": len(shoppers),
+        "abandoned_shoppers": len(pending),
+        "turns": len(samples),
+        "requested_per_sec": round(requested / args.step_seconds, 2),
+        "served_per_sec": round(served / args.step_seconds, 2),
+        "turn": summarize([s["latency"] for s in samples]),
+        "error_rate": round(len(errors) / max(len(samples), 1), 4),
+        "errors": sorted({s["error"] for s in errors}),
+        "components_ms": {
+            c: round(sum(s.get(c, 0.0) for s in ok) / max(len(ok), 1), 3)
+            for c in COMPONENTS
+        },
+    }
+
+
+async def sample_memory(server, store, timeline, start, every):
+    from chatbot.prefork import process_memory
+
+    while True:
+        usage = store.usage()
+        timeline.append(
+            {
+                "t": round(time.perf_counter() - start, 2),
+                "rss_bytes": process_memory(os.getpid()).get("rss", 0),
+                "session_bytes": usage["resident_bytes"],
+                "open_sessions": usage["resident_sessions"]
+                + usage["spilled_sessions"],
+                "in_flight": server.in_flight,
+            }
+        )
+        await asyncio.sleep(every)
+
+
+def saturation(steps, args):
+    """Returns the first saturated step with its reasons and bottleneck, or None"""
+    base = steps[0]["components_ms"]
+    for step in steps:
+        reasons = []
+        if step["turn"].get("p95_ms", 0) > args.slo_ms:
+            reasons.append("latency")
+        if step["error_rate"] > args.max_error_rate:
+            reasons.append("errors")
+        if step["served_per_sec"] < 0.9 * step["requested_per_sec"]:
+            reasons.append("throughput")
+        if reasons:
+            growth = {c: step["components_ms"][c] - base[c] for c in COMPONENTS}
+            stages = {c: growth[c] for c in COMPONENTS if c != "queue"}
+            bottleneck = max(stages, key=stages.get)
+            if stages[bottleneck] <= 0:
+                bottleneck = "queue"  # Only waiting for a serving thread grew
+            return {
+                "rate": step["rate"],
+                "reasons": reasons,
+                "bottleneck": bottleneck,
+                "growth_ms": {c: round(v, 3) for c, v in growth.items()},
+            }
+    return None
+
+
+async def run_load(server, store, scripts, args):
+    rng = random.Random(args.seed)
+    shopper_ids = iter(range(10**9))
+    timeline, steps = [], []
+    sampler = asyncio.create_task(
+        sample_memory(server, store, timeline, time.perf_counter(), args.sample_seconds)
+    )
+    for rate in (float(r) for r in args.rates.split(",")):
+        step = await run_step(server, scripts, rate, args, rng, shopper_ids)
+        step["max_rss_bytes"] = max(m["rss_bytes"] for m in timeline)
+        step["max_session_bytes"] = max(m["session_bytes"] for m in timeline)
+        steps.append(step)
+        if saturation(steps, args):
+            break  # One saturated rate is enough
+    sampler.cancel()
+    return steps, timeline
+
+
+def run_worker(args):
+    catalog = pd.read_csv(os.environ["CHATBOT_DATA_FILE"])
+    scripts = shopper_scripts(catalog, args.shopper_scripts, args.seed)
+    del catalog
+
+    import chatbot.llm
+
+    chatbot.llm.llm = ScriptedChatModel.from_scripts(
+        scripts, latency_ms=args.llm_latency_ms, latency_jitter=args.llm_jitter
+    )
+    chatbot.llm.llm_tiers = {}
+    time_model_calls(chatbot.llm.llm_gateway)
+    # Chatbot logs are discarded (kept in memory, they would count as session memory)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        from chatbot import main
+        from chatbot.configs import SYSTEM_PROMPT, get_welcome_message
+        from chatbot.sessions import SessionStore
+
+        store = SessionStore(
+            main.new_session,
+            budget_bytes=int(args.session_memory_mb * 2**20),
+            ttl=0,
+            shared=(SYSTEM_PROMPT, get_welcome_message()),
+        )
+        server = TurnServer(main, store, args.serving_threads)
+        for turn in scripts[0]["turns"]:  # Warm-up
+            server.submit("warm-up", turn["user"]).result()
+        server.end_session("warm-up")
+        steps, timeline = asyncio.run(run_load(server, store, scripts, args))
+        server.pool.shutdown(cancel_futures=True)
+        store.close()
+
+    metrics = {
+        "steps": steps,
+        "saturation": saturation(steps, args),
+        "memory": timeline,
+    }
+    with open(args.worker_output, "w", encoding="utf-8") as f:
+        json.dump(metrics, f)
+
+
+def print_report(size, metrics):
+    print(f"\n=== catalog rows: {size} ===")
+    print(
+        "rate/s  shoppers  req/s  served/s     p50      p95      p99  errors  "
+        "queue  model  tools  session  graph (ms/turn)  max RSS"
+    )
+    for step in metrics["steps"]:
+        turn, parts = step["turn"], step["components_ms"]
+        print(
+            f"{step['rate']:>6.1f}  {step['shoppers']:>8}  "
+            f"{step['requested_per_sec']:>5.1f}  {step['served_per_sec']:>8.1f}  "
+            f"{turn.get('p50_ms', 0):>6.0f}  {turn.get('p95_ms', 0):>7.0f}  "
+            f"{turn.get('p99_ms', 0):>7.0f}  {step['error_rate']:>6.1%}  "
+            f"{parts['queue']:>5.0f}  {parts['model']:>5.0f}  {parts['tools']:>5.1f}  "
+            f"{parts['session']:>7.2f}  {parts['graph']:>5.1f}"
+            f"{'':>16}{step['max_rss_bytes'] / 2**20:>6.0f} MiB"
+        )
+    point = metrics["saturation"]
+    if point:
+        print(
+            f"saturated at {point['rate']:g} shoppers/s "
+            f"({', '.join(point['reasons'])}); "
+            f"bottleneck: {point['bottleneck']} "
+            f"(+{point['growth_ms'][point['bottleneck']]:.1f} ms/turn)"
+        )
+    else:
+        print("not saturated at the tested rates")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="1000", help="Comma-separated catalog sizes")
+    parser.add_argument(
+        "--rates", default="1,2,4,8,16,32,64", help="Shopper arrivals per second"
+    )
+    parser.add_argument(
+        "--step-seconds", type=float, default=20.0, help="Arrival window per rate"
+    )
+    parser.add_argument(
+        "--drain-seconds", type=float, default=60.0, help="Wait for the shoppers"
+    )
+    parser.add_argument("--think-ms", type=float, default=1000.0, help="Think time")
+    parser.add_argument(
+        "--serving-threads", type=int, default=64, help="Turns served at once"
+    )
+    parser.add_argument(
+        "--llm-latency-ms", type=float, default=300.0, help="Simulated model latency"
+    )
+    parser.add_argument(
+        "--llm-jitter", type=float, default=0.5, help="Relative latency spread"
+    )
+    parser.add_argument(
+        "--shopper-scripts", type=int, default=500, help="Distinct shopper scripts"
+    )
+    parser.add_argument(
+        "--session-memory-mb", type=float, default=0.0, help="Session store budget"
+    )
+    parser.add_argument("--slo-ms", type=float, default=3000.0, help="p95 turn target")
+    parser.add_argument(
+        "--max-error-rate", type=float, default=0.01, help="Tolerated error rate"
+    )
+    parser.add_argument(
+        "--sample-seconds", type=float, default=1.0, help="Memory sample interval"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Catalog and load seed")
+    parser.add_argument("--verbose", action="store_true", help="Show chatbot logs")
+    parser.add_argument("--no-save", action="store_true", help="Do not store results")
+    parser.add_argument("--worker-output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker_output:
+        run_worker(args)
+        return
+
+    options = {
+        option: getattr(args, option)
+        for option in (
+            "rates",
+            "step_seconds",
+            "drain_seconds",
+            "think_ms",
+            "serving_threads",
+            "llm_latency_ms",
+            "llm_jitter",
+            "shopper_scripts",
+            "session_memory_mb",
+            "slo_ms",
+            "max_error_rate",
+            "sample_seconds",
+        )
+    }
+    for size in (int(s) for s in args.sizes.split(",")):
+        metrics = run_worker_process(
+            "benchmarks.run_load", size, args.seed, options, args.verbose
+        )
+        print_report(size, metrics)
+        if not args.no_save:
+            save_result("load", dict(options, rows=size, seed=args.seed), metrics)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+Benchmark of order persistence: one commit per order vs. group commit
+
+Client threads place orders of random carts (SKUs of the sample catalog) for a
+fixed duration through chatbot.orders.OrderStore, once per mode:
+
+- single: one transaction (and one fsync) per order (batch size 1)
+- group: every order queued while the previous commit runs is written in the
+  next transaction (up to --batch-size orders, waiting --flush-ms for more)
+
+A few hot SKUs have limited stock and are in --hot-rate of the carts, so
+concurrent orders race for them (optimistic stock checks), and --duplicate-rate
+of the orders are submitted twice with the same idempotency key. Reports
+orders/sec, commit latency seen by the client, orders per commit, stock
+conflicts and rejections, and checks that the stock sold matches the order
+lines and that no duplicate was written.
+
+Usage (from capstone-2025q1):
+    python -m benchmarks.run_orders
+    python -m benchmarks.run_orders --clients 1,16,64 --duration 5 --sync NORMAL
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+from benchmarks.results import save_result, summarize
+
+
+def run_mode(mode, clients, args, skus):
+    from chatbot.cart import CartItem
+    from chatbot.orders import OrderStore, order_key
+
+    directory = tempfile.mkdtemp(prefix="chatbot-orders-")
+    path = os.path.join(directory, "orders.db")
+    store = OrderStore(
+        path,
+        batch_size=1 if mode == "single" else args.batch_size,
+        flush_ms=0 if mode == "single" else args.flush_ms,
+        synchronous=args.sync,
+    )
+    hot = skus[: args.hot_skus]
+    store.set_stock({sku[:2]: args.hot_stock for sku in hot})
+
+    deadline = time.monotonic() + args.duration
+    lock = threading.Lock()
+    latencies, statuses, keys = [], {}, set()
+
+    def client(i):
+        rng = random.Random(i)
+        n = 0
+        while time.monotonic() < deadline:
+            picks = rng.sample(skus[args.hot_skus :], args.cart_items)
+            if rng.random() < args.hot_rate:
+                picks[0] = rng.choice(hot)
+            cart = [CartItem(t, b, p, rng.randint(1, 3)) for t, b, p in picks]
+            key = order_key("bench", i, n)
+            n += 1
+            start = time.perf_counter()
+            result = store.place(cart, key, f"client-{i}")
+            if rng.random() < args.duplicate_rate:
+                again = store.place(cart, key, f"client-{i}")
+                assert again["order_id"] == result["order_id"], (result, again)
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                latencies.append(elapsed)
+                statuses[result["status"]] = statuses.get(result["status"], 0) + 1
+                if result["status"] == "placed":
+                    keys.add(key)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    store.close()
+
+    # Stock sold (per the stock table) must equal the quantities in order lines
+    with contextlib.closing(sqlite3.connect(path)) as connection:
+        orders = connection.execute("SELECT COUNT(*) FROM orders").fetchone()[0]
+        stock_left = dict(
+            ((t, b), q)
+            for t, b, q in connection.execute(
+                "SELECT product_type, product_brand, quantity FROM stock"
+            )
+        )
+        sold_lines = dict(
+            ((t, b), q)
+            for t, b, q in connection.execute(
+                "SELECT lower(product_type), lower(product_brand), SUM(quantity) "
+                "FROM order_lines GROUP BY 1, 2"
+            )
+        )
+    oversold = sum(quantity < 0 for quantity in stock_left.values())
+    mismatched = sum(
+        args.hot_stock - left != sold_lines.get(sku, 0)
+        for sku, left in stock_left.items()
+    )
+    shutil.rmtree(directory, ignore_errors=True)
+
+    usage = store.usage()
+    return {
+        "orders_per_sec": round(statuses.get("placed", 0) / elapsed, 1),
+        "latency": summarize(latencies),
+        "statuses": statuses,
+        "store": usage,
+        "orders_written": orders,
+        "duplicates_written": orders - len(keys),
+        "oversold_skus": oversold,
+        "stock_mismatches": mismatched,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--modes", default="single,group", help="single,group")
+    parser.add_argument("--clients", default="1,16,64", help="Comma-separated clients")
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds per run")
+    parser.add_argument("--cart-items", type=int, default=4, help="Lines per order")
+    parser.add_argument("--hot-skus", type=int, default=5, help="SKUs with stock")
+    parser.add_argument("--hot-stock", type=int, default=100000, help="Their stock")
+    parser.add_argument(
+        "--hot-rate", type=float, default=0.5, help="Share of carts with a hot SKU"
+    )
+    parser.add_argument(
+        "--duplicate-rate", type=float, default=0.05, help="Orders submitted twice"
+    )
+    parser.add_argument("--batch-size", type=int, default=256, help="Orders/commit")
+    parser.add_argument("--flush-ms", type=float, default=0.0, help="Batch wait")
+    parser.add_argument("--sync", default="FULL", help="SQLite synchronous pragma")
+    parser.add_argument("--no-save", action="store_true", help="Do not store results")
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        from chatbot import data_loader
+    catalog = data_loader.data.drop_duplicates(["product_type", "product_brand"])
+    skus = list(
+        zip(
+            catalog["product_type"].astype(str),
+            catalog["product_brand"].astype(str),
+            catalog["product_price"].astype(float).round(2),
+        )
+    )
+
+    for clients in (int(c) for c in args.clients.split(",")):
+        print(f"\n=== clients: {clients} ===")
+        for mode in args.modes.split(","):
+            metrics = run_mode(mode, clients, args, skus)
+            latency, store = metrics["latency"], metrics["store"]
+            print(
+                f"{mode:<6}  {metrics['orders_per_sec']:>8.1f} orders/s  "
+                f"p50 {latency['p50_ms']:.2f} ms  p99 {latency['p99_ms']:.2f} ms  "
+                f"{store['orders_per_commit']:.1f} orders/commit  "
+                f"conflicts {store.get('conflicts', 0)}  "
+                f"out of stock {metrics['statuses'].get('out_of_stock', 0)}  "
+                f"duplicates {store.get('duplicate', 0)} "
+                f"(written {metrics['duplicates_written']})  "
+                f"oversold {metrics['oversold_skus']}  "
+                f"stock mismatches {metrics['stock_mismatches']}"
+            )
+            if not args.no_save:
+                params = {
+                    k: v for k, v in vars(args).items() if k not in ("modes", "no_save")
+                }
+                save_result("orders", dict(params, mode=mode, clients=clients), metrics)
+
+
+if __name__ == "__main__":
+    main()
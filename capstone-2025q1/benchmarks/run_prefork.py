@@ -0,0 +1,188 @@
+"""
+Benchmark of the pre-fork worker model against independently started workers
+
+For every catalog size, mode and worker count, a fresh supervisor process starts
+the chatbot workers with chatbot.prefork.PreforkServer:
+
+- fork: the supervisor loads and indexes the catalog once, in shared read-only
+  memory, and forks the workers
+- spawn: every worker loads and indexes its own catalog (independent processes)
+
+Concurrent sessions then play the conversation scripts against the workers with
+the scripted stand-in model. Reports the startup time, turns per second, and the
+memory of the workers: private (USS) and proportional (PSS) per worker, and the
+PSS of the whole deployment.
+
+Usage (from capstone-2025q1):
+    python -m benchmarks.run_prefork
+    python -m benchmarks.run_prefork --sizes 1000000 --workers 1,2,4 --llm-latency-ms 50
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+
+from benchmarks.catalog import CATALOG_SIZES
+from benchmarks.results import save_result, summarize
+from benchmarks.scripts import list_scripts, load_script, session_turns
+from benchmarks.stub_llm import ScriptedChatModel
+from benchmarks.worker import run_worker_process
+
+
+def install_model(script_names, latency_ms):
+    """Installs the scripted stand-in model (before the chatbot is imported)"""
+    import chatbot.llm
+
+    scripts = [load_script(name) for name in script_names.split(",")]
+    chatbot.llm.llm = ScriptedChatModel.from_scripts(scripts, latency_ms=latency_ms)
+    chatbot.llm.llm_tiers = {}
+
+
+def session_ids(workers, per_worker):
+    """Session ids spread evenly over the workers (per_worker sessions each)"""
+    from chatbot.prefork import worker_for
+
+    ids, counts = [], [0] * workers
+    candidate = 0
+    while len(ids) < workers * per_worker:
+        worker = worker_for(f"session-{candidate}", workers)
+        if counts[worker] < per_worker:
+            ids.append(f"session-{candidate}")
+            counts[worker] += 1
+        candidate += 1
+    return ids
+
+
+def run_worker(args):
+    """Starts the workers with one mode and count, and measures them"""
+    from chatbot.prefork import PreforkServer, process_memory
+
+    scripts = [load_script(name) for name in args.scripts.split(",")]
+    turns = session_turns(scripts)
+    start = time.perf_counter()
+    server = PreforkServer(
+        args.workers,
+        start_method=args.mode,
+        initializer=install_model,
+        initargs=(args.scripts, args.llm_latency_ms),
+    ).start()
+    try:
+        # Every worker answers once (a spawned worker is ready after its import)
+        for session_id in session_ids(args.workers, 1):
+            server.chat(session_id, turns[0])
+            server.end_session(session_id)
+        startup_ms = (time.perf_counter() - start) * 1000
+
+        latencies = []
+        lock = threading.Lock()
+
+        def play(session_id):
+            samples = []
+            for user_input in turns:
+                turn_start = time.perf_counter()
+                server.chat(session_id, user_input)
+                samples.append((time.perf_counter() - turn_start) * 1000)
+            server.end_session(session_id)
+            with lock:
+                latencies.extend(samples)
+
+        clients = [
+            threading.Thread(target=play, args=(session_id,))
+            for session_id in session_ids(args.workers, args.sessions_per_worker)
+        ]
+        start = time.perf_counter()
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join()
+        elapsed = time.perf_counter() - start
+
+        workers = list(server.memory().values())
+        supervisor = process_memory(os.getpid())
+    finally:
+        server.close()
+
+    def mean(key):
+        return round(sum(w.get(key, 0) for w in workers) / max(len(workers), 1))
+
+    metrics = {
+        "startup_ms": round(startup_ms, 3),
+        "sessions": len(clients),
+        "turns_per_sec": round(len(latencies) / elapsed, 2),
+        "turn": summarize(latencies),
+        "worker_uss_bytes": mean("uss"),
+        "worker_pss_bytes": mean("pss"),
+        "worker_rss_bytes": mean("rss"),
+        "supervisor_pss_bytes": supervisor.get("pss", 0),
+        "total_pss_bytes": sum(w.get("pss", 0) for w in workers)
+        + supervisor.get("pss", 0),
+    }
+    with open(args.worker_output, "w", encoding="utf-8") as f:
+        json.dump(metrics, f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--sizes",
+        default=",".join(str(s) for s in CATALOG_SIZES),
+        help="Comma-separated catalog sizes (rows)",
+    )
+    parser.add_argument("--modes", default="spawn,fork", help="spawn,fork")
+    parser.add_argument("--workers", default="1,2,4", help="Comma-separated counts")
+    parser.add_argument(
+        "--scripts",
+        default=",".join(list_scripts()),
+        help="Comma-separated script names or paths",
+    )
+    parser.add_argument(
+        "--sessions-per-worker", type=int, default=4, help="Concurrent sessions"
+    )
+    parser.add_argument(
+        "--llm-latency-ms", type=float, default=0.0, help="Simulated model latency"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Catalog generator seed")
+    parser.add_argument("--verbose", action="store_true", help="Show chatbot logs")
+    parser.add_argument("--no-save", action="store_true", help="Do not store results")
+    parser.add_argument("--mode", help=argparse.SUPPRESS)
+    parser.add_argument("--worker-output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker_output:
+        args.workers = int(args.workers)
+        run_worker(args)
+        return
+
+    print(f"[INFO] {os.cpu_count()} CPU cores")
+    for size in (int(s) for s in args.sizes.split(",")):
+        print(f"\n=== catalog rows: {size} ===")
+        for mode in args.modes.split(","):
+            for workers in (int(n) for n in args.workers.split(",")):
+                options = {
+                    "mode": mode,
+                    "workers": workers,
+                    "scripts": args.scripts,
+                    "sessions_per_worker": args.sessions_per_worker,
+                    "llm_latency_ms": args.llm_latency_ms,
+                }
+                metrics = run_worker_process(
+                    "benchmarks.run_prefork", size, args.seed, options, args.verbose
+                )
+                print(
+                    f"{mode:<6} {workers:>2} workers  startup "
+                    f"{metrics['startup_ms']:>7.0f} ms  "
+                    f"{metrics['turns_per_sec']:>8.2f} turns/s  "
+                    f"p95 {metrics['turn']['p95_ms']:>7.2f} ms  "
+                    f"USS/worker {metrics['worker_uss_bytes'] / 2**20:>6.1f} MiB  "
+                    f"PSS/worker {metrics['worker_pss_bytes'] / 2**20:>6.1f} MiB  "
+                    f"total PSS {metrics['total_pss_bytes'] / 2**20:>7.1f} MiB"
+                )
+                if not args.no_save:
+                    params = dict(options, rows=size, seed=args.seed)
+                    save_result("prefork", params, metrics)
+
+
+if __name__ == "__main__":
+    main()
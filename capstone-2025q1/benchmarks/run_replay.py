@@ -0,0 +1,310 @@
+"""
+Replay of recorded chatbot transcripts, without model calls
+
+A transcript is the JSONL file written with CHATBOT_RECORD_FILE (see
+chatbot/recording.py): per turn, the user message, the model outputs, the tool
+results, the reply and the cart. For every catalog size, a worker process plays
+the recorded sessions again through the graph with
+benchmarks.stub_llm.ReplayChatModel, which returns the recorded model outputs
+(no Gemini call, no model latency unless --llm-latency-ms), so the measured turn
+latency is the latency of the chatbot itself. Reports:
+
+- turn latency of the replay, next to the latency recorded in production
+- turns whose reply, cart or tool results differ from the recording (a change
+  of behavior between the recorded version and this one)
+- model requests matched to their recorded turn, and the bytes of the sessions
+
+With --speed, turns start at their recorded times (divided by the speed), so
+the replay follows the traffic pattern of the recording. Results are stored per
+transcript (by content hash), so `benchmarks.compare replay` compares versions.
+
+--record plays generated shopper sessions with the scripted stand-in model and
+writes their transcript, for a replay without production traffic.
+
+Usage (from capstone-2025q1):
+    python -m benchmarks.run_replay --record transcripts/shoppers.jsonl
+    python -m benchmarks.run_replay transcripts/shoppers.jsonl
+    python -m benchmarks.run_replay production.jsonl --concurrency 8 --speed 10
+"""
+
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import resource
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.results import save_result, summarize
+from benchmarks.worker import run_worker_process
+
+# Fields of a turn compared between the recording and the replay
+COMPARED = ("reply", "cart", "tools", "model")
+
+
+def _comparable(turn, field):
+    if field == "tools":
+        return [(t["name"], t["content"]) for t in turn["tools"]]
+    if field == "model":
+        return [
+            (o["content"], [(c["name"], c["args"]) for c in o.get("tool_calls", ())])
+            for o in turn["model"]
+        ]
+    return turn[field]
+
+
+def compare_transcripts(recorded, replayed, examples=5):
+    """Counts the turns of every compared field that differ between transcripts"""
+    diverged = {field: 0 for field in COMPARED}
+    missing, samples = 0, []
+    for session_id, turns in recorded.items():
+        others = replayed.get(session_id, [])
+        missing += max(0, len(turns) - len(others))
+        for i, (turn, other) in enumerate(zip(turns, others)):
+            for field in COMPARED:
+                if _comparable(turn, field) != _comparable(other, field):
+                    diverged[field] += 1
+                    if len(samples) < examples:
+                        samples.append(
+                            {"session": session_id, "turn": i, "field": field}
+                        )
+    return {**diverged, "missing": missing, "examples": samples}
+
+
+def replay_sessions(chatbot_main, sessions, concurrency, speed):
+    """Plays the sessions of a transcript; returns turn latencies and session bytes"""
+    from chatbot.sessions import deep_size
+
+    first = min(turn["time"] for turns in sessions.values() for turn in turns)
+    origin = time.monotonic()
+    lock = threading.Lock()
+    latencies, session_bytes = [], []
+
+    def play(session_id):
+        state, history = chatbot_main.new_session()
+        for turn in sessions[session_id]:
+            if speed > 0:
+                delay = origin + (turn["time"] - first) / speed - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            start = time.perf_counter()
+            state, _, _ = chatbot_main.chat_turn(
+                state, history, turn["user"], session_id=session_id
+            )
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                latencies.append(elapsed)
+        size = deep_size(state) + deep_size(history)
+        with lock:
+            session_bytes.append(size)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(play, sessions))
+    return latencies, session_bytes
+
+
+def run_worker(args):
+    """Replays the transcript against the catalog given by CHATBOT_DATA_FILE"""
+    # The replay is recorded as well (set before the chatbot configuration is
+    # imported), then compared with the recording
+    os.environ["CHATBOT_RECORD_FILE"] = args.replay_output
+    import chatbot.llm
+    from benchmarks.stub_llm import ReplayChatModel
+    from chatbot.recording import read_transcript
+
+    recorded = read_transcript(args.transcript_file)
+
+    model = ReplayChatModel.from_transcript(recorded, latency_ms=args.llm_latency_ms)
+    chatbot.llm.llm = model
+    chatbot.llm.llm_tiers = {}
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        from chatbot import main
+        from chatbot.recording import transcript_recorder
+
+        start = time.perf_counter()
+        latencies, session_bytes = replay_sessions(
+            main, recorded, args.concurrency, args.speed
+        )
+        elapsed = time.perf_counter() - start
+    transcript_recorder.close()
+
+    metrics = {
+        "sessions": len(recorded),
+        "turns": len(latencies),
+        "turns_per_sec": round(len(latencies) / elapsed, 2),
+        "turn": summarize(latencies),
+        "recorded_turn": summarize(
+            [turn["latency_ms"] for turns in recorded.values() for turn in turns]
+        ),
+        "session_bytes": round(sum(session_bytes) / max(len(session_bytes), 1)),
+        "diverged": compare_transcripts(recorded, read_transcript(args.replay_output)),
+        "model": dict(model.stats),
+        "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+    with open(args.worker_output, "w", encoding="utf-8") as f:
+        json.dump(metrics, f)
+
+
+def record_worker(args):
+    """Records a transcript of generated shopper sessions (scripted model)"""
+    import pandas as pd
+
+    from benchmarks.run_graph import load_chatbot
+    from benchmarks.scripts import shopper_scripts
+    from benchmarks.stub_llm import ScriptedChatModel
+
+    os.environ["CHATBOT_RECORD_FILE"] = args.record  # Before the chatbot imports
+    catalog = pd.read_csv(os.environ["CHATBOT_DATA_FILE"])
+    scripts = shopper_scripts(catalog, args.sessions, args.seed)
+    del catalog
+    model = ScriptedChatModel.from_scripts(
+        scripts, latency_ms=args.llm_latency_ms, latency_jitter=0.5
+    )
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        chatbot_main = load_chatbot(model)
+        from chatbot.recording import transcript_recorder
+
+        def play(i):
+            state, history = chatbot_main.new_session()
+            for turn in scripts[i]["turns"]:
+                state, _, _ = chatbot_main.chat_turn(
+                    state, history, turn["user"], session_id=f"shopper-{i}"
+                )
+
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            list(executor.map(play, range(len(scripts))))
+    transcript_recorder.close()
+    turns = sum(len(script["turns"]) for script in scripts)
+    with open(args.worker_output, "w", encoding="utf-8") as f:
+        json.dump({"sessions": len(scripts), "turns": turns}, f)
+
+
+def print_report(size, metrics):
+    turn, recorded = metrics["turn"], metrics["recorded_turn"]
+    diverged = metrics["diverged"]
+    print(f"\n=== catalog rows: {size} ===")
+    print(
+        f"replayed {metrics['turns']} turns of {metrics['sessions']} sessions  "
+        f"({metrics['turns_per_sec']:.1f} turns/s)"
+    )
+    print(
+        f"turn latency   p50 {turn['p50_ms']:.2f} ms  p95 {turn['p95_ms']:.2f}  "
+        f"p99 {turn['p99_ms']:.2f}   (recorded p50 {recorded['p50_ms']:.2f}  "
+        f"p95 {recorded['p95_ms']:.2f})"
+    )
+    print(f"session bytes  {metrics['session_bytes'] / 1024:.1f} KiB at the end")
+    print(
+        "diverged turns "
+        + "  ".join(f"{field} {diverged[field]}" for field in COMPARED)
+        + f"  missing {diverged['missing']}"
+    )
+    for example in diverged["examples"]:
+        print(
+            f"  {example['field']} differs: session {example['session']} "
+            f"turn {example['turn']}"
+        )
+    print(
+        "model requests "
+        + "  ".join(f"{name} {count}" for name, count in metrics["model"].items())
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("transcript", nargs="?", help="JSONL transcript to replay")
+    parser.add_argument("--sizes", default="1000", help="Comma-separated catalog sizes")
+    parser.add_argument(
+        "--concurrency", type=int, default=1, help="Sessions replayed at once"
+    )
+    parser.add_argument(
+        "--speed",
+        type=float,
+        default=0,
+        help="Start turns at their recorded times divided by this (0 = at once)",
+    )
+    parser.add_argument(
+        "--llm-latency-ms", type=float, default=0.0, help="Stand-in model latency"
+    )
+    parser.add_argument(
+        "--record", help="Write a transcript of generated shopper sessions here"
+    )
+    parser.add_argument(
+        "--sessions", type=int, default=50, help="Shopper sessions to --record"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Catalog generator seed")
+    parser.add_argument("--verbose", action="store_true", help="Show chatbot logs")
+    parser.add_argument("--no-save", action="store_true", help="Do not store results")
+    parser.add_argument("--transcript-file", help=argparse.SUPPRESS)
+    parser.add_argument("--replay-output", help=argparse.SUPPRESS)
+    parser.add_argument("--worker-output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker_output:
+        if args.record:
+            record_worker(args)
+        else:
+            run_worker(args)
+        return
+
+    if args.record:
+        if os.path.exists(args.record):
+            os.remove(args.record)  # The recorder appends
+        options = {
+            "record": os.path.abspath(args.record),
+            "sessions": args.sessions,
+            "concurrency": args.concurrency,
+            "llm_latency_ms": args.llm_latency_ms,
+        }
+        size = int(args.sizes.split(",")[0])
+        result = run_worker_process(
+            "benchmarks.run_replay", size, args.seed, options, args.verbose
+        )
+        print(
+            f"Recorded {result['turns']} turns of {result['sessions']} sessions "
+            f"to {args.record}"
+        )
+        return
+    if not args.transcript:
+        parser.error("a transcript (or --record) is required")
+
+    with open(args.transcript, "rb") as f:
+        digest = hashlib.sha1(f.read()).hexdigest()[:12]
+    with open(args.transcript, encoding="utf-8") as f:
+        first = json.loads(f.readline())
+    # Model requests are keyed by the history window of the recording
+    os.environ["CHATBOT_HISTORY_WINDOW"] = str(first.get("window", 40))
+    for size in (int(s) for s in args.sizes.split(",")):
+        with tempfile.NamedTemporaryFile(suffix=".jsonl", delete=False) as f:
+            replay_output = f.name
+        options = {
+            "transcript_file": os.path.abspath(args.transcript),
+            "concurrency": args.concurrency,
+            "speed": args.speed,
+            "llm_latency_ms": args.llm_latency_ms,
+            "replay_output": replay_output,
+        }
+        try:
+            metrics = run_worker_process(
+                "benchmarks.run_replay", size, args.seed, options, args.verbose
+            )
+        finally:
+            os.remove(replay_output)
+        print_report(size, metrics)
+        if not args.no_save:
+            params = {
+                "transcript": os.path.basename(args.transcript),
+                "transcript_sha1": digest,
+                "concurrency": args.concurrency,
+                "speed": args.speed,
+                "llm_latency_ms": args.llm_latency_ms,
+                "rows": size,
+                "seed": args.seed,
+            }
+            save_result("replay", params, metrics)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+Benchmark of cart repricing on catalog price updates
+
+For every catalog size, a worker process fills many session carts with random
+SKUs of the catalog (the carts are indexed by chatbot.repricing.CartRepricer as
+after a turn), then applies rounds of price updates of random SKUs. Reports,
+per round:
+
+- incremental repricing: the catalog update and reverse-index lookup
+  (apply()), then refresh() of every session, as at its next turn (only the
+  affected carts are repriced)
+- a full scan: every line of every cart looked up again in the catalog with a
+  mask per line (the add_to_cart lookup), measured on --scan-sessions
+  sessions and scaled to all of them
+- carts and lines repriced, and whether the incremental carts match the scan
+
+Usage (from capstone-2025q1):
+    python -m benchmarks.run_repricing
+    python -m benchmarks.run_repricing --sizes 100000 --sessions 50000 --updates 500
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import time
+
+import numpy as np
+
+from benchmarks.results import save_result, summarize
+from benchmarks.worker import run_worker_process
+
+
+def scan_cart(frame, cart):
+    """Cart with every line priced again by a catalog lookup (the full scan)"""
+    from chatbot.cart import Cart, CartItem
+    from chatbot.data_loader import catalog_records
+
+    items = []
+    for item in cart:
+        matches = frame[
+            (frame["product_type"].str.lower() == item.product_type.lower())
+            & (frame["product_brand"].str.lower() == item.product_brand.lower())
+        ]
+        price = catalog_records(matches.iloc[:1])[0]["product_price"]
+        items.append(
+            CartItem(item.product_type, item.product_brand, price, item.quantity)
+        )
+    return Cart(items)
+
+
+def run_worker(args):
+    with contextlib.redirect_stdout(io.StringIO()):
+        from chatbot import data_loader
+        from chatbot.cart import Cart, CartItem
+        from chatbot.repricing import CartRepricer
+
+    frame = data_loader.data
+    rng = np.random.default_rng(args.seed)
+    # One row per SKU (lowercase product type and brand): what carts hold
+    skus = frame.drop_duplicates(["product_type", "product_brand"])
+    types = skus["product_type"].astype(str).to_numpy()
+    brands = skus["product_brand"].astype(str).to_numpy()
+    prices = skus["product_price"].astype(np.float64).round(2).to_numpy()
+
+    repricer = CartRepricer()
+    states = {}
+    for i in range(args.sessions):
+        size = min(args.cart_items, len(skus))
+        picks = rng.choice(len(skus), size=size, replace=False)
+        cart = Cart(
+            CartItem(types[p], brands[p], prices[p], int(rng.integers(1, 4)))
+            for p in picks
+        )
+        states[f"session-{i}"] = {"cart_items": cart}
+        repricer.track(f"session-{i}", cart)
+
+    scanned = list(states)[: args.scan_sessions]
+    apply_ms, refresh_ms, scan_ms, carts, lines, mismatches = [], [], [], [], [], 0
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(args.rounds):
+            size = min(args.updates, len(skus))
+            picks = rng.choice(len(skus), size=size, replace=False)
+            factors = rng.uniform(0.8, 1.2, size=len(picks))
+            before = repricer.usage()
+            start = time.perf_counter()
+            repricer.apply(types[picks], brands[picks], prices[picks] * factors)
+            apply_ms.append((time.perf_counter() - start) * 1000)
+            start = time.perf_counter()
+            for session_id, state in states.items():  # Next turn of every session
+                cart = state["cart_items"]
+                version = repricer.refresh(session_id, state)
+                if state["cart_items"] is not cart:
+                    repricer.track(session_id, state["cart_items"], version)
+            refresh_ms.append((time.perf_counter() - start) * 1000)
+            after = repricer.usage()
+            for counts, name in ((carts, "carts_repriced"), (lines, "lines_repriced")):
+                counts.append(after.get(name, 0) - before.get(name, 0))
+
+            start = time.perf_counter()
+            rescanned = {s: scan_cart(frame, states[s]["cart_items"]) for s in scanned}
+            elapsed = (time.perf_counter() - start) * 1000
+            scan_ms.append(elapsed * len(states) / max(len(scanned), 1))
+            mismatches += sum(
+                rescanned[s] != states[s]["cart_items"] for s in scanned
+            )
+            prices[picks] = np.round(
+                (prices[picks] * factors).astype(np.float32).astype(np.float64), 2
+            )
+
+    incremental = [a + r for a, r in zip(apply_ms, refresh_ms)]
+    metrics = {
+        "skus": len(skus),
+        "apply": summarize(apply_ms),
+        "refresh": summarize(refresh_ms),
+        "incremental": summarize(incremental),
+        "full_scan_estimated": summarize(scan_ms),
+        "carts_repriced_per_round": round(sum(carts) / len(carts), 1),
+        "lines_repriced_per_round": round(sum(lines) / len(lines), 1),
+        "scan_mismatches": int(mismatches),
+        "usage": repricer.usage(),
+    }
+    with open(args.worker_output, "w", encoding="utf-8") as f:
+        json.dump(metrics, f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--sizes", default="1000,100000", help="Comma-separated catalog sizes"
+    )
+    parser.add_argument(
+        "--sessions", type=int, default=10000, help="Carts of live sessions"
+    )
+    parser.add_argument("--cart-items", type=int, default=5, help="Lines per cart")
+    parser.add_argument(
+        "--updates", type=int, default=100, help="SKUs repriced per round"
+    )
+    parser.add_argument("--rounds", type=int, default=5, help="Price update rounds")
+    parser.add_argument(
+        "--scan-sessions", type=int, default=50, help="Carts rescanned per round"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Catalog generator seed")
+    parser.add_argument("--verbose", action="store_true", help="Show chatbot logs")
+    parser.add_argument("--no-save", action="store_true", help="Do not store results")
+    parser.add_argument("--worker-output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker_output:
+        run_worker(args)
+        return
+
+    for size in (int(s) for s in args.sizes.split(",")):
+        options = {
+            "sessions": args.sessions,
+            "cart_items": args.cart_items,
+            "updates": args.updates,
+            "rounds": args.rounds,
+            "scan_sessions": args.scan_sessions,
+            "seed": args.seed,
+        }
+        metrics = run_worker_process(
+            "benchmarks.run_repricing", size, args.seed, options, args.verbose
+        )
+        print(f"\n=== catalog rows: {size} ({metrics['skus']} SKUs) ===")
+        print(
+            f"incremental  p50 {metrics['incremental']['p50_ms']:.2f} ms  "
+            f"(apply {metrics['apply']['p50_ms']:.2f} ms, "
+            f"refresh {metrics['refresh']['p50_ms']:.2f} ms)"
+        )
+        print(
+            f"full scan    p50 {metrics['full_scan_estimated']['p50_ms']:.0f} ms "
+            f"(estimated from {args.scan_sessions} of {args.sessions} carts)"
+        )
+        print(
+            f"repriced     {metrics['carts_repriced_per_round']:.0f} carts, "
+            f"{metrics['lines_repriced_per_round']:.0f} lines per round  "
+            f"mismatches with the scan: {metrics['scan_mismatches']}"
+        )
+        if not args.no_save:
+            params = dict(options, rows=size)
+            save_result("repricing", params, metrics)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Benchmark of the session store: many sessions within a memory budget
+
+For every catalog size and memory budget, a fresh worker process plays the
+conversation scripts in many sessions, one turn of every session after the
+other (all sessions stay open), with chatbot.sessions.SessionStore holding the
+sessions. With a budget, the least recently used sessions are spilled to disk
+and loaded back on their next turn. Reports:
+
+- process memory growth (RSS) per session, and the bytes the store accounted
+- resident and spilled sessions, bytes on disk per spilled session
+- turn latency, and the latency of loading a spilled session back
+
+Usage (from capstone-2025q1):
+    python -m benchmarks.run_sessions
+    python -m benchmarks.run_sessions --sizes 1000 --sessions 500 --budgets-mb 0,1,4
+"""
+
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import time
+
+from benchmarks.results import save_result, summarize
+from benchmarks.run_prefork import install_model
+from benchmarks.scripts import list_scripts, load_script, session_turns
+from benchmarks.worker import run_worker_process
+
+
+def run_worker(args):
+    from chatbot.prefork import process_memory
+
+    install_model(args.scripts, 0)
+    with contextlib.redirect_stdout(io.StringIO()):
+        from chatbot import main
+        from chatbot.configs import SYSTEM_PROMPT, get_welcome_message
+        from chatbot.sessions import SessionStore
+
+        turns = session_turns([load_script(n) for n in args.scripts.split(",")])
+        turns = turns[: args.turns]
+        # Warm-up session: imports, caches and catalog-derived objects
+        state, history = main.new_session()
+        for user_input in turns:
+            main.chat_turn(state, history, user_input)
+        del state, history
+    gc.collect()
+    rss_before = process_memory(os.getpid()).get("rss", 0)
+
+    store = SessionStore(
+        main.new_session,
+        budget_bytes=int(args.budget_mb * 2**20),
+        ttl=0,
+        shared=(SYSTEM_PROMPT, get_welcome_message()),
+    )
+    session_ids = [f"session-{i}" for i in range(args.sessions)]
+    latencies, loads, sizes = [], [], {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        for user_input in turns:
+            for session_id in session_ids:
+                start = time.perf_counter()
+                loaded = store.stats["loaded"]
+                state, history = store.get(session_id)
+                if store.stats["loaded"] > loaded:
+                    loads.append((time.perf_counter() - start) * 1000)
+                state, _, _ = main.chat_turn(state, history, user_input)
+                store.put(session_id, state, history)
+                sizes[session_id] = store.session_bytes(session_id)
+                latencies.append((time.perf_counter() - start) * 1000)
+    del state, history
+    gc.collect()
+    rss_after = process_memory(os.getpid()).get("rss", 0)
+    usage = store.usage()
+    store.close()
+
+    metrics = {
+        "rss_growth_bytes_per_session": round((rss_after - rss_before) / args.sessions),
+        "accounted_bytes_per_session": round(sum(sizes.values()) / len(sizes)),
+        "disk_bytes_per_spilled_session": round(
+            usage["spilled_bytes"] / max(usage["spilled_sessions"], 1)
+        ),
+        "turn": summarize(latencies),
+        "load": summarize(loads),
+        "usage": usage,
+    }
+    with open(args.worker_output, "w", encoding="utf-8") as f:
+        json.dump(metrics, f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="1000", help="Comma-separated catalog sizes")
+    parser.add_argument(
+        "--budgets-mb", default="0,1", help="Comma-separated budgets (0 = no budget)"
+    )
+    parser.add_argument("--sessions", type=int, default=300, help="Open sessions")
+    parser.add_argument("--turns", type=int, default=12, help="Turns per session")
+    parser.add_argument(
+        "--scripts",
+        default=",".join(list_scripts()),
+        help="Comma-separated script names or paths",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Catalog generator seed")
+    parser.add_argument("--verbose", action="store_true", help="Show chatbot logs")
+    parser.add_argument("--no-save", action="store_true", help="Do not store results")
+    parser.add_argument("--budget-mb", type=float, help=argparse.SUPPRESS)
+    parser.add_argument("--worker-output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker_output:
+        run_worker(args)
+        return
+
+    for size in (int(s) for s in args.sizes.split(",")):
+        print(f"\n=== catalog rows: {size} ===")
+        for budget_mb in (float(b) for b in args.budgets_mb.split(",")):
+            options = {
+                "budget_mb": budget_mb,
+                "sessions": args.sessions,
+                "turns": args.turns,
+                "scripts": args.scripts,
+            }
+            metrics = run_worker_process(
+                "benchmarks.run_sessions", size, args.seed, options, args.verbose
+            )
+            usage = metrics["usage"]
+            print(
+                f"budget {budget_mb:>5.1f} MiB  "
+                f"RSS +{metrics['rss_growth_bytes_per_session'] / 1024:>6.1f} KiB/session  "
+                f"accounted {metrics['accounted_bytes_per_session'] / 1024:>6.1f} KiB/session  "
+                f"resident {usage['resident_sessions']:>4} "
+                f"({usage['resident_bytes'] / 2**20:.2f} MiB)  "
+                f"spilled {usage['spilled_sessions']:>4} "
+                f"({metrics['disk_bytes_per_spilled_session'] / 1024:.1f} KiB each)  "
+                f"turn p50 {metrics['turn']['p50_ms']:.2f} ms  "
+                f"load p50 {metrics['load'].get('p50_ms', 0):.2f} ms"
+            )
+            if not args.no_save:
+                params = dict(options, rows=size, seed=args.seed)
+                save_result("sessions", params, metrics)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Benchmark of the per-turn tool selection against the conversation scripts
+
+For every scripted user turn, checks that the selected subset contains every tool
+the script calls (recall), with the tools of the previous turn of the script as
+context and the cart tools kept once the script added to the cart, and reports
+the size of the bound tool declarations against binding all tools, plus the
+selection and binding time per turn.
+
+Usage (from capstone-2025q1):
+    python -m benchmarks.run_tool_selection
+    python -m benchmarks.run_tool_selection --top-k 3 --verbose
+"""
+
+import argparse
+import contextlib
+import io
+import time
+
+from benchmarks.results import save_result, summarize
+from benchmarks.scripts import list_scripts, load_script
+from benchmarks.stub_llm import ScriptedChatModel
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scripts", default=",".join(list_scripts()))
+    parser.add_argument("--top-k", type=int, default=4, help="Tools selected per turn")
+    parser.add_argument("--min-score", type=float, default=0.1, help="Similarity floor")
+    parser.add_argument("--repeats", type=int, default=200, help="Timing repetitions")
+    parser.add_argument("--verbose", action="store_true", help="Print every turn")
+    parser.add_argument("--no-save", action="store_true", help="Do not store results")
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        from chatbot.tool_selection import CART_TOOLS, ToolSelector, schema_tokens
+        from chatbot.tools import all_tools
+
+        selector = ToolSelector(
+            ScriptedChatModel(), all_tools, top_k=args.top_k, min_score=args.min_score
+        )
+        selector.select("")  # Builds the catalog vocabulary
+
+    turns, contexts, carts = [], [], []
+    for name in args.scripts.split(","):
+        previous, cart = [], False
+        for turn in load_script(name)["turns"]:
+            turns.append(turn)
+            contexts.append(previous)
+            carts.append(cart)
+            previous = [call["name"] for step in turn["steps"] for call in step]
+            if "add_to_cart" in previous:
+                cart = True
+            if "clear_cart" in previous or "checkout" in previous:
+                cart = False
+    all_tokens = schema_tokens(list(selector.schemas.values()))
+    misses, bound_tokens, bound_counts = [], [], []
+    for turn, context, cart in zip(turns, contexts, carts):
+        needed = {call["name"] for step in turn["steps"] for call in step}
+        selected = selector.select(turn["user"], context, CART_TOOLS if cart else ())
+        bound_tokens.append(schema_tokens([selector.schemas[n] for n in selected]))
+        bound_counts.append(len(selected))
+        if not needed <= set(selected):
+            misses.append((turn["user"], sorted(needed - set(selected))))
+        if args.verbose:
+            mark = "ok  " if needed <= set(selected) else "MISS"
+            print(f"{mark} {turn['user']!r:<60} {selected}")
+
+    # Per-turn cost: selection + (cached) binding vs converting every tool each time
+    select_ms, bind_ms, full_bind_ms = [], [], []
+    for i in range(args.repeats):
+        text, context = turns[i % len(turns)]["user"], contexts[i % len(turns)]
+        start = time.perf_counter()
+        names = selector.select(text, context)
+        select_ms.append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        selector.bind(names)
+        bind_ms.append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        selector.llm.bind_tools(all_tools)
+        full_bind_ms.append((time.perf_counter() - start) * 1000)
+
+    mean_tokens = sum(bound_tokens) / len(bound_tokens)
+    metrics = {
+        "turns": len(turns),
+        "recall": round(1 - len(misses) / len(turns), 4),
+        "misses": misses,
+        "tools_all": len(all_tools),
+        "tools_bound_mean": round(sum(bound_counts) / len(bound_counts), 2),
+        "schema_tokens_all": all_tokens,
+        "schema_tokens_mean": round(mean_tokens, 1),
+        "schema_tokens_saved_pct": round(100 * (1 - mean_tokens / all_tokens), 1),
+        "select": summarize(select_ms),
+        "bind_cached": summarize(bind_ms),
+        "bind_all_uncached": summarize(full_bind_ms),
+    }
+
+    print(f"\nturns            {metrics['turns']}  recall {metrics['recall']:.1%}")
+    for text, missing in misses:
+        print(f"  missed         {missing} for {text!r}")
+    print(
+        f"tools bound      {metrics['tools_bound_mean']:.1f} of "
+        f"{metrics['tools_all']} per turn"
+    )
+    print(
+        f"schema tokens    {metrics['schema_tokens_mean']:.0f} of {all_tokens} "
+        f"per request (-{metrics['schema_tokens_saved_pct']:.0f}%)"
+    )
+    print(
+        f"per turn         select {metrics['select']['p50_ms']:.3f} ms + bind "
+        f"{metrics['bind_cached']['p50_ms']:.3f} ms (binding all tools uncached: "
+        f"{metrics['bind_all_uncached']['p50_ms']:.3f} ms)"
+    )
+    if not args.no_save:
+        params = {
+            "scripts": args.scripts,
+            "top_k": args.top_k,
+            "min_score": args.min_score,
+        }
+        save_result("tool_selection", params, metrics)
+
+
+if __name__ == "__main__":
+    main()
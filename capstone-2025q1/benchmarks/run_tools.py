@@ -0,0 +1,236 @@
+"""
+Microbenchmarks for every tool in chatbot.tools.all_tools
+
+Each tool is invoked directly (like ToolNode does) on its exact-hit, fuzzy-hit
+and miss paths, over synthetic catalogs of increasing size. Reports ops/sec and
+the memory allocated per call (peak transient and retained bytes).
+
+Usage (from capstone-2025q1):
+    python -m benchmarks.run_tools
+    python -m benchmarks.run_tools --sizes 1000,100000 --tools search_ingredient_by_review,greeting
+"""
+
+import argparse
+import contextlib
+import gc
+import json
+import os
+import time
+import tracemalloc
+
+from benchmarks.catalog import CATALOG_SIZES
+from benchmarks.results import save_result
+from benchmarks.worker import run_worker_process
+
+# Arguments per tool and path. Tools without arguments only have a "default" path.
+TOOL_CASES = {
+    "search_category_by_type": {
+        "exact": {"category_type": "dairy"},
+        "fuzzy": {"category_type": "veggies"},
+        "miss": {"category_type": "electronics"},
+    },
+    "search_category_by_type_all": {"default": {}},
+    "search_multiple_ingredients": {
+        "exact": {"product_names": ["Apple", "Popcorn"]},
+        "fuzzy": {"product_names": ["Aple", "Popcon"]},
+        "miss": {"product_names": ["Durian", "Caviar"]},
+    },
+    "search_ingredient_by_type_all": {"default": {}},
+    "search_ingredient_by_brand": {
+        "exact": {"product_type": "Milk", "brand": "DairyPure"},
+        "fuzzy": {"product_type": "carots", "brand": "FreshFarn"},
+        "miss": {"product_type": "Durian"},
+    },
+    "search_ingredient_by_rating": {
+        "exact": {"product_type": "Apple", "min_rating": 4.5},
+        "fuzzy": {"product_type": "Aple", "min_rating": 4.5},
+        "miss": {"product_type": "Durian", "min_rating": 4.5},
+    },
+    "search_ingredient_by_price": {
+        "exact": {"product_type": "Milk", "max_price": 4.3},
+        "fuzzy": {"product_type": "Mlk", "max_price": 4.3},
+        "miss": {"product_type": "Durian", "max_price": 4.3},
+    },
+    "search_ingredient_by_review": {
+        "exact": {"product_type": "Popcorn", "min_reviews": 80},
+        "fuzzy": {"category_type": "snaks", "min_reviews": 100},
+        "miss": {"product_type": "Durian"},
+        "all": {"min_reviews": 150},
+    },
+    "search_catalog": {
+        "exact": {
+            "category_type": "Dairy",
+            "max_price": 5.0,
+            "min_rating": 4.4,
+            "min_reviews": 90,
+            "sort_by": "rating",
+        },
+        "fuzzy": {"product_type": "carots", "brands": ["FreshFarn", "GreenLeaf"]},
+        "miss": {"category_type": "electronics"},
+        "all": {"min_reviews": 150, "sort_by": "reviews"},
+    },
+    "compare_ingredient_by_rating": {
+        "exact": {"product_type": "Chicken Breast"},
+        "fuzzy": {"product_type": "Chiken Breast"},
+        "miss": {"product_type": "Durian"},
+    },
+    "compare_ingredient_by_price": {
+        "exact": {"product_type": "Chicken Breast"},
+        "fuzzy": {"product_type": "Chiken Breast"},
+        "miss": {"product_type": "Durian"},
+    },
+    "compare_ingredient_by_review": {
+        "exact": {"product_type": "Chicken Breast"},
+        "fuzzy": {"product_type": "Chiken Breast"},
+        "miss": {"product_type": "Durian"},
+    },
+    "view_cart": {"default": {}},
+    "add_to_cart": {
+        "exact": {"product_type": "Carrot", "brand": "FreshFarm", "quantity": 2},
+        "miss": {"product_type": "Durian", "brand": "FreshFarm", "quantity": 2},
+    },
+    "remove_from_cart": {"default": {"product_type": "Carrot", "brand": "FreshFarm"}},
+    "modify_cart": {
+        "default": {"product_type": "Carrot", "brand": "FreshFarm", "quantity": 3}
+    },
+    "clear_cart": {"default": {}},
+    "checkout": {"default": {}},
+    "help": {"default": {}},
+    "greeting": {"default": {}},
+    "fallback": {"default": {}},
+}
+
+
+def time_calls(func, min_time):
+    """Calls func repeatedly for at least min_time seconds and returns ops/sec"""
+    calls = 0
+    start = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < min_time or calls < 3:
+        func()
+        calls += 1
+        elapsed = time.perf_counter() - start
+    return calls / elapsed
+
+
+def measure_allocations(func, calls=5):
+    """Returns the mean peak transient and retained bytes allocated by one call"""
+    peaks = []
+    retained = []
+    gc.collect()
+    tracemalloc.start()
+    for _ in range(calls):
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        func()
+        current, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - before)
+        retained.append(current - before)
+    tracemalloc.stop()
+    return sum(peaks) / calls, sum(retained) / calls
+
+
+def run_worker(args):
+    """Benchmarks the tools against the catalog given by CHATBOT_DATA_FILE"""
+    from chatbot.tools import all_tools
+
+    selected = set(args.tools.split(",")) if args.tools else None
+    metrics = {}
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for tool in all_tools:
+            if selected and tool.name not in selected:
+                continue
+            cases = TOOL_CASES.get(tool.name, {"default": {}})
+            for case, tool_args in cases.items():
+
+                def call():
+                    return tool.invoke(dict(tool_args))
+
+                status = call().get("status")  # warm-up
+                ops_per_sec = time_calls(call, args.min_time)
+                peak_bytes, retained_bytes = measure_allocations(call)
+                metrics.setdefault(tool.name, {})[case] = {
+                    "status": status,
+                    "ops_per_sec": round(ops_per_sec, 2),
+                    "mean_us": round(1e6 / ops_per_sec, 2),
+                    "alloc_peak_bytes": round(peak_bytes),
+                    "alloc_retained_bytes": round(retained_bytes),
+                }
+    with open(args.worker_output, "w", encoding="utf-8") as f:
+        json.dump(metrics, f)
+
+
+def print_report(size, metrics):
+    print(f"\n=== catalog rows: {size} ===")
+    print(
+        f"  {'tool':<30} {'path':<8} {'status':<10} {'ops/s':>10} "
+        f"{'mean us':>10} {'peak KiB':>10} {'kept KiB':>9}"
+    )
+    for name, cases in metrics.items():
+        for case, result in cases.items():
+            print(
+                f"  {name:<30} {case:<8} {str(result['status']):<10} "
+                f"{result['ops_per_sec']:>10.1f} {result['mean_us']:>10.1f} "
+                f"{result['alloc_peak_bytes'] / 1024:>10.1f} "
+                f"{result['alloc_retained_bytes'] / 1024:>9.1f}"
+            )
+
+
+def print_scaling(results):
+    """Prints ops/sec of every tool path side by side for all catalog sizes"""
+    sizes = list(results)
+    print("\n=== ops/sec by catalog size ===")
+    print(f"  {'tool / path':<40}" + "".join(f"{size:>12}" for size in sizes))
+    first = results[sizes[0]]
+    for name, cases in first.items():
+        for case in cases:
+            row = [results[size].get(name, {}).get(case, {}) for size in sizes]
+            print(
+                f"  {name + ' / ' + case:<40}"
+                + "".join(f"{r.get('ops_per_sec', 0):>12.1f}" for r in row)
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--sizes",
+        default=",".join(str(s) for s in CATALOG_SIZES),
+        help="Comma-separated catalog sizes (rows)",
+    )
+    parser.add_argument("--tools", default="", help="Comma-separated tool names")
+    parser.add_argument(
+        "--min-time", type=float, default=0.3, help="Seconds per tool path"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Catalog generator seed")
+    parser.add_argument("--verbose", action="store_true", help="Show chatbot logs")
+    parser.add_argument("--no-save", action="store_true", help="Do not store results")
+    parser.add_argument("--worker-output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker_output:
+        run_worker(args)
+        return
+
+    results = {}
+    for size in (int(s) for s in args.sizes.split(",")):
+        options = {"tools": args.tools, "min_time": args.min_time}
+        metrics = run_worker_process(
+            "benchmarks.run_tools", size, args.seed, options, args.verbose
+        )
+        results[size] = metrics
+        print_report(size, metrics)
+        if not args.no_save:
+            params = {
+                "rows": size,
+                "tools": args.tools,
+                "min_time": args.min_time,
+                "seed": args.seed,
+            }
+            save_result("tools", params, metrics)
+    if len(results) > 1:
+        print_scaling(results)
+
+
+if __name__ == "__main__":
+    main()
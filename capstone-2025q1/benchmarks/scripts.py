@@ -0,0 +1,166 @@
+"""
+Replayable conversation scripts for the benchmarks
+
+A script is a JSON file with a list of turns. Each turn holds the user message,
+the tool-call steps the stand-in model emits for it (one list of calls per model
+call), and the final reply:
+
+    {"user": "hello", "steps": [[{"name": "greeting", "args": {}}]], "reply": "..."}
+
+shopper_scripts() generates scripts of simulated shoppers over a catalog.
+"""
+
+import json
+import math
+import os
+import random
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scripts")
+
+
+def list_scripts():
+    """Returns the names of the bundled scripts"""
+    return sorted(
+        name[: -len(".json")]
+        for name in os.listdir(SCRIPTS_DIR)
+        if name.endswith(".json")
+    )
+
+
+def load_script(name_or_path: str) -> dict:
+    """Loads a bundled script by name, or any script file by path"""
+    path = name_or_path
+    if not os.path.exists(path):
+        path = os.path.join(SCRIPTS_DIR, f"{name_or_path}.json")
+    with open(path, encoding="utf-8") as f:
+        script = json.load(f)
+    script.setdefault("name", os.path.splitext(os.path.basename(path))[0])
+    return script
+
+
+def session_turns(scripts, n_turns=None):
+    """
+    Returns the user messages of one session.
+
+    The turns of all scripts are played in order; if n_turns is larger than the
+    scripts, they are repeated to simulate a long session.
+    """
+    turns = [turn["user"] for script in scripts for turn in script["turns"]]
+    if n_turns is None:
+        return turns
+    return [turns[i % len(turns)] for i in range(n_turns)]
+
+
+def _turn(user, calls, reply):
+    steps = [[{"name": name, "args": args} for name, args in calls]]
+    return {"user": user, "steps": steps, "reply": reply}
+
+
+def _browse_turn(rng, product):
+    category, product_type, brand, price = product
+    kind = rng.choice(("brand", "category", "price", "rating", "compare"))
+    if kind == "category":
+        return _turn(
+            f"what {category.lower()} do you have?",
+            [("search_category_by_type", {"category_type": category})],
+            f"Here are our {category.lower()}.",
+        )
+    if kind == "price":
+        max_price = math.ceil(price)
+        return _turn(
+            f"{product_type.lower()} under ${max_price}",
+            [
+                (
+                    "search_ingredient_by_price",
+                    {"product_type": product_type, "max_price": max_price},
+                )
+            ],
+            f"Here is the {product_type.lower()} under ${max_price}.",
+        )
+    if kind == "rating":
+        return _turn(
+            f"best rated {product_type.lower()}",
+            [("compare_ingredient_by_rating", {"product_type": product_type})],
+            f"Here are the best rated {product_type.lower()}.",
+        )
+    if kind == "compare":
+        return _turn(
+            f"compare {product_type.lower()} prices",
+            [("compare_ingredient_by_price", {"product_type": product_type})],
+            f"Here are the {product_type.lower()} prices.",
+        )
+    return _turn(
+        f"do you have {brand} {product_type.lower()}?",
+        [
+            (
+                "search_ingredient_by_brand",
+                {"product_type": product_type, "brand": brand},
+            )
+        ],
+        f"Yes, we have {brand} {product_type}.",
+    )
+
+
+def shopper_scripts(catalog, n, seed=0):
+    """
+    Returns n scripts of simulated shoppers over the rows of a catalog (a
+    DataFrame with the catalog columns): an optional greeting, browsing or
+    comparing 2-4 products, adding some of them to the cart, viewing it,
+    changing a quantity or removing a product, and viewing it again.
+
+    A user message always has the same plan, so all the scripts can be replayed
+    by one ScriptedChatModel.
+    """
+    rng = random.Random(seed)
+    columns = ["category_type", "product_type", "product_brand", "product_price"]
+    scripts = []
+    for i in range(n):
+        rows = catalog.iloc[[rng.randrange(len(catalog)) for _ in range(4)]]
+        products = [
+            (str(c), str(p), str(b), float(price))
+            for c, p, b, price in rows[columns].itertuples(index=False)
+        ][: rng.randint(2, 4)]
+        turns = []
+        if rng.random() < 0.5:
+            turns.append(_turn("hello", [("greeting", {})], "Welcome!"))
+        turns += [_browse_turn(rng, product) for product in products]
+        cart = products[: rng.randint(1, len(products))]
+        for _, product_type, brand, _ in cart:
+            quantity = rng.randint(1, 3)
+            args = {"product_type": product_type, "brand": brand, "quantity": quantity}
+            turns.append(
+                _turn(
+                    f"add {quantity} {brand} {product_type.lower()}",
+                    [("add_to_cart", args)],
+                    f"Added {quantity} {brand} {product_type} to your cart.",
+                )
+            )
+        view = _turn("show me my cart", [("view_cart", {})], "Here is your cart.")
+        turns.append(view)
+        _, product_type, brand, _ = cart[0]
+        if len(cart) > 1 and rng.random() < 0.5:
+            turns.append(
+                _turn(
+                    f"remove the {brand} {product_type.lower()}",
+                    [
+                        (
+                            "remove_from_cart",
+                            {"product_type": product_type, "brand": brand},
+                        )
+                    ],
+                    f"Removed {brand} {product_type} from your cart.",
+                )
+            )
+        else:
+            quantity = rng.randint(4, 6)
+            args = {"product_type": product_type, "brand": brand, "quantity": quantity}
+            turns.append(
+                _turn(
+                    f"make it {quantity} {brand} {product_type.lower()}",
+                    [("modify_cart", args)],
+                    f"Updated {brand} {product_type} quantity to {quantity}.",
+                )
+            )
+        turns.append(view)
+        scripts.append({"name": f"shopper-{i}", "turns": turns})
+    return scripts
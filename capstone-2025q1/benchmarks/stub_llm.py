@@ -0,0 +1,238 @@
+"""
+Scripted and replayed stand-ins for ChatGoogleGenerativeAI used by the benchmarks
+"""
+
+import time
+import zlib
+from typing import Any, Dict, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+# Plan used for user messages that are not part of any loaded script
+UNSCRIPTED_TURN = {
+    "steps": [[{"name": "fallback", "args": {}}]],
+    "reply": "Sorry, I can only help with grocery shopping.",
+}
+
+
+class ScriptedChatModel(BaseChatModel):
+    """
+    Deterministic chat model that replays tool-call plans from conversation scripts.
+
+    For every user message the model looks up the scripted turn with the same text.
+    The n-th model call after that user message emits the n-th step of tool calls;
+    once all steps are used, it answers with the scripted reply. The model keeps no
+    state between calls, so one instance can serve many concurrent sessions.
+    """
+
+    turns: Dict[str, Dict[str, Any]] = {}
+    latency_ms: float = 0.0  # Simulated model latency per call
+    # Spread of the latency: uniform in latency_ms * [1 - jitter, 1 + jitter]
+    latency_jitter: float = 0.0
+    # Share of tool-planning calls answered with a fallback call instead of the
+    # scripted step (simulates a weaker model; deterministic per message)
+    fallback_rate: float = 0.0
+    # Share of calls that stall for hang_ms (simulates a hung request)
+    hang_rate: float = 0.0
+    hang_ms: float = 0.0
+    # Share of calls after a tool step that re-issue the previous step's calls
+    # (simulates the model asking again for results it already has)
+    repeat_rate: float = 0.0
+
+    @classmethod
+    def from_scripts(
+        cls, scripts: List[Dict[str, Any]], latency_ms: float = 0.0, **kwargs: Any
+    ):
+        turns = {}
+        for script in scripts:
+            for turn in script["turns"]:
+                turns[turn["user"]] = turn
+        return cls(turns=turns, latency_ms=latency_ms, **kwargs)
+
+    def _misplans(self, user_text: str, iteration: int) -> bool:
+        return _draw("plan", user_text, iteration) < self.fallback_rate
+
+    def _hangs(self, user_text: str, iteration: int) -> bool:
+        return _draw("hang", user_text, iteration) < self.hang_rate
+
+    def _repeats(self, user_text: str, iteration: int) -> bool:
+        return _draw("repeat", user_text, iteration) < self.repeat_rate
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted-chat-model"
+
+    def bind_tools(self, tools, **kwargs):
+        # Convert the tools like the real model does, so the binding cost is kept
+        formatted_tools = [convert_to_openai_tool(t) for t in tools]
+        return self.bind(tools=formatted_tools, **kwargs)
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager=None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        # Find the current user turn and how many model calls it already made
+        human_indices = [
+            i for i, msg in enumerate(messages) if isinstance(msg, HumanMessage)
+        ]
+        last_human = human_indices[-1] if human_indices else -1
+        user_text = messages[last_human].content if human_indices else ""
+        steps_so_far = [
+            [(call["name"], call["args"]) for call in msg.tool_calls]
+            for msg in messages[last_human + 1 :]
+            if isinstance(msg, AIMessage)
+        ]
+        iteration = len(steps_so_far)
+        # Repeated steps do not advance the script
+        repeats = sum(
+            1
+            for i in range(1, iteration)
+            if steps_so_far[i] and steps_so_far[i] == steps_so_far[i - 1]
+        )
+
+        latency_ms = self.latency_ms
+        if self.latency_jitter > 0:
+            spread = 2 * _draw("latency", user_text, iteration) - 1
+            latency_ms *= 1 + self.latency_jitter * spread
+        if self.hang_rate > 0 and self._hangs(user_text, iteration):
+            latency_ms += self.hang_ms
+        if latency_ms > 0:
+            time.sleep(latency_ms / 1000)
+        turn = self.turns.get(user_text, UNSCRIPTED_TURN)
+        steps = turn.get("steps", [])
+
+        step = None
+        if iteration and steps_so_far[-1] and self._repeats(user_text, iteration):
+            step = [{"name": n, "args": args} for n, args in steps_so_far[-1]]
+        elif iteration - repeats < len(steps):
+            step = steps[iteration - repeats]
+            if self._misplans(user_text, iteration):
+                step = UNSCRIPTED_TURN["steps"][0]
+        if step is not None:
+            tool_calls = [
+                {
+                    "name": call["name"],
+                    "args": dict(call.get("args", {})),
+                    "id": f"call_{len(human_indices)}_{iteration}_{j}",
+                    "type": "tool_call",
+                }
+                for j, call in enumerate(step)
+            ]
+            message = AIMessage(content="", tool_calls=tool_calls)
+        else:
+            message = AIMessage(content=turn.get("reply", "Done."))
+        return _result(messages, message)
+
+
+class ReplayChatModel(ScriptedChatModel):
+    """
+    Chat model that replays the model outputs of a recorded transcript
+    (chatbot/recording.py), for deterministic runs of real traffic.
+
+    A request is matched to its recorded turn by conversation_key (the user
+    messages it contains), and the n-th model call of the turn returns the n-th
+    recorded output. Requests of no recorded turn use the outputs of a turn with
+    the same user message, or the fallback tool. Counts are kept in stats.
+    """
+
+    outputs: Dict[str, List[Dict[str, Any]]] = {}  # conversation key -> outputs
+    outputs_by_user: Dict[str, List[Dict[str, Any]]] = {}
+    stats: Dict[str, int] = {}
+
+    @classmethod
+    def from_transcript(
+        cls, sessions: Dict[str, List[Dict[str, Any]]], latency_ms: float = 0.0
+    ):
+        outputs, outputs_by_user = {}, {}
+        for turns in sessions.values():
+            for turn in turns:
+                # Answers built by the graph (best effort) were no model call
+                model = [o for o in turn["model"] if not o.get("best_effort")]
+                outputs.setdefault(turn["key"], model)
+                outputs_by_user.setdefault(turn["user"], model)
+        return cls(
+            outputs=outputs,
+            outputs_by_user=outputs_by_user,
+            latency_ms=latency_ms,
+            stats={"matched": 0, "by_user": 0, "missed": 0, "overrun": 0},
+        )
+
+    @property
+    def _llm_type(self) -> str:
+        return "replay-chat-model"
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager=None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        from chatbot.recording import conversation_key
+
+        human_indices = [
+            i for i, msg in enumerate(messages) if isinstance(msg, HumanMessage)
+        ]
+        last_human = human_indices[-1] if human_indices else -1
+        user_text = messages[last_human].content if human_indices else ""
+        iteration = sum(
+            1 for msg in messages[last_human + 1 :] if isinstance(msg, AIMessage)
+        )
+        if self.latency_ms > 0:
+            time.sleep(self.latency_ms / 1000)
+
+        recorded = self.outputs.get(conversation_key(messages))
+        if recorded is not None:
+            outcome = "matched"
+        else:
+            recorded = self.outputs_by_user.get(user_text)
+            outcome = "missed" if recorded is None else "by_user"
+        if recorded and iteration >= len(recorded):
+            outcome = "overrun"  # The replay took another path than the recording
+        self.stats[outcome] += 1
+
+        if outcome in ("matched", "by_user"):
+            output = recorded[iteration]
+            tool_calls = [
+                {
+                    "name": call["name"],
+                    "args": dict(call.get("args", {})),
+                    "id": call["id"],
+                    "type": "tool_call",
+                }
+                for call in output.get("tool_calls", ())
+            ]
+            message = AIMessage(content=output["content"], tool_calls=tool_calls)
+        elif iteration:
+            message = AIMessage(content=UNSCRIPTED_TURN["reply"])
+        else:
+            step = UNSCRIPTED_TURN["steps"][0]
+            tool_calls = [
+                {"name": call["name"], "args": {}, "id": f"call_replay_{i}"}
+                for i, call in enumerate(step)
+            ]
+            message = AIMessage(content="", tool_calls=tool_calls)
+        return _result(messages, message)
+
+
+def _result(messages: List[BaseMessage], message: AIMessage) -> ChatResult:
+    """Result with a rough token usage, for the accounting downstream"""
+    input_chars = sum(len(str(msg.content)) for msg in messages)
+    output_tokens = max(1, len(str(message.content)) // 4)
+    message.usage_metadata = {
+        "input_tokens": input_chars // 4,
+        "output_tokens": output_tokens,
+        "total_tokens": input_chars // 4 + output_tokens,
+    }
+    return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+def _draw(kind: str, user_text: str, iteration: int) -> float:
+    """Deterministic pseudo-random number in [0, 1) for one model call"""
+    return zlib.crc32(f"{kind}:{user_text}:{iteration}".encode()) / 2**32
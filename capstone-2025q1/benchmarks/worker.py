@@ -0,0 +1,46 @@
+"""
+Worker processes for the benchmarks
+
+The chatbot loads its catalog at import time, so every catalog size is measured
+in a fresh interpreter with CHATBOT_DATA_FILE pointing at the generated catalog.
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.catalog import write_catalog
+
+
+def run_worker_process(module, size, seed=0, options=None, verbose=False):
+    """
+    Runs `python -m <module> --worker-output <file> <options>` on a catalog of
+    the given size and returns the JSON the worker wrote to the output file.
+    """
+    env = dict(os.environ, CHATBOT_DATA_FILE=write_catalog(size, seed))
+    # The stand-in model has no quota: do not rate-limit it unless asked to
+    env.setdefault("CHATBOT_LLM_RPM", "0")
+    env.setdefault("CHATBOT_LLM_TPM", "0")
+    # Orders and stock reservations start from the catalog stock on every run
+    orders_directory = tempfile.mkdtemp(prefix="chatbot-orders-")
+    env.setdefault("CHATBOT_ORDERS_DB", os.path.join(orders_directory, "orders.db"))
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+        output_path = f.name
+    command = [sys.executable, "-m", module, "--worker-output", output_path]
+    for option, value in (options or {}).items():
+        command += [f"--{option.replace('_', '-')}", str(value)]
+    try:
+        subprocess.run(
+            command,
+            env=env,
+            check=True,
+            stdout=None if verbose else subprocess.DEVNULL,
+        )
+        with open(output_path, encoding="utf-8") as f:
+            return json.load(f)
+    finally:
+        os.remove(output_path)
+        shutil.rmtree(orders_directory, ignore_errors=True)
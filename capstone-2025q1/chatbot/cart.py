@@ -0,0 +1,185 @@
+"""
+Immutable shopping cart for the chatbot
+"""
+
+
+class CartItem:
+    """
+    One cart line: a product of a brand, its unit price and the quantity.
+
+    Items are immutable (with_quantity returns a new item) and use __slots__
+    (no per-item __dict__), so one item can be shared by any number of carts,
+    states and threads.
+    """
+
+    __slots__ = ("product_type", "product_brand", "price", "quantity")
+
+    def __init__(self, product_type, product_brand, price=0.0, quantity=1):
+        object.__setattr__(self, "product_type", str(product_type))
+        object.__setattr__(self, "product_brand", str(product_brand))
+        object.__setattr__(self, "price", float(price))
+        object.__setattr__(self, "quantity", int(quantity))
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"CartItem is immutable (cannot set {name!r})")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"CartItem is immutable (cannot delete {name!r})")
+
+    def __reduce__(self):
+        return (
+            CartItem,
+            (self.product_type, self.product_brand, self.price, self.quantity),
+        )
+
+    def __eq__(self, other):
+        if not isinstance(other, CartItem):
+            return NotImplemented
+        return self._fields() == other._fields()
+
+    def __hash__(self):
+        return hash(self._fields())
+
+    def __repr__(self):
+        return (
+            f"CartItem({self.product_type!r}, {self.product_brand!r}, "
+            f"price={self.price}, quantity={self.quantity})"
+        )
+
+    @property
+    def item_total(self):
+        return self.price * self.quantity
+
+    @classmethod
+    def from_dict(cls, item):
+        """Item from the dict returned by the add_to_cart tool"""
+        return cls(
+            item.get("product_type", "Unknown"),
+            item.get("product_brand", "Unknown"),
+            item.get("price", 0),
+            item.get("quantity", 1),
+        )
+
+    def to_dict(self):
+        return {
+            "product_type": self.product_type,
+            "product_brand": self.product_brand,
+            "price": self.price,
+            "quantity": self.quantity,
+            "item_total": self.item_total,
+        }
+
+    def matches(self, product_type, brand=None):
+        """Same product type (and brand, when given), case-insensitive"""
+        return self.product_type.lower() == product_type.lower() and (
+            not brand or self.product_brand.lower() == brand.lower()
+        )
+
+    def with_quantity(self, quantity):
+        return CartItem(self.product_type, self.product_brand, self.price, quantity)
+
+    def describe(self):
+        return f"{self.quantity}x {self.product_brand} {self.product_type}"
+
+    def _fields(self):
+        return (self.product_type, self.product_brand, self.price, self.quantity)
+
+
+class Cart(tuple):
+    """
+    Immutable cart: a tuple of CartItems, in the order they were added.
+
+    Every update returns a new Cart and leaves the previous one untouched. The
+    new cart shares the unchanged items with the old one (only the tuple of
+    references is new), so a state can be copied, checkpointed or read by
+    another thread without copying or locking its cart.
+    """
+
+    __slots__ = ()
+
+    def __new__(cls, items=()):
+        if type(items) is cls:
+            return items
+        return super().__new__(
+            cls,
+            (
+                item if isinstance(item, CartItem) else CartItem.from_dict(item)
+                for item in items
+            ),
+        )
+
+    def __repr__(self):
+        return f"Cart({list(self)!r})"
+
+    @classmethod
+    def _of(cls, items):
+        return tuple.__new__(cls, items)  # Items known to be CartItems
+
+    @property
+    def item_count(self):
+        return sum(item.quantity for item in self)
+
+    @property
+    def total_price(self):
+        return sum(item.item_total for item in self)
+
+    def to_dicts(self):
+        return [item.to_dict() for item in self]
+
+    def add(self, item):
+        """Adds an item, or its quantity to the line of the same product and brand"""
+        if not isinstance(item, CartItem):
+            item = CartItem.from_dict(item)
+        for i, line in enumerate(self):
+            if line.matches(item.product_type, item.product_brand):
+                line = line.with_quantity(line.quantity + item.quantity)
+                return Cart._of(self[:i] + (line,) + self[i + 1 :])
+        return Cart._of(self + (item,))
+
+    def remove(self, product_type, brand=None):
+        """Returns (cart without the lines of the product (and brand), the lines)"""
+        removed = tuple(item for item in self if item.matches(product_type, brand))
+        if not removed:
+            return self, removed
+        kept = (item for item in self if not item.matches(product_type, brand))
+        return Cart._of(kept), removed
+
+    def set_quantity(self, product_type, brand, quantity):
+        """
+        Returns (cart with the quantity of the product of the brand set, or its
+        line removed when quantity <= 0; the matching lines of this cart).
+        """
+        matched = tuple(item for item in self if item.matches(product_type, brand))
+        if not matched:
+            return self, matched
+        items = []
+        for item in self:
+            if not item.matches(product_type, brand):
+                items.append(item)
+            elif quantity > 0:
+                items.append(item.with_quantity(quantity))
+        return Cart._of(items), matched
+
+    def reprice(self, prices):
+        """
+        Returns (cart with new unit prices, the lines of this cart repriced);
+        prices maps (lowercase product type, lowercase brand) to a unit price.
+        """
+        items, repriced = [], []
+        for item in self:
+            price = prices.get((item.product_type.lower(), item.product_brand.lower()))
+            if price is not None and price != item.price:
+                repriced.append(item)
+                item = CartItem(
+                    item.product_type, item.product_brand, price, item.quantity
+                )
+            items.append(item)
+        if not repriced:
+            return self, ()
+        return Cart._of(items), tuple(repriced)
+
+    def clear(self):
+        return EMPTY_CART
+
+
+EMPTY_CART = Cart()
@@ -2,15 +2,120 @@
 Configuration for the chatbot
 """
 
+import functools
+import os
+
 # Model Configuration
 MODEL_NAME = "gemini-2.0-flash"
 TEMPERATURE = 0.73
 
+# Model Tiers (lightest first, the last one is MODEL_NAME); prices in USD per 1M tokens
+MODEL_ROUTING_ENABLED = os.getenv("CHATBOT_MODEL_ROUTING", "0") == "1"
+MODEL_TIERS = [
+    {
+        "name": "fast",
+        "model": os.getenv("CHATBOT_FAST_MODEL", "gemini-2.0-flash-lite"),
+        "temperature": 0.2,  # planning and argument extraction
+        "input_price": 0.075,
+        "output_price": 0.30,
+    },
+    {
+        "name": "strong",
+        "model": MODEL_NAME,
+        "temperature": TEMPERATURE,
+        "input_price": 0.10,
+        "output_price": 0.40,
+    },
+]
+
+# LLM Gateway Configuration (0 = unlimited; defaults follow the gemini-2.0-flash free tier)
+LLM_TRANSPORT = os.getenv("CHATBOT_LLM_TRANSPORT", "rest")  # "rest" uses the HTTP pool
+LLM_API_ENDPOINT = os.getenv("CHATBOT_LLM_ENDPOINT")  # e.g. a local fake server
+LLM_REQUESTS_PER_MINUTE = int(os.getenv("CHATBOT_LLM_RPM", "15"))
+LLM_TOKENS_PER_MINUTE = int(os.getenv("CHATBOT_LLM_TPM", "1000000"))
+LLM_MAX_CONCURRENCY = int(os.getenv("CHATBOT_LLM_CONCURRENCY", "16"))  # pool size
+LLM_MAX_RETRIES = 5  # retries on 429 / 503
+LLM_BACKOFF_BASE = 0.5  # seconds, doubled per retry (with full jitter)
+LLM_BACKOFF_MAX = 30.0  # seconds
+
+# Turn Budget Configuration (bounds the agent -> action -> agent loop)
+TURN_DEADLINE_SECONDS = float(os.getenv("CHATBOT_TURN_DEADLINE", "30"))
+LLM_CALL_TIMEOUT_SECONDS = float(os.getenv("CHATBOT_LLM_TIMEOUT", "20"))
+TOOL_TIMEOUT_SECONDS = float(os.getenv("CHATBOT_TOOL_TIMEOUT", "5"))
+MAX_TOOL_LOOP_DEPTH = int(os.getenv("CHATBOT_MAX_TOOL_LOOPS", "5"))  # tool rounds/turn
+
+# Loop Detection Configuration (repeated tool calls within a user turn)
+LOOP_DETECTION_ENABLED = os.getenv("CHATBOT_LOOP_DETECTION", "1") == "1"
+LOOP_MAX_REPEATS = 1  # repeats of a tool call answered from its earlier result
+
+# Context Cache Configuration (system prompt + tool declarations cached by the provider)
+CONTEXT_CACHE_ENABLED = os.getenv("CHATBOT_CONTEXT_CACHE", "0") == "1"
+CONTEXT_CACHE_TTL_SECONDS = int(os.getenv("CHATBOT_CONTEXT_CACHE_TTL", "3600"))
+CONTEXT_CACHE_REFRESH_MARGIN_SECONDS = 300  # extend the TTL when less is left
+
+# Tool Selection Configuration (bind only the tools relevant to each user turn)
+TOOL_SELECTION_ENABLED = os.getenv("CHATBOT_TOOL_SELECTION", "0") == "1"
+TOOL_SELECTION_TOP_K = 4  # tools selected per turn (plus the fallback tool)
+TOOL_SELECTION_MIN_SCORE = 0.1  # below this similarity, all tools are bound
+
+# Prompt Budget (see chatbot/prompt_budget.py; estimated before every model call)
+PROMPT_TOKEN_BUDGET = int(os.getenv("CHATBOT_PROMPT_BUDGET", "16000"))  # 0 = none
+PROMPT_TOOL_RESULT_MIN_TOKENS = 256  # a truncated tool result keeps at least this
+PROMPT_CALIBRATION_RATE = 0.2  # weight of each billed request in the calibration
+
+# Worker Processes (see chatbot/prefork.py; 0 uses one worker per CPU core)
+WORKER_PROCESSES = int(os.getenv("CHATBOT_WORKERS", "0"))
+
+# Conversation History (see chatbot/message_log.py)
+HISTORY_WINDOW_MESSAGES = int(os.getenv("CHATBOT_HISTORY_WINDOW", "40"))  # 0 = all
+
+# Session Store (see chatbot/sessions.py; budget and TTL apply per process)
+SESSION_MEMORY_MB = float(os.getenv("CHATBOT_SESSION_MEMORY_MB", "0"))  # 0 = no budget
+SESSION_IDLE_TTL_SECONDS = float(os.getenv("CHATBOT_SESSION_TTL", "900"))  # 0 = none
+SESSION_SPILL_DIR = os.getenv("CHATBOT_SESSION_DIR")  # None = a temporary directory
+
+# Profiling (see chatbot/profiling.py; nothing is profiled unless requested)
+PROFILE_TURNS = int(os.getenv("CHATBOT_PROFILE_TURNS", "0"))  # next turns of any session
+PROFILE_TOOLS = [  # "name" (every call) or "name:calls"
+    spec for spec in os.getenv("CHATBOT_PROFILE_TOOLS", "").split(",") if spec.strip()
+]
+PROFILE_MODE = os.getenv("CHATBOT_PROFILE_MODE", "sample")  # "sample" or "cprofile"
+PROFILE_MEMORY = os.getenv("CHATBOT_PROFILE_MEMORY", "0") == "1"  # tracemalloc diffs
+PROFILE_DIR = os.getenv("CHATBOT_PROFILE_DIR", "./profiles")
+PROFILE_INTERVAL_MS = 5  # sampling interval
+PROFILE_MEMORY_TOP = 30  # lines per memory diff
+
+# Turn Recording (see chatbot/recording.py; replayed by benchmarks/run_replay.py)
+RECORD_FILE = os.getenv("CHATBOT_RECORD_FILE")  # JSONL transcript; None = off
+
+# Orders (see chatbot/orders.py; SQLite in WAL mode, written in group commits)
+ORDERS_DB_PATH = os.getenv("CHATBOT_ORDERS_DB", "./orders.db")
+ORDER_BATCH_SIZE = int(os.getenv("CHATBOT_ORDER_BATCH", "256"))  # orders per commit
+ORDER_FLUSH_MS = float(os.getenv("CHATBOT_ORDER_FLUSH_MS", "0"))  # wait for a batch
+ORDER_SYNCHRONOUS = os.getenv("CHATBOT_ORDER_SYNC", "FULL")  # SQLite synchronous
+ORDER_BUSY_TIMEOUT_MS = 5000  # wait for the write lock held by another process
+
+# Inventory (see chatbot/inventory.py; stock held by carts, in the orders database)
+RESERVATION_TTL_SECONDS = float(os.getenv("CHATBOT_RESERVATION_TTL", "900"))
+RESERVATION_SYNCHRONOUS = os.getenv("CHATBOT_RESERVATION_SYNC", "NORMAL")
+RESERVATION_SWEEP_SECONDS = 60  # expired reservations released at most this often
+
 # Data Path
-DATA_FILE_PATH = "./data/sample_data.csv"  # Relative path from the main.py file
+DATA_FILE_PATH = os.getenv(
+    "CHATBOT_DATA_FILE", "./data/sample_data.csv"
+)  # Relative path from the main.py file (override with CHATBOT_DATA_FILE)
 
 # Fuzzy Matching Configuration
 FUZZY_SCORE_THRESHOLD = 67  # threshold
+FUZZY_POOL_WORKERS = int(os.getenv("CHATBOT_FUZZY_WORKERS", "0"))  # 0 = no pool
+FUZZY_POOL_MIN_CHOICES = 5000  # smaller scans run in the calling thread
+FUZZY_CACHE_SIZE = 4096  # (query, choices) results kept per catalog version
+
+# Catalog Search Configuration (rows per result page; more via next_cursor)
+SEARCH_DEFAULT_LIMIT = 10
+SEARCH_MAX_LIMIT = 50
+LISTING_DEFAULT_LIMIT = 100  # product names per search_ingredient_by_type_all page
+LISTING_MAX_LIMIT = 500
 
 # Chatbot Prompt
 SYSTEM_PROMPT = """You are a helpful shopping assistant for an online grocery store.
@@ -33,6 +138,10 @@ Use the following tools appropriately based on the user's requests:
 - `search_ingredient_by_review`: Use when user wants to find popular products based on review count
 - `search_multiple_products`: Use when user requests multiple products simultaneously \
 (e.g., "show me apples and popcorn")
+- `search_catalog`: Use when user combines several conditions in one request \
+(e.g., "cheap, highly rated dairy with lots of reviews"): category, product, brands, \
+price / rating / review ranges and sort order are answered by a single call. \
+Prefer it over chaining several search tools.
 
 # Product Comparison Tools
 - `compare_ingredient_by_rating`: Use when user wants to compare different brands of a product based \
@@ -50,6 +159,7 @@ This should be used for queries like "show me my cart", "what's in my cart?", "s
 - `remove_from_cart`: Use when user wants to remove a product from their cart
 - `modify_cart`: Use when user wants to change the quantity of a product in their cart
 - `clear_cart`: Use when user wants to empty their cart
+- `checkout`: Use when user wants to place the order, pay, or check out their cart
 
 # Support Tools
 - `help`: Use when user asks for help or guidance on how to use the chatbot
@@ -70,8 +180,15 @@ Plain text answers are FORBIDDEN except as the output of a tool.
 
 
 def get_welcome_message():
-    from chatbot.data_loader import available_categories
+    # Imported here to avoid a circular import (the data loader imports this module)
+    from chatbot.summaries import get_catalog_summary
+
+    # One message per catalog, shared by the histories of all sessions
+    return _welcome_message(get_catalog_summary().category_list_text)
+
 
+@functools.lru_cache(maxsize=4)
+def _welcome_message(category_list_text):
     return f"""Welcome to our Online Grocery Store Chat Assistant! 
 
 I can help you:
@@ -81,6 +198,6 @@ I can help you:
 - Add items to your cart
 
 Available Categories: 
-{", ".join(available_categories)}
+{category_list_text}
 
 What would you like to do today?"""
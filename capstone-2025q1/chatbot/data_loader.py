@@ -2,19 +2,216 @@
 Data Loader for the chatbot
 """
 
+import mmap
+
+import numpy as np
 import pandas as pd
 
 from chatbot.configs import DATA_FILE_PATH
 
+# Column types of the catalog: repeated strings are dictionary-encoded
+# (categorical), numbers use 32-bit types. Rows outside min/max are rejected;
+# decimals is the precision restored when rows are turned into dicts.
+CATALOG_SCHEMA = {
+    "category_type": {"dtype": "category"},
+    "product_type": {"dtype": "category"},
+    "product_brand": {"dtype": "category"},
+    "product_rating": {"dtype": "float32", "min": 0.0, "max": 5.0, "decimals": 1},
+    "product_review": {"dtype": "int32", "min": 0},
+    "product_price": {"dtype": "float32", "min": 0.0, "decimals": 2},
+    # Initial stock (chatbot/inventory.py holds the live stock): optional, and
+    # left out of the records the tools return
+    "product_stock": {"dtype": "int32", "min": 0, "optional": True, "internal": True},
+}
+
+REJECT_SAMPLE_SIZE = 5  # rejected rows printed at load time
+
 data = None
 available_categories = []
+load_report = {}
+
+
+def _strip_categories(column):
+    """Strips the labels of a categorical column (merging labels that collide)"""
+    labels = column.cat.categories.astype(str)
+    stripped = labels.str.strip()
+    if stripped.equals(labels):
+        return column
+    if stripped.is_unique and not (stripped == "").any():
+        return column.cat.rename_categories(stripped)
+    return column.astype(str).str.strip().replace("", np.nan).astype("category")
+
+
+def apply_schema(frame, schema=CATALOG_SCHEMA):
+    """
+    Casts the catalog columns to the schema types and drops invalid rows.
+
+    Returns:
+        tuple: (typed frame, {reason: rejected row numbers}); row numbers are the
+               line numbers of the CSV file (the header is line 1).
+    """
+    frame = frame.copy()
+    invalid = {}
+
+    def reject(mask, reason):
+        if mask.any():
+            invalid[reason] = mask
+
+    for column, spec in schema.items():
+        if column not in frame.columns:
+            if not spec.get("optional"):
+                print(f"[WARNING] Catalog column '{column}' is missing.")
+            continue
+        if spec["dtype"] == "category":
+            values = frame[column]
+            if not isinstance(values.dtype, pd.CategoricalDtype):
+                values = values.astype("category")
+            frame[column] = _strip_categories(values)
+            reject(frame[column].isna(), f"{column}: missing")
+            continue
+
+        values = pd.to_numeric(frame[column], errors="coerce")
+        reject(values.isna() & frame[column].notna(), f"{column}: not a number")
+        reject(frame[column].isna(), f"{column}: missing")
+        if "min" in spec:
+            reject(values < spec["min"], f"{column}: below {spec['min']}")
+        if "max" in spec:
+            reject(values > spec["max"], f"{column}: above {spec['max']}")
+        if spec["dtype"].startswith("int"):
+            reject(values.notna() & (values % 1 != 0), f"{column}: not an integer")
+        frame[column] = values
+
+    rejected = {}
+    if invalid:
+        bad = np.zeros(len(frame), dtype=bool)
+        for reason, mask in invalid.items():
+            mask = mask.to_numpy()
+            rejected[reason] = (np.flatnonzero(mask & ~bad) + 2).tolist()
+            bad |= mask
+        frame = frame[~bad].reset_index(drop=True)
+        for column, spec in schema.items():
+            if column in frame.columns and spec["dtype"] == "category":
+                frame[column] = frame[column].cat.remove_unused_categories()
+
+    frame = frame.astype(
+        {
+            column: spec["dtype"]
+            for column, spec in schema.items()
+            if column in frame.columns and spec["dtype"] != "category"
+        }
+    )
+    return frame, {reason: rows for reason, rows in rejected.items() if rows}
+
+
+def catalog_memory_report(frame):
+    """Resident bytes of a catalog frame, in total, per SKU (row) and per column"""
+    usage = frame.memory_usage(deep=True, index=True)
+    total = int(usage.sum())
+    return {
+        "rows": len(frame),
+        "bytes": total,
+        "bytes_per_sku": round(total / len(frame), 1) if len(frame) else 0.0,
+        "columns": {
+            column: int(usage[column]) for column in frame.columns if column in usage
+        },
+    }
+
+
+def load_catalog(path, schema=CATALOG_SCHEMA):
+    """
+    Reads a catalog CSV with the schema applied.
+
+    Returns:
+        tuple: (typed frame, report with the rows read / loaded, the rejected
+               rows per reason and the memory report)
+    """
+    dtypes = {
+        column: "category"
+        for column, spec in schema.items()
+        if spec["dtype"] == "category"
+    }
+    raw = pd.read_csv(path, dtype=dtypes)
+    frame, rejected = apply_schema(raw, schema)
+    report = {
+        "rows_read": len(raw),
+        "rows_loaded": len(frame),
+        "rejected": rejected,
+        "memory": catalog_memory_report(frame),
+    }
+    return frame, report
+
+
+def shared_array(values):
+    """
+    Returns a read-only copy of an array in anonymous shared memory (mmap). Pages
+    of a shared mapping stay shared with forked processes instead of being
+    copied on write.
+    """
+    values = np.asarray(values)
+    buffer = mmap.mmap(-1, max(values.nbytes, 1))
+    array = np.frombuffer(buffer, dtype=values.dtype, count=values.size)
+    array = array.reshape(values.shape)
+    array[...] = values
+    array.flags.writeable = False
+    return array
+
+
+def share_catalog(frame):
+    """
+    Rebuilds a typed catalog frame over shared, read-only arrays: numeric columns
+    and the codes of categorical columns (categories stay regular objects).
+    Other columns are kept as they are.
+    """
+    columns = {}
+    for column in frame.columns:
+        series = frame[column]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            codes = shared_array(series.cat.codes.to_numpy())
+            columns[column] = pd.Categorical.from_codes(
+                codes, dtype=series.dtype, validate=False
+            )
+        elif pd.api.types.is_numeric_dtype(series.dtype):
+            columns[column] = shared_array(series.to_numpy())
+        else:
+            columns[column] = series.to_numpy()
+    return pd.DataFrame(columns, index=frame.index, copy=False)
+
+
+def catalog_records(frame):
+    """
+    Returns catalog rows as dicts of plain Python values (JSON-ready), with the
+    32-bit floats rounded back to the precision of the schema (e.g. 4.29, not
+    4.289999961853027). Internal columns of the schema are left out.
+    """
+    columns = {}
+    for column in frame.columns:
+        if CATALOG_SCHEMA.get(column, {}).get("internal"):
+            continue
+        values = frame[column]
+        decimals = CATALOG_SCHEMA.get(column, {}).get("decimals")
+        if decimals is not None:
+            values = values.astype(np.float64).round(decimals)
+        columns[column] = values.tolist()
+    return [dict(zip(columns, row)) for row in zip(*columns.values())]
+
 
 print("[INFO] Initializing Data Loader")
 try:
     # Use the path defined in the config file
-    data = pd.read_csv(DATA_FILE_PATH)
+    data, load_report = load_catalog(DATA_FILE_PATH)
     print(f"[INFO] CSV data loaded successfully from {DATA_FILE_PATH}!")
 
+    for reason, rows in load_report["rejected"].items():
+        print(
+            f"[WARNING] Rejected {len(rows)} catalog rows ({reason}), "
+            f"e.g. lines {rows[:REJECT_SAMPLE_SIZE]}"
+        )
+    memory = load_report["memory"]
+    print(
+        f"[INFO] Catalog: {memory['rows']} SKUs, {memory['bytes'] / 1024:.0f} KiB "
+        f"({memory['bytes_per_sku']:.0f} bytes per SKU)"
+    )
+
     if not data.empty and "category_type" in data.columns:
         # Prepare the category list (unique values, lowercase, remove spaces)
         available_categories = (
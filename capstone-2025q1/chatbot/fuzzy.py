@@ -0,0 +1,202 @@
+"""
+Fuzzy matching for the chatbot
+"""
+
+import multiprocessing
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from thefuzz import process
+
+from chatbot.configs import (
+    FUZZY_CACHE_SIZE,
+    FUZZY_POOL_MIN_CHOICES,
+    FUZZY_POOL_WORKERS,
+)
+
+# Catalog columns whose values are sent to the pool workers once, when they start
+POOL_COLUMNS = ("category_type", "product_type", "product_brand")
+
+_worker_choices = {}  # column -> lowercase values (in pool workers)
+
+
+def _init_worker(choices):
+    _worker_choices.update(choices)
+
+
+def _extract_chunk(queries, choices, start, stop):
+    """
+    Best (match, score) of every query among choices[start:stop] (None when the
+    chunk is empty). choices is a list, or the name of a column sent at startup.
+    """
+    if isinstance(choices, str):
+        choices = _worker_choices[choices]
+    chunk = choices[start:stop]
+    return [process.extractOne(query, chunk) for query in queries]
+
+
+def _best(results):
+    """Merges the per-chunk results of a query (the first chunk wins ties)"""
+    best = None
+    for result in results:
+        if result is not None and (best is None or result[1] > best[1]):
+            best = result
+    return best
+
+
+class FuzzyMatcher:
+    """
+    Closest catalog value of a user spelling (thefuzz.process.extractOne).
+
+    - Results are cached (LRU) for the loaded catalog index; a new catalog
+      version (a new CatalogIndex) starts an empty cache.
+    - A query already being matched by another session waits for that result.
+    - Once started (start(), with workers > 0), scans over at least min_choices
+      values run in a process pool, split in one chunk per worker: the calling
+      thread waits without holding the GIL, so the other sessions keep running,
+      and one scan uses several cores. The workers are forked with the values of
+      the POOL_COLUMNS of the catalog they were started with; other choices
+      travel with the request. Several queries over the same choices go in one
+      batch.
+    - Smaller scans, and every scan without a pool, run in the calling thread.
+    """
+
+    def __init__(
+        self,
+        workers=FUZZY_POOL_WORKERS,
+        min_choices=FUZZY_POOL_MIN_CHOICES,
+        cache_size=FUZZY_CACHE_SIZE,
+    ):
+        self.workers = workers
+        self.min_choices = min_choices
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()  # (choices key, query) -> (match, score) | None
+        self._running = {}  # (choices key, query) -> Future
+        self._index = None
+        self._pool = None
+        self._pool_index = None  # catalog index whose columns the workers hold
+        self._pool_columns = set()
+        self.stats = {"hits": 0, "misses": 0, "shared": 0, "pooled": 0, "inline": 0}
+
+    def extract_one(self, query, choices):
+        """Drop-in for process.extractOne(query, choices) on a list of strings"""
+        return self.extract_many([query], choices)[0]
+
+    def extract_column(self, query, index, column):
+        """Closest lowercase value of a catalog column (index.keys(column))"""
+        return self.extract_many([query], index=index, column=column)[0]
+
+    def extract_many(self, queries, choices=None, index=None, column=None):
+        """
+        Returns the (match, score) or None of every query among choices, or among
+        the values of a catalog column (index.keys(column)) when choices is None.
+        """
+        if choices is None:
+            key = (column,)
+        else:
+            choices = list(choices)
+            key = (len(choices), hash(tuple(choices)))
+        results, owned, waiting = {}, {}, {}
+        with self._lock:
+            if index is not None and index is not self._index:
+                self._index = index  # New catalog version
+                self._cache.clear()
+            for query in dict.fromkeys(queries):
+                entry = (key, query)
+                if entry in self._cache:
+                    self._cache.move_to_end(entry)
+                    results[query] = self._cache[entry]
+                    self.stats["hits"] += 1
+                elif entry in self._running:
+                    waiting[query] = self._running[entry]
+                    self.stats["shared"] += 1
+                else:
+                    owned[query] = self._running[entry] = Future()
+                    self.stats["misses"] += 1
+        if owned:
+            if choices is None:
+                choices = index.keys(column)
+            try:
+                matched = self._scan(list(owned), choices, index, column)
+            except Exception as e:
+                with self._lock:
+                    for query, future in owned.items():
+                        self._running.pop((key, query), None)
+                        future.set_exception(e)
+                raise
+            with self._lock:
+                for query, future in owned.items():
+                    self._running.pop((key, query), None)
+                    self._cache[(key, query)] = matched[query]
+                    future.set_result(matched[query])
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+            results.update(matched)
+        for query, future in waiting.items():
+            results[query] = future.result()
+        return [results[query] for query in queries]
+
+    def start(self, index):
+        """
+        Starts the process pool (workers > 0) for the catalog index. Call it while
+        the process runs a single thread (at startup, or in a freshly forked
+        worker): the pool workers are forked with the catalog values.
+        """
+        if self.workers <= 0 or self._pool is not None:
+            return self
+        columns = {
+            column: index.keys(column)
+            for column in POOL_COLUMNS
+            if column in index.frame.columns
+        }
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("fork" if "fork" in methods else "spawn")
+        pool = ProcessPoolExecutor(
+            self.workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(columns,),
+        )
+        pool.submit(int).result()  # Starts the workers now
+        with self._lock:
+            self._pool, self._pool_index = pool, index
+            self._pool_columns = set(columns)
+        print(f"[INFO] Started fuzzy matching pool ({self.workers} workers)")
+        return self
+
+    def close(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool:
+            pool.shutdown()
+
+    def _scan(self, queries, choices, index, column):
+        pool = self._pool if len(choices) >= max(self.min_choices, 1) else None
+        if pool is None:
+            self._count("inline")
+            return dict(zip(queries, _extract_chunk(queries, choices, 0, None)))
+        self._count("pooled")
+        # Columns of the catalog the workers were started with are referenced by
+        # name; other choices (or a newer catalog) are sent with the request
+        source = choices
+        if index is self._pool_index and column in self._pool_columns:
+            source = column
+        step = -(-len(choices) // self.workers)
+        chunks = [
+            pool.submit(_extract_chunk, queries, source, start, start + step)
+            for start in range(0, len(choices), step)
+        ]
+        per_chunk = [chunk.result() for chunk in chunks]
+        return {
+            query: _best(results[i] for results in per_chunk)
+            for i, query in enumerate(queries)
+        }
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+
+fuzzy_matcher = FuzzyMatcher()
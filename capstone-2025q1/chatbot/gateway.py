@@ -0,0 +1,320 @@
+"""
+Rate-limited LLM gateway for the chatbot
+"""
+
+import heapq
+import itertools
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+# Request priorities (lower value is admitted first)
+PRIORITY_INTERACTIVE = 0
+PRIORITY_NORMAL = 5
+PRIORITY_BACKGROUND = 10
+
+# HTTP status codes that are retried with backoff (quota exceeded / overloaded)
+RETRYABLE_STATUS_CODES = (429, 503)
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled continuously at rate_per_minute.
+
+    A rate of 0 (or less) means unlimited. A full bucket holds burst_seconds
+    of the rate (at least one token).
+    """
+
+    def __init__(self, rate_per_minute, burst_seconds=60.0, clock=time.monotonic):
+        self.rate = rate_per_minute / 60.0  # tokens per second
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.tokens = self.capacity
+        self._clock = clock
+        self._updated = clock()
+
+    @property
+    def unlimited(self):
+        return self.rate <= 0
+
+    def _refill(self):
+        now = self._clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount):
+        """Seconds until amount tokens are available (0 if available now)"""
+        if self.unlimited:
+            return 0.0
+        self._refill()
+        # Requests larger than the bucket are admitted once the bucket is full
+        missing = min(amount, self.capacity) - self.tokens
+        return 0.0 if missing <= 0 else missing / self.rate
+
+    def consume(self, amount):
+        if not self.unlimited:
+            self._refill()
+            self.tokens -= amount
+
+    def adjust(self, amount):
+        """Returns (positive) or charges (negative) tokens after the fact"""
+        if not self.unlimited:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+    def drain(self):
+        """Empties the bucket (used when the server reports the quota as exceeded)"""
+        if not self.unlimited:
+            self._refill()
+            self.tokens = min(self.tokens, 0.0)
+
+    def scale(self, share):
+        """Keeps a share of the rate (e.g. 1/N for each of N worker processes)"""
+        if not self.unlimited:
+            self.rate *= share
+            self.capacity = max(1.0, self.capacity * share)
+            self.tokens = min(self.tokens, self.capacity)
+
+
+def estimate_tokens(messages):
+    """Rough token estimate of a prompt (about 4 characters per token)"""
+    if isinstance(messages, str):
+        return max(1, len(messages) // 4)
+    return max(1, sum(len(str(getattr(m, "content", m))) for m in messages) // 4)
+
+
+def remaining_seconds(deadline):
+    """Seconds left until a time.monotonic() deadline (None = no deadline)"""
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def is_retryable(error):
+    """True for quota-exceeded (429) and overloaded (503) errors"""
+    code = getattr(error, "code", None)
+    if not isinstance(code, int):
+        code = getattr(error, "status_code", None)
+    return code in RETRYABLE_STATUS_CODES
+
+
+class LLMGateway:
+    """
+    Shared entry point for the model calls of all sessions.
+
+    - At most max_concurrency requests are in flight (the size of the HTTP
+      connection pool, see configure_http_pool).
+    - Requests and tokens per minute are limited by token buckets, so the
+      quota is used up to its ceiling without being exceeded. The buckets
+      hold burst_seconds of the quota (a minute by default), so the calls of
+      one turn are not spread out at the per-second rate of a small quota.
+    - Waiting requests are admitted in (priority, arrival) order.
+    - 429/503 responses are retried with jittered exponential backoff; a 429
+      also drains the request bucket, so every waiting request slows down
+      instead of producing a burst of errors.
+    - Each attempt is bounded by call_timeout and by the caller's deadline
+      (queueing and backoff included). A timed-out call raises TimeoutError;
+      the abandoned request keeps its slot until it actually returns.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute=0,
+        tokens_per_minute=0,
+        max_concurrency=16,
+        max_retries=5,
+        backoff_base=0.5,
+        backoff_max=30.0,
+        burst_seconds=60.0,
+        call_timeout=None,
+    ):
+        self.max_concurrency = max_concurrency
+        self.call_timeout = call_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._requests = TokenBucket(requests_per_minute, burst_seconds)
+        self._tokens = TokenBucket(tokens_per_minute, burst_seconds)
+        self._cond = threading.Condition()
+        self._queue = []  # heap of (priority, sequence)
+        self._sequence = itertools.count()
+        self._in_flight = 0
+        self.stats = {
+            "requests": 0,
+            "succeeded": 0,
+            "failed": 0,
+            "throttled": 0,
+            "retries": 0,
+            "queue_wait_ms": 0.0,
+            "max_queue_depth": 0,
+            "timeouts": 0,
+        }
+        self._executor = None
+
+    def invoke(
+        self, runnable, messages, priority=PRIORITY_NORMAL, deadline=None, **kwargs
+    ):
+        """
+        Calls runnable.invoke(messages) under the quota, with retries.
+
+        deadline is a time.monotonic() timestamp; TimeoutError is raised when
+        the request cannot complete before it.
+        """
+        estimated = estimate_tokens(messages)
+        attempt = 0
+        while True:
+            self._acquire(priority, estimated, deadline)
+            try:
+                response = self._call(runnable, messages, estimated, deadline, kwargs)
+            except TimeoutError:
+                self._count("timeouts")
+                raise
+            except Exception as e:
+                if not is_retryable(e) or attempt >= self.max_retries:
+                    self._count("failed")
+                    raise
+                attempt += 1
+                delay = self._backoff(e, attempt)
+                remaining = remaining_seconds(deadline)
+                if remaining is not None and delay >= remaining:
+                    self._count("timeouts")
+                    raise TimeoutError("LLM request retries exceed the deadline") from e
+                print(
+                    f"[WARNING] LLM request throttled ({e.__class__.__name__}), "
+                    f"retry {attempt}/{self.max_retries} in {delay:.2f}s"
+                )
+                time.sleep(delay)
+                continue
+
+            self._count("succeeded")
+            return response
+
+    def share_quota(self, share):
+        """
+        Keeps a share of the request and token quotas, for gateways of separate
+        processes drawing from one account quota.
+        """
+        with self._cond:
+            self._requests.scale(share)
+            self._tokens.scale(share)
+
+    def _call(self, runnable, messages, estimated, deadline, kwargs):
+        """One admitted attempt; the slot is released when the call returns"""
+        timeout = self.call_timeout
+        remaining = remaining_seconds(deadline)
+        if remaining is not None:
+            timeout = remaining if timeout is None else min(timeout, remaining)
+        if timeout is None:
+            try:
+                response = runnable.invoke(messages, **kwargs)
+            except BaseException:
+                self._release()
+                raise
+            self._release(estimated, response)
+            return response
+
+        # Bounded wait: the call runs on a worker thread so the caller can give up
+        future = self._pool().submit(runnable.invoke, messages, **kwargs)
+        future.add_done_callback(
+            lambda f: self._release(
+                estimated, None if f.cancelled() or f.exception() else f.result()
+            )
+        )
+        try:
+            return future.result(timeout=max(0.0, timeout))
+        except FutureTimeoutError:
+            future.cancel()
+            raise TimeoutError(f"LLM request timed out after {timeout:.2f}s") from None
+
+    def _pool(self):
+        with self._cond:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_concurrency, thread_name_prefix="llm-gateway"
+                )
+            return self._executor
+
+    # --- Admission control ---
+    def _acquire(self, priority, tokens, deadline=None):
+        start = time.perf_counter()
+        with self._cond:
+            ticket = (priority, next(self._sequence))
+            heapq.heappush(self._queue, ticket)
+            self.stats["max_queue_depth"] = max(
+                self.stats["max_queue_depth"], len(self._queue)
+            )
+            try:
+                while True:
+                    remaining = remaining_seconds(deadline)
+                    if remaining is not None and remaining <= 0:
+                        self.stats["timeouts"] += 1
+                        raise TimeoutError("LLM request queued past its deadline")
+                    if self._queue[0] == ticket and self._in_flight < self.max_concurrency:
+                        wait = max(
+                            self._requests.wait_time(1), self._tokens.wait_time(tokens)
+                        )
+                        if wait <= 0:
+                            break
+                        if remaining is not None:
+                            wait = min(wait, remaining)
+                        self._cond.wait(wait)
+                    else:
+                        self._cond.wait(remaining)
+            except BaseException:
+                self._queue.remove(ticket)
+                heapq.heapify(self._queue)
+                self._cond.notify_all()
+                raise
+
+            heapq.heappop(self._queue)
+            self._requests.consume(1)
+            self._tokens.consume(tokens)
+            self._in_flight += 1
+            self.stats["requests"] += 1
+            self.stats["queue_wait_ms"] += (time.perf_counter() - start) * 1000
+            self._cond.notify_all()
+
+    def _release(self, estimated=None, response=None):
+        with self._cond:
+            self._in_flight -= 1
+            # Replace the estimate with the billed usage when the model reports it
+            usage = getattr(response, "usage_metadata", None) or {}
+            if estimated is not None and usage.get("total_tokens"):
+                self._tokens.adjust(estimated - usage["total_tokens"])
+            self._cond.notify_all()
+
+    def _backoff(self, error, attempt):
+        """Full-jitter exponential backoff; honors a server-provided retry delay"""
+        with self._cond:
+            self.stats["retries"] += 1
+            if getattr(error, "code", None) == 429:
+                self.stats["throttled"] += 1
+                self._requests.drain()
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+        retry_after = getattr(error, "retry_after", None)
+        if isinstance(retry_after, (int, float)):
+            delay = max(delay, retry_after)
+        return delay
+
+    def _count(self, key):
+        with self._cond:
+            self.stats[key] += 1
+
+
+def configure_http_pool(model, pool_size):
+    """
+    Sizes the HTTP connection pool of a ChatGoogleGenerativeAI model using the
+    REST transport, so every in-flight request reuses a kept-alive connection.
+    """
+    try:
+        from requests.adapters import HTTPAdapter
+
+        session = model.client._transport._session
+    except (AttributeError, ImportError):
+        print("[WARNING] LLM client has no HTTP session; connection pool not configured.")
+        return False
+
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    print(f"[INFO] LLM HTTP connection pool size: {pool_size}")
+    return True
@@ -3,15 +3,41 @@ Graph for the chatbot
 """
 
 import json
+import time
 import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
 
 from langgraph.graph import StateGraph, END
 from langgraph.prebuilt import ToolNode
 from langchain_core.messages import AIMessage, ToolMessage
+from langchain_core.runnables import RunnableConfig
+from langchain_core.utils.function_calling import convert_to_openai_tool
 
 from chatbot.state import State
-from chatbot.llm import llm
+from chatbot.cart import Cart, CartItem
+from chatbot.configs import (
+    CONTEXT_CACHE_ENABLED,
+    LOOP_DETECTION_ENABLED,
+    LOOP_MAX_REPEATS,
+    MAX_TOOL_LOOP_DEPTH,
+    MODEL_TIERS,
+    SYSTEM_PROMPT,
+    TOOL_SELECTION_ENABLED,
+    TOOL_SELECTION_MIN_SCORE,
+    TOOL_SELECTION_TOP_K,
+    TOOL_TIMEOUT_SECONDS,
+)
+from chatbot.llm import ContextCache, llm, llm_gateway, llm_tiers
+from chatbot.gateway import PRIORITY_INTERACTIVE, remaining_seconds
+from chatbot.inventory import inventory
+from chatbot.loop_detection import LoopDetector, reused_result
+from chatbot.orders import order_key, order_store
+from chatbot.prompt_budget import COMPONENTS, PromptBudget, add_usage
+from chatbot.routing import ModelRouter, current_turn
 from chatbot.tools import all_tools
+from chatbot.tool_selection import ToolSelector
 
 print("[INFO] Building Graph")
 
@@ -23,6 +49,142 @@ else:
     print("[ERROR] LLM or tools not available. Cannot bind tools.")
     llm_with_tools = llm  # Use LLM without tools (for error situation)
 
+# Model tiers, lightest first; the main LLM is the strongest tier
+models = {}
+if llm_with_tools:
+    models = {**llm_tiers, MODEL_TIERS[-1]["name"]: llm}
+tiers_with_tools = {
+    name: (model.bind_tools(all_tools) if model is not llm else llm_with_tools)
+    for name, model in models.items()
+}
+model_router = ModelRouter(list(models)) if models else None
+if len(models) > 1:
+    print(f"[INFO] Model routing enabled over tiers: {list(models)}")
+
+# Select the tools bound per turn (schemas converted once, subsets cached)
+tool_selector = None
+if llm and all_tools and TOOL_SELECTION_ENABLED:
+    tool_selector = ToolSelector(
+        llm, all_tools, top_k=TOOL_SELECTION_TOP_K, min_score=TOOL_SELECTION_MIN_SCORE
+    )
+    print("[INFO] Per-turn tool selection enabled.")
+
+# Cache the system prompt and all tool declarations on the provider side
+# (cached requests carry every tool, so tool selection only applies uncached)
+context_caches = {}
+if all_tools and CONTEXT_CACHE_ENABLED:
+    for name, model in models.items():
+        try:
+            context_caches[name] = ContextCache(model, SYSTEM_PROMPT, all_tools)
+            print(f"[INFO] Context caching enabled for model tier '{name}'.")
+        except Exception as e:
+            print(f"[ERROR] Error initializing context cache for '{name}': {e}")
+
+
+# Estimate every request (system prompt, tools, history, turn) within a budget
+prompt_budget = PromptBudget(
+    tool_selector.schemas
+    if tool_selector
+    else {tool.name: convert_to_openai_tool(tool) for tool in all_tools}
+)
+
+# Answer repeated tool calls from earlier results and break tool-call cycles
+loop_detector = LoopDetector(LOOP_DETECTION_ENABLED, LOOP_MAX_REPEATS)
+
+
+def call_model(tier, messages, tool_names=None, deadline=None):
+    """Calls one model tier through the gateway (context cache, selected tools)"""
+    runnable = tiers_with_tools[tier]
+    if tool_names is not None:
+        runnable = tool_selector.bind(tool_names, models[tier])
+    # Call the LLM through the shared gateway (quota, retries, timeout)
+    if tier in context_caches:
+        return context_caches[tier].invoke(
+            llm_gateway, messages, runnable, PRIORITY_INTERACTIVE, deadline
+        )
+    return llm_gateway.invoke(runnable, messages, PRIORITY_INTERACTIVE, deadline)
+
+
+def tool_loop_depth(messages):
+    """Number of model steps with tool calls in the current turn"""
+    return sum(
+        1
+        for m in current_turn(messages)
+        if isinstance(m, AIMessage) and m.tool_calls
+    )
+
+
+BEST_EFFORT_MAX_LINES = 10  # products or categories listed in a best-effort answer
+
+
+def _product_line(record):
+    name = f"{record.get('product_brand', '')} {record.get('product_type', '')}"
+    price = record.get("product_price")
+    return f"- {name.strip()}" + (f": ${price:.2f}" if price is not None else "")
+
+
+def _listed(lines, total):
+    """The first lines of a list, with the count of the ones left out"""
+    shown = lines[:BEST_EFFORT_MAX_LINES]
+    if total > len(shown):
+        shown.append(f"... and {total - len(shown)} more")
+    return "\n".join(shown)
+
+
+def summarize_tool_result(content):
+    """
+    Short text of a tool result for the user: its message, or the names and
+    prices of its products. None when it has nothing readable.
+    """
+    try:
+        result = json.loads(content)
+    except (TypeError, json.JSONDecodeError):
+        # Plain-text results (e.g. the cart) are written for the user already
+        text = str(content)
+        return text if len(text) <= 1000 else None
+    if not isinstance(result, dict):
+        return None
+    if result.get("message"):
+        return str(result["message"])
+    for value in result.values():
+        if isinstance(value, list) and value and isinstance(value[0], dict):
+            records = [v for v in value if isinstance(v, dict)]
+            lines = [_product_line(record) for record in records]
+            return _listed(lines, result.get("total") or len(lines))
+    if isinstance(result.get("product"), dict):
+        return _product_line(result["product"])
+    if isinstance(result.get("products_by_category"), dict):
+        lines = [
+            f"- {category}: {', '.join(map(str, products))}"
+            for category, products in result["products_by_category"].items()
+        ]
+        return _listed(lines, len(lines))
+    for key in ("brands", "categories"):
+        if isinstance(result.get(key), list) and result[key]:
+            return ", ".join(map(str, result[key]))
+    return None
+
+
+def best_effort_answer(messages, reason):
+    """Answers from the tool results of the turn so far, without another model call"""
+    results = [m for m in current_turn(messages) if isinstance(m, ToolMessage)]
+    found = summarize_tool_result(results[-1].content) if results else None
+    if found is None:
+        content = (
+            "Sorry, I could not finish your request in time. Please try again "
+            "or ask in a simpler way."
+        )
+    else:
+        intro = (
+            "Here is what I found:"
+            if reason == "tool_loop"
+            else "I could not finish your request in time, but here is what I "
+            "found so far:"
+        )
+        content = f"{intro}\n{found}"
+    print(f"[WARNING] Ending the turn early ({reason}); answering best-effort.")
+    return AIMessage(content=content, response_metadata={"best_effort": reason})
+
 
 # Define the node functions
 def agent_node(state: State):
@@ -37,13 +199,98 @@ def agent_node(state: State):
                 )
             ]
         }
-    # Call the LLM
-    response = llm_with_tools.invoke(state["messages"])
-    return {"messages": [response]}
+    messages = state["messages"]
+    deadline = state.get("turn_deadline")
+    # Stop the tool loop when the turn is out of time or too deep
+    remaining = remaining_seconds(deadline)
+    if remaining is not None and remaining <= 0:
+        return {"messages": [best_effort_answer(messages, "deadline")]}
+    if tool_loop_depth(messages) >= MAX_TOOL_LOOP_DEPTH:
+        return {"messages": [best_effort_answer(messages, "max_tool_loops")]}
+
+    tool_names = None
+    if tool_selector:
+        tool_names = tool_selector.select_messages(messages, state.get("cart_items"))
+        print(f"[INFO] Tools bound for this turn ({len(tool_names)}): {tool_names}")
+    # Estimated size of the request, trimmed to the prompt budget
+    request, usage = prompt_budget.fit(messages, tool_names)
+    print(
+        f"[INFO] Prompt ~{usage['estimated_input']} tokens ("
+        + ", ".join(f"{name} {usage[name]}" for name in COMPONENTS)
+        + ")"
+    )
+    # Lightest tier first, escalated on low confidence / complex plans
+    confident = tool_names is None or tool_selector.is_confident(tool_names)
+    try:
+        response = model_router.invoke(
+            request,
+            lambda tier: call_model(tier, request, tool_names, deadline),
+            confident,
+        )
+        usage = prompt_budget.observe(usage, response)
+    except TimeoutError as e:
+        print(f"[WARNING] LLM call timed out: {e}")
+        response = best_effort_answer(messages, "llm_timeout")
+    # The model asks again for results it already has: answer from them instead
+    if loop_detector.is_loop(messages, response):
+        print(f"[WARNING] Tool-call loop detected: {response.tool_calls}")
+        response = best_effort_answer(messages, "tool_loop")
+    return {
+        "messages": [response],
+        "token_usage": add_usage(state.get("token_usage"), usage),
+    }
 
 
 # Create a ToolNode (responsible for executing tools)
 tool_node = ToolNode(all_tools)
+tool_executor = ThreadPoolExecutor(thread_name_prefix="tool")
+
+
+def run_tools(state: State, config: RunnableConfig, calls):
+    """Runs tool calls with the ToolNode within the turn's time budget"""
+    last_message = state["messages"][-1]
+    if calls != last_message.tool_calls:
+        step = last_message.model_copy(update={"tool_calls": calls})
+        state = {**state, "messages": state["messages"][:-1] + [step]}
+    timeout = TOOL_TIMEOUT_SECONDS
+    remaining = remaining_seconds(state.get("turn_deadline"))
+    if remaining is not None:
+        timeout = max(0.0, min(timeout, remaining))
+    future = tool_executor.submit(tool_node.invoke, state, config)
+    try:
+        return future.result(timeout=timeout)["messages"]
+    except FutureTimeoutError:
+        # The tool thread cannot be interrupted; its result is discarded
+        future.cancel()
+        print(f"[WARNING] Tool execution timed out after {timeout:.2f}s")
+        message = json.dumps(
+            {"status": "error", "message": "The tool did not respond in time."}
+        )
+        return [
+            ToolMessage(content=message, tool_call_id=call["id"], status="error")
+            for call in calls
+        ]
+
+
+def action_node(state: State, config: RunnableConfig):
+    """Runs the tool calls of the last AI message, reusing results of repeated calls"""
+    calls = state["messages"][-1].tool_calls
+    pending, duplicates = loop_detector.split_calls(state["messages"], calls)
+    results = {}
+    if pending:
+        results = {m.tool_call_id: m for m in run_tools(state, config, pending)}
+    if duplicates:
+        print(f"[INFO] Reusing earlier results for {len(duplicates)} repeated call(s)")
+    messages = []
+    for call in calls:
+        source = duplicates.get(call["id"])
+        if source is None:
+            messages.append(results[call["id"]])
+        else:
+            if isinstance(source, str):
+                source = results[source]  # Repeated within the same step
+            messages.append(reused_result(call, source))
+    return {"messages": messages}
 
 
 def view_cart_node(state: State):
@@ -56,19 +303,19 @@ def view_cart_node(state: State):
             print("[INFO] Cart is empty based on state")
             cart_result = {"status": "empty", "message": "Your cart is empty."}
         else:
-            cart_items = state["cart_items"]
+            cart_items = Cart(state["cart_items"])
             # Calculate totals
-            total_price = sum(float(item.get("item_total", 0)) for item in cart_items)
-            item_count = sum(item.get("quantity", 1) for item in cart_items)
+            total_price = cart_items.total_price
+            item_count = cart_items.item_count
             # Prepare a formatted cart summary
             cart_summary = []
             for item in cart_items:
                 cart_summary.append(
                     {
-                        "product": f"{item.get('product_brand', 'Unknown')} {item.get('product_type', 'Unknown')}",
-                        "quantity": item.get("quantity", 1),
-                        "price_per_unit": f"${item.get('price', 0):.2f}",
-                        "item_total": f"${item.get('item_total', 0):.2f}",
+                        "product": f"{item.product_brand} {item.product_type}",
+                        "quantity": item.quantity,
+                        "price_per_unit": f"${item.price:.2f}",
+                        "item_total": f"${item.item_total:.2f}",
                     }
                 )
             print(
@@ -137,6 +384,93 @@ def view_cart_node(state: State):
     }
 
 
+def new_checkout_key():
+    """Random idempotency key of the order of a cart"""
+    return uuid.uuid4().hex
+
+
+def checkout_node(state: State, config: RunnableConfig):
+    """Node that places the order of the cart in the state (chatbot/orders.py)"""
+    print("\n[INFO] Checkout Node Execution")
+    last_message = state["messages"][-1]
+    checkout_call = next(
+        (tc for tc in last_message.tool_calls if tc.get("name") == "checkout"),
+        last_message.tool_calls[0],
+    )
+    if len(last_message.tool_calls) > 1:
+        # The other calls (e.g. add_to_cart) would change the cart after its order:
+        # every call is answered, none is run, and the model calls them in turn
+        print("[INFO] Checkout requested with other tool calls, none run")
+        skipped = {
+            "status": "skipped",
+            "message": "Nothing was done. Call checkout on its own, after the "
+            "other requests of the user are done.",
+        }
+        return {
+            "messages": [
+                ToolMessage(
+                    content=json.dumps(skipped),
+                    name=tc.get("name"),
+                    tool_call_id=tc.get("id", ""),
+                )
+                for tc in last_message.tool_calls
+            ]
+        }
+    cart = Cart(state.get("cart_items") or ())
+    session_id = (config.get("configurable") or {}).get("session_id")
+    update = {}
+    try:
+        # One key per filled cart, kept until its order commits: a retried
+        # checkout (e.g. after "pending") never places two orders
+        checkout_key = state.get("checkout_key") or new_checkout_key()
+        update = {"checkout_key": checkout_key}
+        key = order_key(session_id, checkout_key)
+        try:
+            result = order_store.place(
+                cart,
+                key,
+                session_id,
+                timeout=remaining_seconds(state.get("turn_deadline")),
+            )
+        except FutureTimeoutError:  # Still queued: it may commit after the turn
+            print("[WARNING] Order not committed before the turn deadline")
+            result = {
+                "status": "pending",
+                "message": "The order is still being placed. Check out again in "
+                "a moment to confirm it; it will not be placed twice.",
+            }
+        if result["status"] in ("placed", "duplicate"):
+            print(f"[INFO] Order {result['order_id']} placed: {result}")
+            update = {"cart_items": cart.clear(), "finished": True}
+            update["order_id"] = result["order_id"]
+            update["checkout_key"] = None  # The next cart is a new order
+            result["message"] = (
+                f"Order #{result['order_id']} placed: {result['item_count']} items, "
+                f"total ${result['total']:.2f}."
+            )
+        elif result["status"] == "empty":
+            result["message"] = "Your cart is empty."
+        elif result["status"] == "out_of_stock":
+            result["message"] = "Some items do not have enough stock left."
+            print(f"[INFO] Order not placed: {result}")
+    except Exception as e:
+        print(
+            f"[ERROR] Exception during checkout_node execution - {e}\n{traceback.format_exc()}"
+        )
+        result = {"status": "error", "message": str(e)}
+
+    return {
+        "messages": [
+            ToolMessage(
+                content=json.dumps(result),
+                name="checkout",
+                tool_call_id=checkout_call.get("id", ""),
+            )
+        ],
+        **update,
+    }
+
+
 def should_call_tool(state: State):
     """Determine if a tool should be called based on the LLM's response"""
     print("[INFO] Checking for tool call")
@@ -146,7 +480,11 @@ def should_call_tool(state: State):
         # Check the first tool call name
         if last_message.tool_calls:
             first_tool_call_name = last_message.tool_calls[0].get("name")
-            if first_tool_call_name == "view_cart":
+            if any(tc.get("name") == "checkout" for tc in last_message.tool_calls):
+                # Also with other calls, which the dummy checkout tool would follow
+                print("[INFO] Decision: 'checkout' call -> Routing to checkout_node")
+                return "call_checkout"
+            elif first_tool_call_name == "view_cart":
                 print(
                     "[INFO] Decision: 'view_cart' call required -> Routing to view_cart_node"
                 )
@@ -164,14 +502,45 @@ def should_call_tool(state: State):
         return "end"
 
 
-def update_cart_node(state):
+def reserve_stock(session_id, product_type, brand, quantity):
+    """
+    Sets the units of a product held by the cart of the session (chatbot/
+    inventory.py). Returns the reservation, or None without a session.
+    """
+    if session_id is None:
+        return None
+    return inventory.reserve(session_id, product_type, brand, quantity)
+
+
+def out_of_stock_message(tool_message, reservation, brand, product_type, in_cart=0):
+    """The tool result replaced by the stock left, for the agent to tell the user"""
+    left = max(reservation["available"] - in_cart, 0)
+    message = (
+        f"Only {left} {brand} {product_type} left in stock."
+        if left
+        else f"{brand} {product_type} is out of stock."
+    )
+    if in_cart:
+        message += f" Your cart already has {in_cart}."
+    content = {"status": "out_of_stock", "message": message, "available": left}
+    return tool_message.model_copy(update={"content": json.dumps(content)})
+
+
+def update_cart_node(state, config: RunnableConfig):
     """Updates the cart based on tool output"""
     updated_state = state.copy()  # Use a copy of the state
+    session_id = (config.get("configurable") or {}).get("session_id")
 
     # Check if the last message is a ToolMessage
     # ToolNode add the result as a ToolMessage
     last_message = updated_state["messages"][-1]
     tool_output_message = None
+    if isinstance(last_message, ToolMessage) and last_message.additional_kwargs.get(
+        "reused_from"
+    ):
+        # The earlier identical call already updated the cart
+        print("[DEBUG] update_cart_node: reused tool result, skipping cart update.")
+        return updated_state
     if isinstance(last_message, ToolMessage):
         tool_output_message = last_message
         print(
@@ -242,12 +611,8 @@ def update_cart_node(state):
 
     print(f"[INFO] update_cart_node triggered by tool: {tool_name}")
 
-    # initialize cart_items
-    if "cart_items" not in updated_state or not isinstance(
-        updated_state["cart_items"], list
-    ):
-        updated_state["cart_items"] = []
-        print("[DEBUG] Initialized cart_items in state.")
+    # The cart is immutable: every update below builds a new Cart
+    cart = Cart(updated_state.get("cart_items") or ())
 
     # Perform cart update logic based on tool name and arguments
     try:
@@ -273,39 +638,35 @@ def update_cart_node(state):
             )
 
             if item_to_add and isinstance(item_to_add, dict):
-                # Check if the item is already in the cart
-                existing_item_index = -1
-                for i, item in enumerate(updated_state["cart_items"]):
-                    if item.get("product_type") == item_to_add.get(
-                        "product_type"
-                    ) and item.get("product_brand") == item_to_add.get("product_brand"):
-                        existing_item_index = i
-                        break
-
-                if existing_item_index != -1:
-                    # Update the quantity and total price of the existing product
-                    current_quantity = updated_state["cart_items"][
-                        existing_item_index
-                    ].get("quantity", 0)
-                    added_quantity = item_to_add.get("quantity", 1)
-                    new_quantity = current_quantity + added_quantity
-                    price = updated_state["cart_items"][existing_item_index].get(
-                        "price", 0
-                    )
-
-                    updated_state["cart_items"][existing_item_index][
-                        "quantity"
-                    ] = new_quantity
-                    updated_state["cart_items"][existing_item_index]["item_total"] = (
-                        price * new_quantity
-                    )
-                    print(
-                        f"[INFO] Updated cart item quantity: {updated_state['cart_items'][existing_item_index]}"
-                    )
-                else:
-                    # Add new product
-                    updated_state["cart_items"].append(item_to_add)
+                item = CartItem.from_dict(item_to_add)
+                in_cart = sum(
+                    line.quantity
+                    for line in cart
+                    if line.matches(item.product_type, item.product_brand)
+                )
+                # The cart holds the units it has: reserve the new line quantity
+                reservation = reserve_stock(
+                    session_id,
+                    item.product_type,
+                    item.product_brand,
+                    in_cart + item.quantity,
+                )
+                if reservation is None or reservation["status"] == "reserved":
+                    # Adds a new line, or the quantity to the line of the product
+                    cart = cart.add(item)
+                    updated_state["finished"] = False  # A new order after a checkout
                     print(f"[INFO] Added to cart: {item_to_add}")
+                else:
+                    updated_state["messages"] = updated_state["messages"][:-1] + [
+                        out_of_stock_message(
+                            tool_output_message,
+                            reservation,
+                            item.product_brand,
+                            item.product_type,
+                            in_cart,
+                        )
+                    ]
+                    print(f"[INFO] Not added, out of stock: {reservation}")
 
             elif tool_result.get("status") != "success":
                 print(
@@ -322,38 +683,17 @@ def update_cart_node(state):
             brand = tool_args.get("brand")
 
             if product_type:
-                original_count = len(updated_state["cart_items"])
-                product_type_lower = product_type.lower()
-                brand_lower = brand.lower() if brand else None
-
-                new_cart_items = []
-                removed_items_desc = []
-
-                for item in updated_state["cart_items"]:
-                    item_product_lower = item.get("product_type", "").lower()
-                    item_brand_lower = item.get("product_brand", "").lower()
-                    matches_product = item_product_lower == product_type_lower
-
-                    # Brand specified: both product type and brand must match
-                    if brand_lower:
-                        if not (matches_product and item_brand_lower == brand_lower):
-                            new_cart_items.append(item)
-                        else:
-                            removed_items_desc.append(
-                                f"{item.get('quantity')}x {item.get('product_brand')} {item.get('product_type')}"
-                            )
-                    # Brand not specified: only product type matches
-                    else:
-                        if not matches_product:
-                            new_cart_items.append(item)
-                        else:
-                            removed_items_desc.append(
-                                f"{item.get('quantity')}x {item.get('product_brand')} {item.get('product_type')}"
-                            )
-
-                if len(new_cart_items) < original_count:
+                # Brand specified: both product type and brand must match
+                # Brand not specified: only product type matches
+                cart, removed = cart.remove(product_type, brand)
+                if removed:
+                    if session_id is not None:  # Their units go back to the stock
+                        inventory.release(
+                            session_id,
+                            [(i.product_type, i.product_brand) for i in removed],
+                        )
+                    removed_items_desc = [item.describe() for item in removed]
                     print(f"[INFO] Removed from cart: {', '.join(removed_items_desc)}")
-                    updated_state["cart_items"] = new_cart_items
                 else:
                     print(
                         f"[INFO] Item to remove not found in cart: {product_type} (Brand: {brand if brand else 'Any'})"
@@ -368,57 +708,59 @@ def update_cart_node(state):
             quantity = tool_args.get("quantity")
 
             if product_type and brand and quantity is not None:
-                product_type_lower = product_type.lower()
-                brand_lower = brand.lower()
-                found = False
-                new_cart_items = []
-                for i, item in enumerate(updated_state["cart_items"]):
-                    if (
-                        item.get("product_type", "").lower() == product_type_lower
-                        and item.get("product_brand", "").lower() == brand_lower
-                    ):
-                        found = True
-                        if quantity > 0:
-                            item["quantity"] = quantity
-                            item["item_total"] = item.get("price", 0) * quantity
-                            new_cart_items.append(item)
-                            print(f"[INFO] Modified cart item: {item}")
-                        else:
-                            # if quantity is 0, remove the item
-                            print(
-                                f"[INFO] Removed item due to quantity 0: {item.get('product_brand')} {item.get('product_type')}"
-                            )
+                # if quantity is 0, the item is removed
+                updated, modified = cart.set_quantity(product_type, brand, quantity)
+                reservation = None
+                if modified:
+                    line = modified[0]
+                    reservation = reserve_stock(
+                        session_id,
+                        line.product_type,
+                        line.product_brand,
+                        max(quantity, 0),
+                    )
+                if reservation is not None and reservation["status"] != "reserved":
+                    updated, modified = cart, ()
+                    updated_state["messages"] = updated_state["messages"][:-1] + [
+                        out_of_stock_message(
+                            tool_output_message,
+                            reservation,
+                            line.product_brand,
+                            line.product_type,
+                        )
+                    ]
+                    print(f"[INFO] Quantity not changed, out of stock: {reservation}")
+                cart = updated
+                for item in modified:
+                    if quantity > 0:
+                        print(
+                            f"[INFO] Modified cart item: {item.with_quantity(quantity)}"
+                        )
                     else:
-                        new_cart_items.append(item)
+                        print(
+                            f"[INFO] Removed item due to quantity 0: {item.product_brand} {item.product_type}"
+                        )
 
-                if not found:
+                if not modified and reservation is None:
                     print(
                         f"[INFO] Item to modify not found in cart: {brand} {product_type}"
                     )
 
-                updated_state["cart_items"] = new_cart_items
-
             else:
                 print("[WARNING] modify_cart called with missing arguments.")
 
         elif tool_name == "clear_cart":
-            if updated_state["cart_items"]:
-                print(
-                    f"[INFO] Cart cleared. Removed {len(updated_state['cart_items'])} item types."
-                )
-                updated_state["cart_items"] = []
+            if cart:
+                print(f"[INFO] Cart cleared. Removed {len(cart)} item types.")
+                cart = cart.clear()
+                if session_id is not None:
+                    inventory.release(session_id)
             else:
                 print("[INFO] Cart is already empty.")
 
         # after update, log cart status
-        total_items = sum(
-            item.get("quantity", 0) for item in updated_state["cart_items"]
-        )
-        total_price = sum(
-            item.get("item_total", 0) for item in updated_state["cart_items"]
-        )
         print(
-            f"[DEBUG] Cart items after update: {len(updated_state['cart_items'])} types, {total_items} total items, total price ${total_price:.2f}"
+            f"[DEBUG] Cart items after update: {len(cart)} types, {cart.item_count} total items, total price ${cart.total_price:.2f}"
         )
 
     except Exception as e:
@@ -426,6 +768,9 @@ def update_cart_node(state):
             f"[ERROR] Error during cart update logic in update_cart_node: {e}\n{traceback.format_exc()}"
         )
 
+    updated_state["cart_items"] = cart
+    if cart and not updated_state.get("checkout_key"):  # The cart got its first item
+        updated_state["checkout_key"] = new_checkout_key()
     return updated_state
 
 
@@ -434,9 +779,10 @@ graph_builder = StateGraph(State)
 
 # Add nodes
 graph_builder.add_node("agent", agent_node)
-graph_builder.add_node("action", tool_node)
+graph_builder.add_node("action", action_node)
 graph_builder.add_node("view_cart", view_cart_node)
 graph_builder.add_node("update_cart", update_cart_node)
+graph_builder.add_node("checkout", checkout_node)
 
 # Set the entry point
 graph_builder.set_entry_point("agent")
@@ -448,6 +794,7 @@ graph_builder.add_conditional_edges(
     {
         "call_tool": "action",  # tool call => action node
         "call_view_cart": "view_cart",  # view_cart call => view_cart node
+        "call_checkout": "checkout",  # checkout call => checkout node
         "end": END,  # no tool call => end
     },
 )
@@ -459,6 +806,8 @@ graph_builder.add_edge("action", "update_cart")
 graph_builder.add_edge("update_cart", "agent")
 # connect to agent node after view_cart node execution
 graph_builder.add_edge("view_cart", "agent")
+# connect to agent node after checkout node execution
+graph_builder.add_edge("checkout", "agent")
 
 # Compile the graph
 try:
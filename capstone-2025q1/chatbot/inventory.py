@@ -0,0 +1,261 @@
+"""
+Stock reservations for the chatbot
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+from chatbot import data_loader
+from chatbot.configs import (
+    RESERVATION_SWEEP_SECONDS,
+    RESERVATION_SYNCHRONOUS,
+    RESERVATION_TTL_SECONDS,
+)
+from chatbot.orders import order_store
+from chatbot.repricing import sku_key
+
+
+def _reservation_result(status, sku, quantity, available=None):
+    return {
+        "status": status,
+        "product_type": sku[0],
+        "product_brand": sku[1],
+        "quantity": quantity,  # Units the session holds
+        "available": available,  # Most units it can hold (when out of stock)
+    }
+
+
+class Inventory:
+    """
+    Stock of the catalog SKUs, with the units held by the carts of sessions.
+
+    - The stock table of the order database holds the units still available;
+      a SKU starts at its product_stock in the catalog (loaded once per
+      process, on first use: live stock is kept across restarts) and SKUs
+      without a stock row are not limited.
+    - reserve() sets the units a session holds of a SKU (its cart quantity)
+      with one upsert of its reservation row: triggers of the schema take the
+      difference off the stock row (or give it back) in the same statement,
+      and abort it if the stock would go below zero. The check and the
+      decrement are one atomic statement: there is no read-then-write window
+      to lock, so concurrent sessions neither oversell nor retry. The stock
+      left is only read (WAL: without a lock) to answer a rejected one.
+    - Every thread writes on its own connection, one autocommit statement per
+      change, committed without fsync (synchronous NORMAL: a crash can lose
+      the last reservations, with their stock changes). Threads and the worker
+      processes of a PreforkServer hold the database write lock for that
+      statement only, never while Python code runs.
+    - A reservation expires ttl seconds after the last cart change or turn of
+      its session (touch()); sweep() gives the expired units back. Checkout
+      turns the reservations of the session into its order (OrderStore).
+    """
+
+    def __init__(
+        self,
+        store=order_store,
+        ttl_seconds=RESERVATION_TTL_SECONDS,
+        synchronous=RESERVATION_SYNCHRONOUS,
+    ):
+        self.store = store
+        self.ttl = ttl_seconds
+        self.synchronous = synchronous
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._local = threading.local()  # Connection of every thread
+        self._loaded_pid = None
+        self._swept = 0.0
+        self._touched = {}  # session id -> time of its last expiry refresh
+        self.stats = Counter()
+
+    def reserve(self, session_id, product_type, brand, quantity):
+        """
+        Sets the units of a SKU held by a session (0 releases them). Returns
+        {"status" ("reserved" or "out_of_stock"), "product_type",
+        "product_brand", "quantity" (units held), "available" (most units the
+        session can hold; None when reserved)}.
+        """
+        connection = self._prepare()
+        sku = sku_key(product_type, brand)
+        quantity = max(0, int(quantity))
+        try:
+            if quantity:
+                connection.execute(
+                    "INSERT INTO reservations (session_id, product_type, "
+                    "product_brand, quantity, expires) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT (session_id, product_type, product_brand) DO UPDATE "
+                    "SET quantity = excluded.quantity, expires = excluded.expires",
+                    (session_id, *sku, quantity, time.time() + self.ttl),
+                )
+            else:
+                connection.execute(
+                    "DELETE FROM reservations WHERE session_id = ? "
+                    "AND product_type = ? AND product_brand = ?",
+                    (session_id, *sku),
+                )
+        except sqlite3.IntegrityError:  # The stock row would go below zero
+            self._count("out_of_stock")
+            stock, held = connection.execute(
+                "SELECT s.quantity, COALESCE(r.quantity, 0) FROM stock s "
+                "LEFT JOIN reservations r ON r.session_id = ? "
+                "AND r.product_type = s.product_type "
+                "AND r.product_brand = s.product_brand "
+                "WHERE s.product_type = ? AND s.product_brand = ?",
+                (session_id, *sku),
+            ).fetchone()
+            return _reservation_result("out_of_stock", sku, held, stock + held)
+        self._count("reserved", session_id=session_id)
+        return _reservation_result("reserved", sku, quantity)
+
+    def release(self, session_id, skus=None):
+        """
+        Gives back the units held by a session (of the given (product type,
+        brand) pairs, or all of them). Returns the units released.
+        """
+        if skus is None:
+            with self._lock:
+                self._touched.pop(session_id, None)
+        elif not skus:
+            return 0
+
+        connection = self._prepare()
+        if skus is None:
+            rows = connection.execute(
+                "DELETE FROM reservations WHERE session_id = ? RETURNING quantity",
+                (session_id,),
+            ).fetchall()
+        else:
+            keys = {sku_key(*sku) for sku in skus}
+            rows = connection.execute(
+                "DELETE FROM reservations WHERE session_id = ? AND ("
+                + " OR ".join(["(product_type = ? AND product_brand = ?)"] * len(keys))
+                + ") RETURNING quantity",
+                [session_id, *(value for sku in keys for value in sku)],
+            ).fetchall()
+        released = sum(quantity for (quantity,) in rows)
+        self._count("released", released)
+        return released
+
+    def touch(self, session_id):
+        """
+        Extends the reservations of an active session (writes at most once per
+        quarter of the ttl)
+        """
+        now = time.monotonic()
+        with self._lock:
+            if now - self._touched.get(session_id, -self.ttl) < self.ttl / 4:
+                return
+            self._touched[session_id] = now
+        self._prepare().execute(
+            "UPDATE reservations SET expires = ? WHERE session_id = ?",
+            (time.time() + self.ttl, session_id),
+        )
+
+    def sweep(self):
+        """
+        Gives back the units of the expired reservations (at most once every
+        RESERVATION_SWEEP_SECONDS). Returns the units released, or None when
+        not due.
+        """
+        now = time.monotonic()
+        if now - self._swept < RESERVATION_SWEEP_SECONDS:  # Checked again locked
+            return None
+        with self._lock:
+            if now - self._swept < RESERVATION_SWEEP_SECONDS:
+                return None
+            self._swept = now
+            for session_id, touched in list(self._touched.items()):
+                if now - touched > self.ttl:
+                    del self._touched[session_id]
+        return self.release_expired()
+
+    def release_expired(self, now=None):
+        """Gives back the units of the reservations expired at now"""
+        now = time.time() if now is None else now
+        rows = (
+            self._connection()
+            .execute(
+                "DELETE FROM reservations WHERE expires <= ? RETURNING quantity", (now,)
+            )
+            .fetchall()
+        )
+        released = sum(quantity for (quantity,) in rows)
+        if released:
+            self._count("expired", released)
+            print(f"[INFO] Expired reservations released: {released} units")
+        return released
+
+    def load_stock(self, frame):
+        """
+        Adds a stock row for every SKU of a catalog frame with a product_stock
+        (the value of its first row); SKUs that already have one keep it.
+        Returns the rows added.
+        """
+        if frame is None or frame.empty or "product_stock" not in frame.columns:
+            return 0
+        first = frame.assign(
+            product_type=frame["product_type"].astype(str).str.lower(),
+            product_brand=frame["product_brand"].astype(str).str.lower(),
+        ).drop_duplicates(["product_type", "product_brand"])
+        rows = list(
+            zip(
+                first["product_type"],
+                first["product_brand"],
+                first["product_stock"].astype(int).tolist(),
+            )
+        )
+
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            before = connection.total_changes
+            connection.executemany(
+                "INSERT INTO stock (product_type, product_brand, quantity) "
+                "VALUES (?, ?, ?) ON CONFLICT (product_type, product_brand) "
+                "DO NOTHING",
+                rows,
+            )
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        return connection.total_changes - before
+
+    def usage(self):
+        """Sessions with a recent reservation, and the counters"""
+        with self._lock:
+            return {"active_sessions": len(self._touched), **self.stats}
+
+    # --- Internals ---
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = self.store.connect(self.synchronous)
+            self._local.connection, self._local.pid = connection, os.getpid()
+        return connection
+
+    def _prepare(self):
+        """
+        Loads the catalog stock once per process and sweeps when due. Returns
+        the connection of the thread.
+        """
+        if self._loaded_pid != os.getpid():
+            with self._load_lock:  # Reservations wait for the stock rows
+                if self._loaded_pid != os.getpid():
+                    added = self.load_stock(data_loader.data)
+                    if added:
+                        print(f"[INFO] Stock loaded from the catalog: {added} SKUs")
+                    self._loaded_pid = os.getpid()
+        self.sweep()
+        return self._connection()
+
+    def _count(self, name, value=1, session_id=None):
+        with self._lock:
+            self.stats[name] += value
+            if session_id is not None:  # Its reservations were just written
+                self._touched[session_id] = time.monotonic()
+
+
+inventory = Inventory()
@@ -2,26 +2,63 @@
 LLM for the chatbot
 """
 
+import hashlib
+import json
 import os
+import threading
+import time
 
+from google.ai.generativelanguage_v1beta import (
+    CachedContent,
+    CacheServiceClient,
+    Content,
+    Part,
+)
+from google.api_core.client_options import ClientOptions
+from google.protobuf import duration_pb2, field_mask_pb2
+from langchain_core.messages import SystemMessage
+from langchain_core.utils.function_calling import convert_to_openai_tool
 from langchain_google_genai import (
     ChatGoogleGenerativeAI,
     HarmBlockThreshold,
     HarmCategory,
 )
 
-from chatbot.configs import MODEL_NAME, TEMPERATURE, SYSTEM_PROMPT
+from chatbot.configs import (
+    MODEL_NAME,
+    TEMPERATURE,
+    SYSTEM_PROMPT,
+    LLM_TRANSPORT,
+    LLM_API_ENDPOINT,
+    LLM_REQUESTS_PER_MINUTE,
+    LLM_TOKENS_PER_MINUTE,
+    LLM_MAX_CONCURRENCY,
+    LLM_MAX_RETRIES,
+    LLM_BACKOFF_BASE,
+    LLM_BACKOFF_MAX,
+    LLM_CALL_TIMEOUT_SECONDS,
+    CONTEXT_CACHE_TTL_SECONDS,
+    CONTEXT_CACHE_REFRESH_MARGIN_SECONDS,
+    MODEL_ROUTING_ENABLED,
+    MODEL_TIERS,
+)
+from chatbot.gateway import PRIORITY_NORMAL, LLMGateway, configure_http_pool
 
 from dotenv import load_dotenv
 
 load_dotenv(override=True)
 
-# Initialize the Gemini model
-try:
-    llm = ChatGoogleGenerativeAI(
-        model=MODEL_NAME,
-        temperature=TEMPERATURE,
+
+def create_llm(model_name=MODEL_NAME, temperature=TEMPERATURE, api_endpoint=None):
+    """Creates a Gemini chat model whose HTTP connection pool matches the gateway"""
+    api_endpoint = api_endpoint or LLM_API_ENDPOINT
+    model = ChatGoogleGenerativeAI(
+        model=model_name,
+        temperature=temperature,
         google_api_key=os.getenv("GOOGLE_API_KEY"),  # Explicitly pass the API key
+        transport=LLM_TRANSPORT,
+        client_options={"api_endpoint": api_endpoint} if api_endpoint else None,
+        max_retries=1,  # Retries are handled by the gateway
         safety_settings={
             HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
             HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
@@ -29,7 +66,249 @@ try:
             HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
         },
     )
+    configure_http_pool(model, LLM_MAX_CONCURRENCY)
+    return model
+
+
+def create_cache_client(model):
+    """Creates a context-cache API client with the transport/endpoint of a model"""
+    options = dict(model.client_options or {})
+    options.setdefault("api_endpoint", "generativelanguage.googleapis.com")
+    if model.google_api_key:
+        options["api_key"] = model.google_api_key.get_secret_value()
+    return CacheServiceClient(
+        transport=model.transport, client_options=ClientOptions(**options)
+    )
+
+
+def is_cache_miss(error):
+    """True when a request referenced a cache that expired or was deleted"""
+    return getattr(error, "code", None) in (403, 404) and "CachedContent" in str(error)
+
+
+def load_function_declarations():
+    """
+    Returns the converter of tool schemas to Gemini function declarations used
+    by bind_tools, or None when the installed langchain_google_genai does not
+    have it (it is not a public API)
+    """
+    try:
+        from langchain_google_genai._function_utils import (
+            convert_to_genai_function_declarations,
+        )
+    except (AttributeError, ImportError):
+        print("[WARNING] No Gemini tool declaration converter; context cache disabled.")
+        return None
+    return convert_to_genai_function_declarations
+
+
+class ContextCache:
+    """
+    Provider-side cache of the static request prefix: the system prompt and the
+    tool declarations, which are identical on every request of every session.
+
+    The prefix is registered once with the context-caching API and requests
+    reference it by name instead of re-sending it, so it is neither re-uploaded
+    nor re-processed (and cached tokens are billed at a reduced rate).
+
+    - The cache is created on first use and its TTL is extended when less than
+      refresh_margin_seconds remain.
+    - A changed prompt or tool set (set_prefix) gets a new cache; the old one is
+      deleted. A cache that expired on the server side is recreated once.
+    - Requests whose system message differs from the cached prompt, and all
+      requests after the provider rejected the cache (e.g. a prefix below the
+      model's minimum cache size), are sent uncached. So are all requests when
+      the tool declarations cannot be built (see load_function_declarations).
+    """
+
+    def __init__(
+        self,
+        model,
+        system_prompt,
+        tools,
+        ttl_seconds=CONTEXT_CACHE_TTL_SECONDS,
+        refresh_margin_seconds=CONTEXT_CACHE_REFRESH_MARGIN_SECONDS,
+        client=None,
+        clock=time.monotonic,
+    ):
+        self.model = model
+        self.ttl_seconds = ttl_seconds
+        self.refresh_margin_seconds = refresh_margin_seconds
+        self.disabled = False
+        self.name = None
+        self.expires_at = 0.0
+        self.fingerprint = None
+        self.stats = {
+            "created": 0,
+            "refreshed": 0,
+            "recreated": 0,
+            "deleted": 0,
+            "cached_requests": 0,
+            "uncached_requests": 0,
+        }
+        self._client = client or create_cache_client(model)
+        self._function_declarations = load_function_declarations()
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._stale = []  # names of replaced caches, deleted on the next request
+        self.set_prefix(system_prompt, tools)
+
+    def set_prefix(self, system_prompt, tools):
+        """Sets the cached prompt and tools; a changed prefix invalidates the cache"""
+        schemas = [convert_to_openai_tool(tool) for tool in tools]
+        prefix = json.dumps([self.model.model, system_prompt, schemas], sort_keys=True)
+        fingerprint = hashlib.sha256(prefix.encode()).hexdigest()
+        with self._lock:
+            if fingerprint == self.fingerprint:
+                return
+            if self.name:
+                self._stale.append(self.name)
+            self.system_prompt = system_prompt
+            self.tool_schemas = schemas
+            self.fingerprint = fingerprint
+            self.name = None
+            self.disabled = False
+
+    def handle(self):
+        """Returns the name of a live cache of the prefix (created or refreshed)"""
+        with self._lock:
+            self._delete_stale()
+            now = self._clock()
+            if self.name is None or now >= self.expires_at:
+                self._create(now)
+            elif self.expires_at - now < self.refresh_margin_seconds:
+                self._refresh(now)
+            return self.name
+
+    def invalidate(self, name):
+        """Forgets a cache the server no longer knows"""
+        with self._lock:
+            if self.name == name:
+                self.name = None
+                self.stats["recreated"] += 1
+
+    def invoke(
+        self, gateway, messages, fallback, priority=PRIORITY_NORMAL, deadline=None
+    ):
+        """
+        Calls the model through the gateway with the prefix referenced by name.
+
+        fallback is the runnable used for uncached requests (the model with
+        its tools bound); messages are the full conversation.
+        """
+        system = [m.content for m in messages if isinstance(m, SystemMessage)]
+        if (
+            self.disabled
+            or self._function_declarations is None
+            or system != [self.system_prompt]
+        ):
+            self._count("uncached_requests")
+            return gateway.invoke(fallback, messages, priority, deadline)
+        try:
+            name = self.handle()
+        except Exception as e:
+            # 400 = the provider refuses to cache this prefix; stop trying
+            self.disabled = getattr(e, "code", None) == 400
+            print(f"[WARNING] Context cache unavailable, sending full prompt: {e}")
+            self._count("uncached_requests")
+            return gateway.invoke(fallback, messages, priority, deadline)
+
+        history = [m for m in messages if not isinstance(m, SystemMessage)]
+        try:
+            response = gateway.invoke(
+                self.model, history, priority, deadline, cached_content=name
+            )
+        except Exception as e:
+            if not is_cache_miss(e):
+                raise
+            print(f"[WARNING] Context cache {name} expired on the server; recreating.")
+            self.invalidate(name)
+            response = gateway.invoke(
+                self.model, history, priority, deadline, cached_content=self.handle()
+            )
+        self._count("cached_requests")
+        return response
+
+    def close(self):
+        """Deletes the cache (best effort)"""
+        with self._lock:
+            if self.name:
+                self._stale.append(self.name)
+                self.name = None
+            self._delete_stale()
+
+    def _create(self, now):
+        cached_content = CachedContent(
+            model=self.model.model,
+            system_instruction=Content(parts=[Part(text=self.system_prompt)]),
+            # Same declarations as bind_tools sends with an uncached request
+            tools=[self._function_declarations(self.tool_schemas)],
+            ttl=duration_pb2.Duration(seconds=int(self.ttl_seconds)),
+        )
+        self.name = self._client.create_cached_content(
+            cached_content=cached_content
+        ).name
+        self.expires_at = now + self.ttl_seconds
+        self.stats["created"] += 1
+        print(f"[INFO] Context cache created: {self.name} (TTL {self.ttl_seconds}s)")
+
+    def _refresh(self, now):
+        try:
+            self._client.update_cached_content(
+                cached_content=CachedContent(
+                    name=self.name,
+                    ttl=duration_pb2.Duration(seconds=int(self.ttl_seconds)),
+                ),
+                update_mask=field_mask_pb2.FieldMask(paths=["ttl"]),
+            )
+        except Exception as e:
+            if not is_cache_miss(e):
+                raise
+            self.stats["recreated"] += 1
+            self._create(now)
+            return
+        self.expires_at = now + self.ttl_seconds
+        self.stats["refreshed"] += 1
+
+    def _delete_stale(self):
+        while self._stale:
+            name = self._stale.pop()
+            try:
+                self._client.delete_cached_content(name=name)
+                self.stats["deleted"] += 1
+            except Exception as e:
+                print(f"[WARNING] Could not delete context cache {name}: {e}")
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+
+# Initialize the Gemini model
+try:
+    llm = create_llm()
     print(f"[INFO] LLM initialized successfully with model: {MODEL_NAME}")
 except Exception as e:
     print(f"[ERROR] Error initializing LLM: {e}")
     llm = None  # Set to None if an error occurs
+
+# Lighter model tiers used before the main model (see chatbot/routing.py)
+llm_tiers = {}
+if llm and MODEL_ROUTING_ENABLED:
+    for tier in MODEL_TIERS[:-1]:
+        try:
+            llm_tiers[tier["name"]] = create_llm(tier["model"], tier["temperature"])
+            print(f"[INFO] Model tier '{tier['name']}' initialized: {tier['model']}")
+        except Exception as e:
+            print(f"[ERROR] Error initializing model tier '{tier['name']}': {e}")
+
+# Shared gateway for all model calls (quota, priorities, retries)
+llm_gateway = LLMGateway(
+    requests_per_minute=LLM_REQUESTS_PER_MINUTE,
+    tokens_per_minute=LLM_TOKENS_PER_MINUTE,
+    max_concurrency=LLM_MAX_CONCURRENCY,
+    max_retries=LLM_MAX_RETRIES,
+    backoff_base=LLM_BACKOFF_BASE,
+    backoff_max=LLM_BACKOFF_MAX,
+    call_timeout=LLM_CALL_TIMEOUT_SECONDS,
+)
@@ -0,0 +1,156 @@
+"""
+Duplicate tool-call and loop detection for the chatbot
+"""
+
+import json
+import threading
+from collections import Counter
+
+from langchain_core.messages import AIMessage, ToolMessage
+
+from chatbot.routing import current_turn
+
+# Tools whose result depends only on their arguments and the catalog; the cart
+# tools are never reused (remove -> add -> remove must run every call)
+REUSABLE_TOOLS = frozenset(
+    [
+        "search_category_by_type",
+        "search_category_by_type_all",
+        "search_multiple_ingredients",
+        "search_ingredient_by_type_all",
+        "search_ingredient_by_brand",
+        "search_ingredient_by_rating",
+        "search_ingredient_by_price",
+        "search_ingredient_by_review",
+        "search_catalog",
+        "compare_ingredient_by_rating",
+        "compare_ingredient_by_price",
+        "compare_ingredient_by_review",
+        "help",
+        "greeting",
+        "fallback",
+    ]
+)
+
+
+def call_key(call):
+    """Identity of a tool call: its name and canonical arguments"""
+    return call["name"], json.dumps(call.get("args", {}), sort_keys=True, default=str)
+
+
+def answered_calls(messages):
+    """
+    Returns {call key: ToolMessage} for the calls of reusable tools answered in
+    the current turn
+    """
+    turn = current_turn(messages)
+    results = {
+        m.tool_call_id: m
+        for m in turn
+        if isinstance(m, ToolMessage) and m.status != "error"
+    }
+    answered = {}
+    for message in turn:
+        if isinstance(message, AIMessage):
+            for call in message.tool_calls:
+                if call["name"] in REUSABLE_TOOLS and call.get("id") in results:
+                    answered.setdefault(call_key(call), results[call["id"]])
+    return answered
+
+
+def requested_calls(messages):
+    """Counts the tool calls requested by the model in the current turn"""
+    return Counter(
+        call_key(call)
+        for m in current_turn(messages)
+        if isinstance(m, AIMessage)
+        for call in m.tool_calls
+    )
+
+
+def reused_result(call, source):
+    """ToolMessage answering a tool call with the result of an identical earlier call"""
+    return ToolMessage(
+        content=source.content,
+        tool_call_id=call["id"],
+        name=call["name"],
+        additional_kwargs={"reused_from": source.tool_call_id},
+    )
+
+
+class LoopDetector:
+    """
+    Detects tool calls the model repeats within a user turn.
+
+    - A call of a reusable (read-only) tool with the same name and arguments
+      as one already answered in the turn, or as an earlier call of the same
+      step, is a duplicate: it is answered with the earlier result instead of
+      running the tool again. Cart tools always run.
+    - A model step made only of calls that were already repeated max_repeats
+      times is a loop: the model keeps asking for results it has, so the turn
+      is answered directly instead of paying for another round-trip.
+
+    Duplicates and redundant model calls are counted even when disabled, so
+    runs with and without detection can be compared.
+    """
+
+    def __init__(self, enabled=True, max_repeats=1):
+        self.enabled = enabled
+        self.max_repeats = max_repeats
+        self._lock = threading.Lock()
+        self.stats = Counter()
+
+    def is_loop(self, messages, response):
+        """
+        Checks a model response against the turn so far; True when the turn
+        should be answered directly instead of running the response's calls.
+        """
+        calls = getattr(response, "tool_calls", None) or []
+        if not calls:
+            return False
+        answered = answered_calls(messages)
+        if not all(call_key(call) in answered for call in calls):
+            return False
+        self._count("redundant_llm_calls")
+        requested = requested_calls(messages)
+        if not all(requested[call_key(call)] > self.max_repeats for call in calls):
+            return False
+        self._count("loops_detected")
+        return self.enabled
+
+    def split_calls(self, messages, calls):
+        """
+        Splits the tool calls of a step into (pending, duplicates): the calls to
+        run, and {call id: earlier ToolMessage or pending call id} for the rest.
+        """
+        answered = answered_calls(messages)
+        pending, duplicates, first = [], {}, {}
+        for call in calls:
+            if call["name"] not in REUSABLE_TOOLS:
+                pending.append(call)
+                continue
+            key = call_key(call)
+            source = answered.get(key) or first.get(key)
+            if source is None:
+                first[key] = call["id"]
+                pending.append(call)
+                continue
+            self._count("duplicate_tool_calls")
+            if self.enabled:
+                self._count("reused_tool_calls")
+                duplicates[call["id"]] = source
+            else:
+                pending.append(call)
+        return pending, duplicates
+
+    def summary(self):
+        with self._lock:
+            return dict(self.stats)
+
+    def reset(self):
+        with self._lock:
+            self.stats.clear()
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
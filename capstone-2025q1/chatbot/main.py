@@ -3,13 +3,27 @@ Main file for the chatbot
 """
 
 import sys
+import time
 import traceback
 
 from dotenv import load_dotenv
 
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 
-from chatbot.configs import SYSTEM_PROMPT, get_welcome_message
+from chatbot.cart import Cart
+from chatbot.configs import (
+    MAX_TOOL_LOOP_DEPTH,
+    SYSTEM_PROMPT,
+    TURN_DEADLINE_SECONDS,
+    get_welcome_message,
+)
+from chatbot.fuzzy import fuzzy_matcher
+from chatbot.inventory import inventory
+from chatbot.message_log import MessageLog
+from chatbot.profiling import turn_profiler
+from chatbot.query import get_catalog_index
+from chatbot.recording import transcript_recorder
+from chatbot.repricing import cart_repricer
 
 load_dotenv(override=True)
 
@@ -28,25 +42,18 @@ except ImportError as e:
     sys.exit(1)  # Exit if an error occurs
 
 
-# --- Chatbot simulation loop (using stream) ---
-def run_chat():
-    print("[INFO] Chatbot Simulation Start (Using Stream)")
-    print("[INFO] Start chatting with the bot. Type 'quit', 'exit', or 'bye' to end.")
-
-    WELCOME_MESSAGE = get_welcome_message()
-
-    conversation_history = [
-        SystemMessage(content=SYSTEM_PROMPT),
-        AIMessage(content=WELCOME_MESSAGE),
-    ]
-
-    # Print the welcome message to the user
-    print(f"🤖 Chatbot: {WELCOME_MESSAGE}")
-    print("-" * 20)  # Turn separator
-
+# --- Session helpers (shared by the chat loop and the benchmarks) ---
+def new_session():
+    """Creates the initial conversation history and graph state for a session"""
+    conversation_history = MessageLog(
+        [
+            SystemMessage(content=SYSTEM_PROMPT),
+            AIMessage(content=get_welcome_message()),
+        ]
+    )
     current_state = {
-        "messages": conversation_history,
-        "cart_items": [],
+        "messages": conversation_history.window(),
+        "cart_items": Cart(),
         "category_type": None,
         "product_type": None,
         "product_brand": None,
@@ -54,58 +61,166 @@ def run_chat():
         "product_review": None,
         "product_price": None,
         "finished": False,
+        "order_id": None,
+        "checkout_key": None,
+        "turn_deadline": None,
+        "token_usage": None,
+    }
+    return current_state, conversation_history
+
+
+def chat_turn(
+    current_state, conversation_history, user_input, config=None, session_id=None
+):
+    """
+    Runs one user turn through the graph (profiled when turn_profiler has a
+    request for the session).
+
+    Returns:
+        tuple: (current_state, final_ai_message, tool_calls_made)
+    """
+    if turn_profiler.active:
+        return turn_profiler.run_turn(
+            session_id,
+            _chat_turn,
+            current_state,
+            conversation_history,
+            user_input,
+            session_id,
+            config=config,
+        )
+    return _chat_turn(
+        current_state, conversation_history, user_input, session_id, config
+    )
+
+
+def _chat_turn(
+    current_state, conversation_history, user_input, session_id=None, config=None
+):
+    if session_id is not None:
+        # Catalog prices changed since the last turn of the session
+        prices_version = cart_repricer.refresh(session_id, current_state)
+    # Add user message to the current conversation history
+    conversation_history.append(HumanMessage(content=user_input))
+    # Only the recent part of the history is rebuilt as messages for the model
+    current_state["messages"] = conversation_history.window()
+    # Time budget of the turn, checked by the agent and action nodes
+    current_state["turn_deadline"] = time.monotonic() + TURN_DEADLINE_SECONDS
+    current_state["token_usage"] = None  # Summed over the model calls of the turn
+    # Backstop for the tool loop (agent -> action -> update_cart per round)
+    config = dict(config or {})
+    config.setdefault("recursion_limit", 3 * MAX_TOOL_LOOP_DEPTH + 5)
+    # The session of the turn (idempotency key of its orders)
+    config["configurable"] = {
+        **config.get("configurable", {}),
+        "session_id": session_id,
     }
 
+    # Variables to store the final response and related information
+    final_ai_message = None
+    tool_calls_made = None
+    # Graph events kept for the transcript (CHATBOT_RECORD_FILE)
+    recorded = None
+    if transcript_recorder.enabled:
+        recorded = []
+        turn = transcript_recorder.begin(current_state["messages"])
+
+    # Call app.stream() and process the results
+    for event in app.stream(current_state, config=config):
+        if recorded is not None:
+            recorded.append(event)
+        # Check if the cart items are updated
+        if "update_cart" in event:
+            current_state = event["update_cart"]
+            if "cart_items" in current_state:
+                print(
+                    f"[DEBUG] Cart items updated: {len(current_state['cart_items'])} items"
+                )
+        # The checkout node empties the cart of a placed order
+        if "checkout" in event:
+            current_state = {
+                **current_state,
+                **{k: v for k, v in event["checkout"].items() if k != "messages"},
+            }
+
+        # Process the agent response
+        if "agent" in event:
+            agent_output = event["agent"]
+            if agent_output.get("token_usage"):
+                current_state["token_usage"] = agent_output["token_usage"]
+            if "messages" in agent_output and agent_output["messages"]:
+                latest_message = agent_output["messages"][-1]
+                if isinstance(latest_message, AIMessage):
+                    final_ai_message = latest_message
+                    if latest_message.tool_calls:
+                        tool_calls_made = latest_message.tool_calls
+
+    # Update the conversation history
+    if final_ai_message and final_ai_message.content and final_ai_message.content.strip():
+        conversation_history.append(final_ai_message)
+    else:
+        print("[DEBUG] Skipping adding empty AIMessage to history.")
+    # The log keeps the conversation: drop the messages rebuilt for this turn
+    current_state = {**current_state, "messages": []}
+    if session_id is not None:
+        cart_repricer.track(
+            session_id, current_state.get("cart_items", ()), prices_version
+        )
+        if current_state.get("cart_items"):
+            inventory.touch(session_id)  # Its reservations expire after idle turns
+    if recorded is not None:
+        transcript_recorder.record(
+            session_id, user_input, turn, recorded, final_ai_message, current_state
+        )
+
+    return current_state, final_ai_message, tool_calls_made
+
+
+# --- Chatbot simulation loop (using stream) ---
+def run_chat():
+    print("[INFO] Chatbot Simulation Start (Using Stream)")
+    # Fuzzy matching pool (CHATBOT_FUZZY_WORKERS), forked before any session runs
+    fuzzy_matcher.start(get_catalog_index())
+    print("[INFO] Start chatting with the bot. Type 'quit', 'exit', or 'bye' to end.")
+
+    current_state, conversation_history = new_session()
+    session_id = f"chat-{int(time.time())}"  # Used in profiles and transcripts
+    WELCOME_MESSAGE = conversation_history[-1].content
+
+    # Print the welcome message to the user
+    print(f"🤖 Chatbot: {WELCOME_MESSAGE}")
+    print("-" * 20)  # Turn separator
+
     while True:
         try:
             user_input = input("👤 User: ")
             if user_input.lower() in ["quit", "exit", "bye"]:
                 print("[INFO] Exiting chatbot.")
                 break
+            if user_input.startswith("/profile"):
+                # Admin command: /profile [turns] or /profile tool <name> [calls]
+                args = user_input.split()[1:]
+                if args[:1] == ["tool"] and len(args) > 1:
+                    calls = int(args[2]) if len(args) > 2 else 1
+                    turn_profiler.request_tool(args[1], calls)
+                    print(f"[INFO] Profiling the next {calls} call(s) of {args[1]}")
+                else:
+                    turns = int(args[0]) if args else 1
+                    turn_profiler.request(turns)
+                    print(f"[INFO] Profiling the next {turns} turn(s)")
+                continue
 
             # print(f"[DEBUG] User input: {user_input}")
             # sys.stdout.flush()
 
-            # Add user message to the current conversation history
-            conversation_history.append(HumanMessage(content=user_input))
-            current_state["messages"] = conversation_history
-
-            # Variables to store the final response and related information
-            final_ai_message_content = ""
-            final_ai_message = None
-            tool_calls_made = None
-
-            # Call app.stream() and process the results
-            for event in app.stream(current_state):
-                # Check if the cart items are updated
-                if "update_cart" in event:
-                    current_state = event["update_cart"]
-                    if "cart_items" in current_state:
-                        print(
-                            f"[DEBUG] Cart items updated: {len(current_state['cart_items'])} items"
-                        )
-
-                # Process the agent response
-                if "agent" in event:
-                    agent_output = event["agent"]
-                    if "messages" in agent_output and agent_output["messages"]:
-                        latest_message = agent_output["messages"][-1]
-                        if isinstance(latest_message, AIMessage):
-                            final_ai_message_content = latest_message.content
-                            final_ai_message = latest_message
-                            if latest_message.tool_calls:
-                                tool_calls_made = latest_message.tool_calls
+            current_state, final_ai_message, tool_calls_made = chat_turn(
+                current_state, conversation_history, user_input, session_id=session_id
+            )
 
             # Print the final response content
-            print("🤖 Chatbot:", final_ai_message_content)
+            print("🤖 Chatbot:", final_ai_message.content if final_ai_message else "")
             sys.stdout.flush()
 
-            # Update the conversation history
-            if final_ai_message and final_ai_message.content and final_ai_message.content.strip():
-                conversation_history.append(final_ai_message)
-            else:
-                print("[DEBUG] Skipping adding empty AIMessage to history.")
-
             # Print tool call information (for debugging)
             if tool_calls_made:
                 print(
@@ -0,0 +1,122 @@
+"""
+Compact message log for the chatbot
+"""
+
+import json
+import sys
+from array import array
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+
+from chatbot.configs import HISTORY_WINDOW_MESSAGES
+
+_KINDS = (HumanMessage, AIMessage, ToolMessage, SystemMessage)
+_HUMAN = 0
+
+
+class MessageLog:
+    """
+    Append-only conversation history of a session, stored compactly.
+
+    - The first messages (the prefix: system prompt and welcome message) are
+      kept as message objects, shared with the other sessions.
+    - Every later message is stored as a kind code (one byte), its content in
+      one UTF-8 buffer (addressed by an array of end offsets), and the tool
+      calls of AI messages or the tool call id of tool messages, with the tool
+      names interned. Metadata (response and usage metadata, message ids) is
+      not kept.
+    - Messages are rebuilt as LangChain objects only when read; window()
+      rebuilds the part of the history sent to the model.
+
+    Indexing, slicing, len() and iteration behave like a list of messages.
+    """
+
+    __slots__ = ("_prefix", "_kinds", "_ends", "_content", "_extras", "_parts")
+
+    def __init__(self, prefix=()):
+        self._prefix = list(prefix)
+        self._kinds = array("B")
+        self._ends = array("I")  # end offset of every content in _content
+        self._content = bytearray()
+        self._extras = {}  # position -> tool calls (AI) or tool call (tool result)
+        self._parts = {}  # position -> JSON of a content that is a list of parts
+
+    def __len__(self):
+        return len(self._prefix) + len(self._kinds)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("message log index out of range")
+        if index < len(self._prefix):
+            return self._prefix[index]
+        return self._message(index - len(self._prefix))
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def append(self, message):
+        kind = next(
+            (i for i, cls in enumerate(_KINDS) if isinstance(message, cls)), None
+        )
+        if kind is None:
+            raise TypeError(f"Unsupported message type: {type(message).__name__}")
+        position = len(self._kinds)
+        content = message.content
+        if not isinstance(content, str):
+            self._parts[position] = json.dumps(content)
+            content = ""
+        if isinstance(message, AIMessage) and message.tool_calls:
+            self._extras[position] = tuple(
+                (sys.intern(call["name"]), json.dumps(call["args"]), call["id"])
+                for call in message.tool_calls
+            )
+        elif isinstance(message, ToolMessage):
+            self._extras[position] = (
+                message.tool_call_id,
+                sys.intern(message.name) if message.name else None,
+            )
+        self._content += content.encode("utf-8")
+        self._ends.append(len(self._content))
+        self._kinds.append(kind)
+
+    def extend(self, messages):
+        for message in messages:
+            self.append(message)
+
+    def window(self, size=HISTORY_WINDOW_MESSAGES):
+        """
+        Messages for the model: the prefix and the last size messages (all when
+        size is 0), starting at a user message.
+        """
+        start = 0
+        if size and len(self._kinds) > size:
+            start = len(self._kinds) - size
+            # No answer or tool result without the request it belongs to
+            while start < len(self._kinds) - 1 and self._kinds[start] != _HUMAN:
+                start += 1
+        return self._prefix + [
+            self._message(position) for position in range(start, len(self._kinds))
+        ]
+
+    def _message(self, position):
+        start = self._ends[position - 1] if position else 0
+        content = self._content[start : self._ends[position]].decode("utf-8")
+        if position in self._parts:
+            content = json.loads(self._parts[position])
+        cls = _KINDS[self._kinds[position]]
+        extra = self._extras.get(position)
+        if cls is AIMessage and extra:
+            tool_calls = [
+                {"name": name, "args": json.loads(args), "id": call_id}
+                for name, args, call_id in extra
+            ]
+            return AIMessage(content=content, tool_calls=tool_calls)
+        if cls is ToolMessage:
+            tool_call_id, name = extra
+            return ToolMessage(content=content, tool_call_id=tool_call_id, name=name)
+        return cls(content=content)
@@ -0,0 +1,491 @@
+"""
+Order store for the chatbot
+"""
+
+import hashlib
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+from chatbot.cart import Cart
+from chatbot.configs import (
+    ORDER_BATCH_SIZE,
+    ORDER_BUSY_TIMEOUT_MS,
+    ORDER_FLUSH_MS,
+    ORDER_SYNCHRONOUS,
+    ORDERS_DB_PATH,
+)
+from chatbot.repricing import sku_key
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS orders (
+    order_id INTEGER PRIMARY KEY,
+    idempotency_key TEXT NOT NULL UNIQUE,
+    session_id TEXT,
+    created REAL NOT NULL,
+    item_count INTEGER NOT NULL,
+    total REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS order_lines (
+    order_id INTEGER NOT NULL REFERENCES orders (order_id),
+    line INTEGER NOT NULL,
+    product_type TEXT NOT NULL,
+    product_brand TEXT NOT NULL,
+    price REAL NOT NULL,
+    quantity INTEGER NOT NULL,
+    PRIMARY KEY (order_id, line)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS stock (
+    product_type TEXT NOT NULL,  -- lowercase (sku_key)
+    product_brand TEXT NOT NULL,
+    quantity INTEGER NOT NULL,
+    version INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (product_type, product_brand)
+) WITHOUT ROWID;
+CREATE TRIGGER IF NOT EXISTS stock_not_negative
+BEFORE UPDATE OF quantity ON stock WHEN NEW.quantity < 0
+BEGIN
+    SELECT RAISE(ABORT, 'out of stock');
+END;
+CREATE TABLE IF NOT EXISTS reservations (
+    session_id TEXT NOT NULL,
+    product_type TEXT NOT NULL,  -- lowercase (sku_key)
+    product_brand TEXT NOT NULL,
+    quantity INTEGER NOT NULL,  -- units taken off the stock row
+    expires REAL NOT NULL,
+    PRIMARY KEY (session_id, product_type, product_brand)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS reservations_expires ON reservations (expires);
+-- The stock follows the reservations in the same statement
+CREATE TRIGGER IF NOT EXISTS reservation_taken AFTER INSERT ON reservations
+BEGIN
+    UPDATE stock SET quantity = quantity - NEW.quantity, version = version + 1
+    WHERE product_type = NEW.product_type AND product_brand = NEW.product_brand;
+END;
+CREATE TRIGGER IF NOT EXISTS reservation_changed
+AFTER UPDATE OF quantity ON reservations WHEN NEW.quantity != OLD.quantity
+BEGIN
+    UPDATE stock SET quantity = quantity - (NEW.quantity - OLD.quantity),
+        version = version + 1
+    WHERE product_type = NEW.product_type AND product_brand = NEW.product_brand;
+END;
+CREATE TRIGGER IF NOT EXISTS reservation_released AFTER DELETE ON reservations
+BEGIN
+    UPDATE stock SET quantity = quantity + OLD.quantity, version = version + 1
+    WHERE product_type = OLD.product_type AND product_brand = OLD.product_brand;
+END;
+"""
+
+
+def order_key(*parts):
+    """Idempotency key of an order: a digest of what identifies the request"""
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def _placed_order(connection, key):
+    """Returns (order id, total, item count) of the order with a key, or None"""
+    return connection.execute(
+        "SELECT order_id, total, item_count FROM orders WHERE idempotency_key = ?",
+        (key,),
+    ).fetchone()
+
+
+def _order_result(status, order_id=None, total=0.0, item_count=0, **extra):
+    return {
+        "status": status,
+        "order_id": order_id,
+        "total": round(total, 2),
+        "item_count": item_count,
+        **extra,
+    }
+
+
+class _Order:
+    __slots__ = ("key", "session_id", "cart", "quantities", "expected", "future")
+
+    def __init__(self, key, session_id, cart, quantities, expected):
+        self.key = key
+        self.session_id = session_id
+        self.cart = cart
+        self.quantities = quantities  # SKU key -> quantity ordered
+        self.expected = expected  # SKU key -> (quantity, version) read at submit
+        self.future = Future()
+
+
+class OrderStore:
+    """
+    Orders persisted to SQLite in WAL mode (readers never wait for the writer).
+
+    - submit() checks the stock of the cart against a snapshot (no lock) and
+      queues the order; one writer thread per process takes every queued order
+      (up to batch_size, waiting up to flush_ms for more) and writes them in
+      one transaction: one commit, and one fsync, for the whole batch (group
+      commit). Futures resolve after the commit, so a placed order is durable.
+    - Every order has an idempotency key (UNIQUE): an order submitted again
+      with the same key returns the order already written ("duplicate").
+    - Stock is optimistic: the snapshot keeps the version of every stock row,
+      and the writer decrements a row only if its version is unchanged. When
+      another order changed it meanwhile, the row is read again and the order
+      still succeeds if enough stock is left ("conflicts" counts the retries);
+      otherwise the order is rolled back alone ("out_of_stock"), without
+      failing the rest of its batch. SKUs without a stock row are not limited.
+    - Units a session reserved (chatbot/inventory.py) are already off the
+      stock: its order ends the reservations of the session (their units go
+      back, in the same transaction) before taking its quantities.
+
+    Worker processes of a PreforkServer can share one database: their writers
+    take the write lock in turn (busy timeout). The database is opened on first
+    use, in the process that uses it.
+    """
+
+    def __init__(
+        self,
+        path=ORDERS_DB_PATH,
+        batch_size=ORDER_BATCH_SIZE,
+        flush_ms=ORDER_FLUSH_MS,
+        synchronous=ORDER_SYNCHRONOUS,
+    ):
+        self.path = path
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_ms / 1000
+        self.synchronous = synchronous
+        self._lock = threading.Lock()
+        self._local = threading.local()  # Read connection of every thread
+        self._queue = None
+        self._writer = None
+        self._pid = None
+        self.stats = Counter()
+
+    # --- Orders ---
+    def submit(self, cart, idempotency_key, session_id=None):
+        """
+        Queues an order for a cart. Returns a Future of {"status" ("placed",
+        "duplicate", "out_of_stock" or "empty"), "order_id", "total",
+        "item_count"}; out-of-stock results list the "shortages".
+        """
+        cart = Cart(cart)
+        if not cart:
+            future = Future()
+            future.set_result(_order_result("empty"))
+            return future
+        self._start()
+        row = _placed_order(self._reader(), idempotency_key)
+        if row is not None:  # e.g. retried after a timed-out wait for its commit
+            with self._lock:
+                self.stats["duplicate"] += 1
+            future = Future()
+            future.set_result(_order_result("duplicate", *row))
+            return future
+        quantities = self._quantities(cart)
+        expected = self.stock_levels(quantities)
+        held = self.reservations(session_id) if session_id is not None else {}
+        shortages = _shortages(quantities, expected, held)
+        if shortages:
+            with self._lock:
+                self.stats["out_of_stock"] += 1
+            future = Future()
+            future.set_result(_order_result("out_of_stock", shortages=shortages))
+            return future
+        order = _Order(idempotency_key, session_id, cart, quantities, expected)
+        self._queue.put(order)
+        return order.future
+
+    def place(self, cart, idempotency_key, session_id=None, timeout=None):
+        """Places an order and waits for its commit (see submit())"""
+        return self.submit(cart, idempotency_key, session_id).result(timeout)
+
+    def order(self, order_id):
+        """Returns an order with its lines (None when unknown)"""
+        connection = self._reader()
+        row = connection.execute(
+            "SELECT order_id, idempotency_key, session_id, created, item_count, "
+            "total FROM orders WHERE order_id = ?",
+            (order_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        lines = connection.execute(
+            "SELECT product_type, product_brand, price, quantity FROM order_lines "
+            "WHERE order_id = ? ORDER BY line",
+            (order_id,),
+        ).fetchall()
+        keys = ("order_id", "idempotency_key", "session_id", "created")
+        return {
+            **dict(zip(keys + ("item_count", "total"), row)),
+            "items": [
+                dict(zip(("product_type", "product_brand", "price", "quantity"), line))
+                for line in lines
+            ],
+        }
+
+    # --- Stock ---
+    def stock_levels(self, skus):
+        """Returns {SKU key: (quantity, version)} of the SKUs that have stock"""
+        skus = list(skus)
+        if not skus:
+            return {}
+        return _stock_levels(self._reader(), skus)
+
+    def reservations(self, session_id):
+        """Returns {SKU key: units held} of the reservations of a session"""
+        return {
+            (product_type, brand): quantity
+            for product_type, brand, quantity in self._reader().execute(
+                "SELECT product_type, product_brand, quantity FROM reservations "
+                "WHERE session_id = ?",
+                (session_id,),
+            )
+        }
+
+    def set_stock(self, levels):
+        """Sets the stock of SKUs ({(product type, brand): quantity})"""
+        connection = self.connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.executemany(
+                "INSERT INTO stock (product_type, product_brand, quantity) "
+                "VALUES (?, ?, ?) ON CONFLICT (product_type, product_brand) "
+                "DO UPDATE SET quantity = excluded.quantity, version = version + 1",
+                [(*sku_key(*sku), int(quantity)) for sku, quantity in levels.items()],
+            )
+            connection.execute("COMMIT")
+        finally:
+            connection.close()
+
+    def usage(self):
+        """Counters, and the mean orders per commit"""
+        with self._lock:
+            stats = dict(self.stats)
+        stats["orders_per_commit"] = round(
+            stats.get("batched_orders", 0) / max(stats.get("commits", 0), 1), 2
+        )
+        return stats
+
+    def close(self):
+        """Writes the queued orders and stops the writer"""
+        with self._lock:
+            writer, self._writer = self._writer, None
+            if writer is not None and self._pid == os.getpid():
+                self._queue.put(None)
+        if writer is not None and self._pid == os.getpid():
+            writer.join()
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    # --- Internals ---
+    def _start(self):
+        if self._writer is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._writer is not None and self._pid == os.getpid():
+                return
+            # First use in this process (a forked worker starts its own writer)
+            self._pid = os.getpid()
+            self._local = threading.local()
+            self.connect().close()  # Creates the tables before any reader
+            self._queue = queue.SimpleQueue()
+            self._writer = threading.Thread(
+                target=self._run, name="order-writer", daemon=True
+            )
+            self._writer.start()
+
+    def connect(self, synchronous=None):
+        """
+        Opens a connection to the database (tables created), in autocommit
+        mode, with the synchronous pragma of the store unless given
+        """
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(
+            self.path, timeout=ORDER_BUSY_TIMEOUT_MS / 1000, isolation_level=None
+        )
+        connection.execute("PRAGMA journal_mode = WAL")
+        connection.execute(f"PRAGMA synchronous = {synchronous or self.synchronous}")
+        connection.executescript(SCHEMA)
+        return connection
+
+    def _reader(self):
+        self._start()
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = self.connect()
+        return connection
+
+    @staticmethod
+    def _quantities(cart):
+        quantities = Counter()
+        for item in cart:
+            quantities[sku_key(item.product_type, item.product_brand)] += item.quantity
+        return quantities
+
+    def _run(self):
+        connection = self.connect()
+        stopping = False
+        while not stopping:
+            order = self._queue.get()
+            if order is None:
+                break
+            batch = [order]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    order = self._queue.get(
+                        timeout=max(0.0, deadline - time.monotonic())
+                    )
+                except queue.Empty:
+                    break
+                if order is None:
+                    stopping = True
+                    break
+                batch.append(order)
+            self._commit(connection, batch)
+        connection.close()
+
+    def _commit(self, connection, batch):
+        """Writes a batch of orders in one transaction (one commit)"""
+        counts = Counter()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            results = [self._write(connection, order, counts) for order in batch]
+            connection.execute("COMMIT")
+        except Exception as e:  # The writer keeps running for the next batches
+            if connection.in_transaction:
+                connection.execute("ROLLBACK")
+            print(f"[ERROR] Order batch of {len(batch)} not written: {e}")
+            for order in batch:
+                order.future.set_exception(e)
+            with self._lock:
+                self.stats["failed"] += len(batch)
+            return
+        counts["commits"] += 1
+        counts["batched_orders"] += len(batch)
+        with self._lock:
+            self.stats.update(counts)
+        for order, result in zip(batch, results):
+            order.future.set_result(result)
+
+    def _write(self, connection, order, counts):
+        row = _placed_order(connection, order.key)
+        if row is not None:
+            counts["duplicate"] += 1
+            return _order_result("duplicate", *row)
+
+        connection.execute("SAVEPOINT order_write")
+        expected = order.expected
+        if order.session_id is not None:
+            released = connection.execute(
+                "DELETE FROM reservations WHERE session_id = ? "
+                "RETURNING product_type, product_brand",
+                (order.session_id,),
+            ).fetchall()
+            if released:  # Their stock rows changed: read them again
+                expected = {**expected, **_stock_levels(connection, released)}
+        for sku, quantity in order.quantities.items():
+            if sku not in expected:
+                continue  # Not limited
+            current = expected[sku]
+            while current[0] >= quantity and not _decrement(
+                connection, sku, quantity, current[1]
+            ):
+                counts["conflicts"] += 1  # Changed since the snapshot
+                current = connection.execute(
+                    "SELECT quantity, version FROM stock "
+                    "WHERE product_type = ? AND product_brand = ?",
+                    sku,
+                ).fetchone()
+                if current is None:
+                    break  # No longer limited
+            if current is not None and current[0] < quantity:
+                connection.execute("ROLLBACK TO order_write")
+                connection.execute("RELEASE order_write")
+                counts["out_of_stock"] += 1
+                return _order_result(
+                    "out_of_stock", shortages=[_shortage(sku, quantity, current[0])]
+                )
+
+        cursor = connection.execute(
+            "INSERT INTO orders (idempotency_key, session_id, created, item_count, "
+            "total) VALUES (?, ?, ?, ?, ?)",
+            (
+                order.key,
+                order.session_id,
+                time.time(),
+                order.cart.item_count,
+                order.cart.total_price,
+            ),
+        )
+        order_id = cursor.lastrowid
+        connection.executemany(
+            "INSERT INTO order_lines (order_id, line, product_type, product_brand, "
+            "price, quantity) VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    order_id,
+                    line,
+                    item.product_type,
+                    item.product_brand,
+                    item.price,
+                    item.quantity,
+                )
+                for line, item in enumerate(order.cart)
+            ],
+        )
+        connection.execute("RELEASE order_write")
+        counts["placed"] += 1
+        return _order_result(
+            "placed", order_id, order.cart.total_price, order.cart.item_count
+        )
+
+
+def _stock_levels(connection, skus):
+    levels = {}
+    for start in range(0, len(skus), 400):  # Bound on SQLite variables
+        chunk = skus[start : start + 400]
+        where = " OR ".join(["(product_type = ? AND product_brand = ?)"] * len(chunk))
+        for product_type, brand, quantity, version in connection.execute(
+            "SELECT product_type, product_brand, quantity, version FROM stock "
+            f"WHERE {where}",
+            [value for sku in chunk for value in sku],
+        ):
+            levels[(product_type, brand)] = (quantity, version)
+    return levels
+
+
+def _decrement(connection, sku, quantity, version):
+    """Compare-and-swap of a stock row: True when the version still matched"""
+    cursor = connection.execute(
+        "UPDATE stock SET quantity = quantity - ?, version = version + 1 "
+        "WHERE product_type = ? AND product_brand = ? AND version = ?",
+        (quantity, *sku, version),
+    )
+    return cursor.rowcount == 1
+
+
+def _shortage(sku, requested, available):
+    return {
+        "product_type": sku[0],
+        "product_brand": sku[1],
+        "requested": requested,
+        "available": max(available, 0),
+    }
+
+
+def _shortages(quantities, levels, held):
+    """Shortages of the SKUs of an order (units held by the session count)"""
+    return [
+        _shortage(sku, quantity, levels[sku][0] + held.get(sku, 0))
+        for sku, quantity in quantities.items()
+        if sku in levels and levels[sku][0] + held.get(sku, 0) < quantity
+    ]
+
+
+order_store = OrderStore()
@@ -0,0 +1,280 @@
+"""
+Pre-fork worker processes for the chatbot
+"""
+
+import gc
+import itertools
+import multiprocessing
+import os
+import queue
+import threading
+import zlib
+from concurrent.futures import Future
+
+from chatbot.cart import Cart
+from chatbot.configs import WORKER_PROCESSES
+
+
+def worker_for(session_id, workers):
+    """Returns the worker that owns a session (stable across processes and runs)"""
+    return zlib.crc32(str(session_id).encode()) % workers
+
+
+def process_memory(pid):
+    """
+    Returns the resident memory of a process in bytes (Linux only, {} elsewhere):
+    rss, pss (shared pages divided among the processes that map them) and uss
+    (pages private to the process).
+    """
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", encoding="utf-8") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == "kB":
+                    fields[parts[0].rstrip(":")] = int(parts[1]) * 1024
+    except OSError:
+        return {}
+    return {
+        "rss": fields.get("Rss", 0),
+        "pss": fields.get("Pss", 0),
+        "uss": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+    }
+
+
+def prepare_shared_catalog():
+    """
+    Loads the chatbot, moves the catalog and its index to shared read-only memory
+    and builds the catalog-derived caches, so forked workers start with them.
+    """
+    from chatbot import data_loader, graph, main, query, summaries, tools
+
+    data_loader.data = data_loader.share_catalog(data_loader.data)
+    tools.data = data_loader.data  # Imported by name: the tools use the shared frame
+    index = query.CatalogIndex(data_loader.data).share()
+    query._catalog_index = index
+    summaries.get_catalog_summary()
+    if graph.tool_selector:
+        graph.tool_selector.message_tokens("")  # Catalog words of the selector
+    return main
+
+
+def _serve(worker_id, workers, requests, responses, initializer, initargs):
+    """Worker loop: runs the turns of the sessions routed to this worker, in order"""
+    if initializer:  # Not run yet: the worker was spawned, not forked
+        initializer(*initargs)
+    from chatbot import llm, main
+    from chatbot.configs import SYSTEM_PROMPT, get_welcome_message
+    from chatbot.fuzzy import fuzzy_matcher
+    from chatbot.inventory import inventory
+    from chatbot.profiling import turn_profiler
+    from chatbot.query import get_catalog_index
+    from chatbot.repricing import cart_repricer
+    from chatbot.sessions import SessionStore
+
+    llm.llm_gateway.share_quota(1 / workers)
+    fuzzy_matcher.start(get_catalog_index())  # Still single-threaded here
+    supervisor = multiprocessing.parent_process()
+    sessions = SessionStore(
+        main.new_session, shared=(SYSTEM_PROMPT, get_welcome_message())
+    )
+    while True:
+        try:
+            item = requests.get(timeout=1.0)
+        except queue.Empty:
+            if supervisor is not None and not supervisor.is_alive():
+                break  # Orphaned: the supervisor is gone
+            sessions.sweep()  # Spills the idle sessions
+            inventory.sweep()  # Gives back the stock of expired reservations
+            continue
+        if item is None:
+            break
+        request_id, session_id, user_input = item
+        try:
+            if user_input is None:
+                sessions.drop(session_id)
+                cart_repricer.forget(session_id)
+                inventory.release(session_id)
+                result = None
+            elif isinstance(user_input, dict) and "prices" in user_input:
+                result = cart_repricer.apply(**user_input["prices"])  # update_prices()
+            elif isinstance(user_input, dict):  # Admin command (profile())
+                turn_profiler.request(user_input["profile"], session_id)
+                result = {"directory": os.path.abspath(turn_profiler.directory)}
+            else:
+                state, history = sessions.get(session_id)
+                state, message, _ = main.chat_turn(
+                    state, history, user_input, session_id=session_id
+                )
+                sessions.put(session_id, state, history)
+                result = {
+                    "reply": message.content if message else "",
+                    "cart_items": Cart(state.get("cart_items", ())).to_dicts(),
+                    "worker": worker_id,
+                }
+            responses.put((request_id, result, None))
+        except Exception as e:
+            responses.put((request_id, None, f"{type(e).__name__}: {e}"))
+    sessions.close()
+    fuzzy_matcher.close()
+
+
+class PreforkServer:
+    """
+    Supervisor of chatbot worker processes with session affinity.
+
+    - With the "fork" start method, the supervisor loads the chatbot once, moves
+      the catalog columns and index arrays to shared read-only memory, freezes
+      the loaded objects out of the garbage collector (whose bookkeeping would
+      otherwise copy their pages) and then forks the workers: every worker
+      starts with the catalog loaded and indexed, at little private memory.
+    - With "spawn", every worker loads and indexes its own catalog (the
+      behavior of independent processes, for comparison).
+    - A session always runs on the same worker (worker_for), which keeps its
+      state in a SessionStore (idle sessions are spilled to disk within the
+      CHATBOT_SESSION_MEMORY_MB budget of each worker); its turns run in order.
+      The LLM quota is split between workers.
+
+    The supervisor makes no model call before forking, so connection pools and
+    gateway threads are created by each worker.
+    """
+
+    def __init__(
+        self, workers=None, start_method="fork", initializer=None, initargs=()
+    ):
+        self.workers = workers or WORKER_PROCESSES or os.cpu_count() or 1
+        self.start_method = start_method
+        self.initializer = initializer
+        self.initargs = tuple(initargs)
+        self.processes = []
+        self._requests = []
+        self._responses = None
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        self._collector = None
+
+    def start(self):
+        context = multiprocessing.get_context(self.start_method)
+        initializer = self.initializer
+        if self.start_method == "fork":
+            if initializer:
+                initializer(*self.initargs)
+                initializer = None
+            prepare_shared_catalog()
+            gc.collect()
+            gc.freeze()
+        self._responses = context.Queue()
+        for worker_id in range(self.workers):
+            requests = context.Queue()
+            process = context.Process(
+                target=_serve,
+                args=(
+                    worker_id,
+                    self.workers,
+                    requests,
+                    self._responses,
+                    initializer,
+                    self.initargs,
+                ),
+                name=f"chatbot-worker-{worker_id}",
+            )
+            process.start()
+            self._requests.append(requests)
+            self.processes.append(process)
+        if self.start_method == "fork":
+            gc.unfreeze()
+        self._collector = threading.Thread(
+            target=self._collect, name="prefork-collector", daemon=True
+        )
+        self._collector.start()
+        print(
+            f"[INFO] Started {self.workers} chatbot workers ({self.start_method})"
+        )
+        return self
+
+    def submit(self, session_id, user_input):
+        """
+        Queues a user turn on the worker of the session. Returns a Future of
+        {"reply", "cart_items", "worker"}.
+        """
+        return self._send(worker_for(session_id, self.workers), session_id, user_input)
+
+    def chat(self, session_id, user_input, timeout=None):
+        """Runs a user turn and returns its result"""
+        return self.submit(session_id, user_input).result(timeout)
+
+    def end_session(self, session_id):
+        """Drops the state of a session on its worker"""
+        self.submit(session_id, None).result()
+
+    def profile(self, session_id, turns=1):
+        """
+        Profiles the next turns of a session on its worker (chatbot/profiling.py).
+        Returns {"directory"}: where the worker writes the profiles.
+        """
+        return self.submit(session_id, {"profile": turns}).result()
+
+    def update_prices(self, product_types, brands, prices):
+        """
+        Sets new catalog prices of SKUs (parallel sequences of product types,
+        brands and prices) on every worker; each worker reprices the carts of
+        its sessions holding them (chatbot/repricing.py). Returns the summary
+        of every worker: {"rows", "skus", "sessions"}.
+        """
+        update = {
+            "prices": {
+                "product_types": list(product_types),
+                "brands": list(brands),
+                "prices": [float(price) for price in prices],
+            }
+        }
+        futures = [
+            self._send(worker, None, update) for worker in range(self.workers)
+        ]
+        return [future.result() for future in futures]
+
+    def memory(self):
+        """Returns {worker pid: process_memory(pid)}"""
+        return {p.pid: process_memory(p.pid) for p in self.processes if p.is_alive()}
+
+    def close(self, timeout=10):
+        for requests in self._requests:
+            requests.put(None)
+        for process in self.processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        if self._responses is not None:
+            self._responses.put(None)  # Stops the collector
+            self._collector.join(timeout)
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            future.set_exception(RuntimeError("The chatbot workers were stopped."))
+        self.processes, self._requests = [], []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _send(self, worker, session_id, user_input):
+        future = Future()
+        request_id = next(self._ids)
+        with self._lock:
+            self._pending[request_id] = future
+        self._requests[worker].put((request_id, session_id, user_input))
+        return future
+
+    def _collect(self):
+        for request_id, result, error in iter(self._responses.get, None):
+            with self._lock:
+                future = self._pending.pop(request_id, None)
+            if future is None:
+                continue
+            if error:
+                future.set_exception(RuntimeError(error))
+            else:
+                future.set_result(result)
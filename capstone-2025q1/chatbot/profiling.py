@@ -0,0 +1,389 @@
+"""
+On-demand profiling for the chatbot
+"""
+
+import cProfile
+import itertools
+import os
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from chatbot.configs import (
+    PROFILE_DIR,
+    PROFILE_INTERVAL_MS,
+    PROFILE_MEMORY,
+    PROFILE_MEMORY_TOP,
+    PROFILE_MODE,
+    PROFILE_TOOLS,
+    PROFILE_TURNS,
+)
+
+_ANY_SESSION = None
+
+
+def _frame_name(code):
+    location = f"{os.path.basename(code.co_filename)}:{code.co_firstlineno}"
+    return f"{code.co_name} ({location})".replace(";", ":")
+
+
+def _file_name(value):
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", str(value))[:64]
+
+
+class StackSampler:
+    """
+    Sampling profiler: every interval seconds, the Python stacks of the watched
+    threads are counted as folded stacks ("thread;outer;...;inner count" lines,
+    the input of flamegraph.pl, speedscope or inferno).
+    """
+
+    extension = ".folded"
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.counts = Counter()
+        self._threads = {}  # thread id -> [thread name, watch count]
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler = None
+
+    def start(self):
+        self._sampler = threading.Thread(
+            target=self._run, name="chatbot-profiler", daemon=True
+        )
+        self._sampler.start()
+        return self
+
+    def watch(self):
+        """Samples the calling thread (until the matching unwatch())"""
+        thread = threading.current_thread()
+        with self._lock:
+            self._threads.setdefault(thread.ident, [thread.name, 0])[1] += 1
+
+    def unwatch(self):
+        with self._lock:
+            entry = self._threads.get(threading.get_ident())
+            if entry is not None:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._threads[threading.get_ident()]
+
+    def stop(self):
+        self._stop.set()
+        self._sampler.join()
+
+    def write(self, path):
+        if not self.counts:
+            return None  # Shorter than the sampling interval
+        path += self.extension
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in sorted(self.counts.items()):
+                f.write(f"{stack} {count}\n")
+        return path
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            with self._lock:
+                threads = [(ident, entry[0]) for ident, entry in self._threads.items()]
+            frames = sys._current_frames()
+            for ident, name in threads:
+                frame = frames.get(ident)
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame.f_code))
+                    frame = frame.f_back
+                if stack:
+                    stack.append(name.replace(";", ":"))
+                    self.counts[";".join(reversed(stack))] += 1
+            del frames  # No frame is kept alive between samples
+
+
+class CallProfiler:
+    """
+    Deterministic profiler: one cProfile profile from start() to stop(), written
+    as pstats (snakeviz, gprof2dot, or flameprof for a flame graph). From
+    Python 3.12, cProfile records every thread of the process (sys.monitoring),
+    so the tool threads are included; only one such profile can run at a time.
+    """
+
+    extension = ".pstats"
+
+    def __init__(self):
+        self._profile = cProfile.Profile()
+        self._enabled = False
+
+    def start(self):
+        try:
+            self._profile.enable()
+            self._enabled = True
+        except ValueError as e:  # Another profile is running
+            print(f"[WARNING] cProfile profile not started: {e}")
+        return self
+
+    def watch(self):
+        pass  # The profile covers the threads cProfile sees
+
+    def unwatch(self):
+        pass
+
+    def stop(self):
+        if self._enabled:
+            self._profile.disable()
+
+    def write(self, path):
+        if not self._enabled:
+            return None
+        path += self.extension
+        self._profile.dump_stats(path)
+        return path
+
+
+class MemoryTracker:
+    """
+    tracemalloc snapshot after every profiled turn, diffed with the snapshot of
+    the previous one (or with the start of the first turn): the lines whose
+    allocations grew across turns, e.g. state kept by update_cart_node or the
+    message list.
+    """
+
+    def __init__(self, top=PROFILE_MEMORY_TOP):
+        self.top = top
+        self._previous = None
+        self._started = False  # tracemalloc started here (and stopped here)
+        self._filters = (
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        )
+
+    def begin(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started = True
+            self._previous = None
+        if self._previous is None:
+            self._previous = self._snapshot()
+
+    def end(self, path, keep_tracing):
+        snapshot = self._snapshot()
+        stats = snapshot.compare_to(self._previous, "lineno")
+        self._previous = snapshot
+        path += ".memory.txt"
+        growth = sum(stat.size_diff for stat in stats)
+        current, peak = tracemalloc.get_traced_memory()
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(
+                f"Allocated since the previous snapshot: {growth / 1024:+.1f} KiB "
+                f"(traced {current / 2**20:.1f} MiB, peak {peak / 2**20:.1f} MiB)\n"
+            )
+            for stat in stats[: self.top]:
+                f.write(f"{stat}\n")
+        if not keep_tracing and self._started:
+            tracemalloc.stop()
+            self._started = False
+            self._previous = None
+        return path
+
+    def _snapshot(self):
+        return tracemalloc.take_snapshot().filter_traces(self._filters)
+
+
+class _ToolHook(BaseCallbackHandler):
+    """
+    Tool callbacks of a turn: tool threads join the profile of a profiled turn;
+    outside of one, the profiled tools get a profile of their own per call.
+    """
+
+    def __init__(self, profiler, recorder=None):
+        self.profiler = profiler
+        self.recorder = recorder
+        self._calls = {}  # run id -> (tool name, recorder, start)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        if self.recorder is not None:
+            self.recorder.watch()
+            return
+        name = (serialized or {}).get("name") or kwargs.get("name")
+        if not self.profiler._take_tool(name):
+            return
+        recorder = self.profiler._recorder().start()
+        recorder.watch()
+        self._calls[run_id] = (name, recorder, time.perf_counter())
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        if self.recorder is not None:
+            self.recorder.unwatch()
+            return
+        call = self._calls.pop(run_id, None)
+        if call is None:
+            return
+        name, recorder, start = call
+        recorder.unwatch()
+        recorder.stop()
+        sequence = next(self.profiler._sequence)
+        path = recorder.write(
+            os.path.join(self.profiler._directory(), f"tool-{sequence:04d}-{name}")
+        )
+        self.profiler._written(
+            f"tool {name}", (time.perf_counter() - start) * 1000, [path]
+        )
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self.on_tool_end(None, run_id=run_id)
+
+
+class TurnProfiler:
+    """
+    Profiles the next turns of a session (or of any session) and the next calls
+    of tools, on request, writing one profile per turn or tool call to
+    directory:
+
+    - mode "sample": folded stacks sampled every interval_ms from the thread
+      running the turn and the tool threads working for it (flame graphs).
+    - mode "cprofile": deterministic cProfile profile of the turn or tool call
+      (of every thread of the process from Python 3.12), written as pstats;
+      better suited to tools that take a few milliseconds.
+    - memory: a tracemalloc snapshot after every profiled turn, diffed with the
+      previous one (tracemalloc traces every thread of the process while on).
+
+    Requests come from the CHATBOT_PROFILE_* settings, request() and
+    request_tool() (e.g. the /profile command of the chat loop or
+    PreforkServer.profile()). When nothing is requested, active is False and
+    chat_turn() does not call the profiler at all.
+    """
+
+    def __init__(
+        self,
+        turns=PROFILE_TURNS,
+        tools=PROFILE_TOOLS,
+        mode=PROFILE_MODE,
+        memory=PROFILE_MEMORY,
+        directory=PROFILE_DIR,
+        interval_ms=PROFILE_INTERVAL_MS,
+    ):
+        if mode not in ("sample", "cprofile"):
+            raise ValueError(f"Unknown profiling mode: {mode!r}")
+        self.mode = mode
+        self.memory = memory
+        self.directory = directory
+        self.interval = interval_ms / 1000
+        self.active = False
+        self.paths = []  # Files written, oldest first
+        self._lock = threading.Lock()
+        self._turns = {}  # session id (None = any session) -> turns left
+        self._tools = {}  # tool name -> calls left (None = every call)
+        self._sequence = itertools.count(1)
+        self._memory = MemoryTracker()
+        if turns:
+            self.request(turns)
+        for spec in tools:
+            name, _, calls = spec.partition(":")
+            self.request_tool(name.strip(), int(calls) if calls else None)
+
+    def request(self, turns=1, session_id=_ANY_SESSION):
+        """Profiles the next turns of a session (of any session when None)"""
+        with self._lock:
+            self._turns[session_id] = self._turns.get(session_id, 0) + turns
+            self._update()
+
+    def request_tool(self, name, calls=None):
+        """Profiles the next calls of a tool (every call when calls is None)"""
+        with self._lock:
+            if calls is None or self._tools.get(name, 0) is None:
+                self._tools[name] = None
+            else:
+                self._tools[name] = self._tools.get(name, 0) + calls
+            self._update()
+
+    def cancel(self):
+        """Forgets the pending requests"""
+        with self._lock:
+            self._turns.clear()
+            self._tools.clear()
+            self._update()
+
+    def run_turn(self, session_id, turn, *args, config=None):
+        """Runs turn(*args, config=config), profiled when a request matches"""
+        with self._lock:
+            key = session_id if session_id in self._turns else _ANY_SESSION
+            profiled = key in self._turns
+            if profiled:
+                self._turns[key] -= 1
+                if not self._turns[key]:
+                    del self._turns[key]
+                self._update()
+            tools = bool(self._tools)
+        config = dict(config or {})
+        if not profiled:
+            if tools:
+                config["callbacks"] = list(config.get("callbacks") or [])
+                config["callbacks"].append(_ToolHook(self))
+            return turn(*args, config=config)
+
+        sequence = next(self._sequence)
+        recorder = self._recorder().start()
+        config["callbacks"] = list(config.get("callbacks") or [])
+        config["callbacks"].append(_ToolHook(self, recorder))
+        if self.memory:
+            self._memory.begin()
+        start = time.perf_counter()
+        recorder.watch()
+        try:
+            return turn(*args, config=config)
+        finally:
+            recorder.unwatch()
+            elapsed = (time.perf_counter() - start) * 1000
+            recorder.stop()
+            name = f"turn-{sequence:04d}-{_file_name(session_id or 'session')}"
+            path = os.path.join(self._directory(), name)
+            paths = [recorder.write(path)]
+            if self.memory:
+                with self._lock:
+                    keep_tracing = bool(self._turns)
+                paths.append(self._memory.end(path, keep_tracing))
+            self._written(f"turn {sequence}", elapsed, paths)
+
+    def _update(self):
+        self.active = bool(self._turns or self._tools)
+
+    def _take_tool(self, name):
+        with self._lock:
+            if name not in self._tools:
+                return False
+            if self._tools[name] is not None:
+                self._tools[name] -= 1
+                if not self._tools[name]:
+                    del self._tools[name]
+                self._update()
+            return True
+
+    def _recorder(self):
+        if self.mode == "cprofile":
+            return CallProfiler()
+        return StackSampler(self.interval)
+
+    def _directory(self):
+        os.makedirs(self.directory, exist_ok=True)
+        return self.directory
+
+    def _written(self, what, elapsed_ms, paths):
+        paths = [path for path in paths if path]
+        with self._lock:
+            self.paths.extend(paths)
+        if not paths:
+            print(
+                f"[INFO] Profiled {what} ({elapsed_ms:.0f} ms): no samples "
+                "(use CHATBOT_PROFILE_MODE=cprofile for short calls)"
+            )
+            return
+        print(f"[INFO] Profiled {what} ({elapsed_ms:.0f} ms): {', '.join(paths)}")
+
+
+turn_profiler = TurnProfiler()
@@ -0,0 +1,238 @@
+"""
+Prompt token accounting for the chatbot
+"""
+
+import json
+import re
+import threading
+from collections import Counter
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+
+from chatbot.configs import (
+    PROMPT_CALIBRATION_RATE,
+    PROMPT_TOKEN_BUDGET,
+    PROMPT_TOOL_RESULT_MIN_TOKENS,
+)
+
+# Letter runs (one piece per 8 letters), single digits and punctuation
+_PIECES = re.compile(r"[^\W\d_]{1,8}|\d|[^\w\s]|_")
+
+COMPONENTS = ("system", "tools", "history", "user", "tool_calls", "tool_results")
+SUMMARY_USER_MESSAGES = 8  # earlier user messages quoted in a history summary
+COUNT_CACHE_SIZE = 4096  # counted contents kept (the history repeats every call)
+
+_counts = {}
+
+
+def count_pieces(text):
+    """Uncalibrated token count of a text (pieces a subword tokenizer would emit)"""
+    text = str(text)
+    pieces = _counts.get(text)
+    if pieces is None:
+        pieces = len(_PIECES.findall(text))
+        if len(_counts) >= COUNT_CACHE_SIZE:
+            _counts.clear()
+        _counts[text] = pieces
+    return pieces
+
+
+def _message_pieces(message):
+    pieces = count_pieces(message.content) + 4  # role and separators
+    if isinstance(message, AIMessage):
+        for call in message.tool_calls:
+            pieces += count_pieces(call["name"])
+            pieces += count_pieces(json.dumps(call["args"]))
+    return pieces
+
+
+def add_usage(total, usage):
+    """Sums the token usage of the model requests of a turn"""
+    total = dict(total or {})
+    for name, value in usage.items():
+        total[name] = total.get(name, 0) + value
+    total["requests"] = total.get("requests", 0) + 1
+    return total
+
+
+def _turn_start(messages):
+    for i in range(len(messages) - 1, -1, -1):
+        if isinstance(messages[i], HumanMessage):
+            return i
+    return len(messages)
+
+
+class PromptBudget:
+    """
+    Estimates the tokens of every model request before it is sent, keeps it
+    within budget tokens, and accounts where the tokens go.
+
+    - The estimate counts letter runs, digits and punctuation (no tokenizer
+      download, a few microseconds per message) and is scaled by a factor
+      calibrated against the input tokens the model bills (observe()). The
+      tool declarations are counted once, and the counts of recent contents
+      are cached (the history is sent again with every call).
+    - Components: system prompt, tool declarations (of the bound tools),
+      history, the user message, and the tool calls and tool results of the
+      current turn.
+    - Over budget, the oldest history is replaced by a short summary (the
+      earlier user requests), then the largest tool results of the turn are
+      truncated. Only the request is trimmed: the state and the conversation
+      history keep every message.
+
+    stats sums the components of all requests, the trimmed tokens and the
+    estimated and billed input tokens.
+    """
+
+    def __init__(
+        self,
+        schemas,
+        budget=PROMPT_TOKEN_BUDGET,
+        calibration_rate=PROMPT_CALIBRATION_RATE,
+        tool_result_min=PROMPT_TOOL_RESULT_MIN_TOKENS,
+    ):
+        self.budget = budget  # 0 = no budget
+        self.calibration_rate = calibration_rate
+        self.tool_result_min = tool_result_min
+        self.scale = 1.0  # billed tokens per counted piece
+        self._schema_pieces = {
+            name: count_pieces(json.dumps(schema)) for name, schema in schemas.items()
+        }
+        self._lock = threading.Lock()
+        self.stats = Counter()
+
+    def fit(self, messages, tool_names=None):
+        """
+        Returns (messages within the budget, usage): usage has the estimated
+        tokens per component of the request sent, its total, and the trimmed
+        tokens.
+        """
+        pieces = self._pieces(messages, tool_names)
+        total = sum(pieces.values())
+        trimmed = 0
+        if self.budget and total * self.scale > self.budget:
+            limit = self.budget / self.scale
+            messages, removed = self._summarize_history(messages, total - limit)
+            trimmed += removed
+            if total - trimmed > limit:
+                messages, removed = self._truncate_tool_results(
+                    messages, total - trimmed - limit
+                )
+                trimmed += removed
+            pieces = self._pieces(messages, tool_names)
+            print(
+                f"[WARNING] Prompt over budget ({total * self.scale:.0f} > "
+                f"{self.budget} tokens); trimmed {trimmed * self.scale:.0f} tokens"
+            )
+        usage = {name: round(count * self.scale) for name, count in pieces.items()}
+        usage["estimated_input"] = sum(usage.values())
+        usage["trimmed"] = round(trimmed * self.scale)
+        usage["pieces"] = sum(pieces.values())
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["over_budget"] += bool(trimmed)
+            for name in COMPONENTS + ("estimated_input", "trimmed"):
+                self.stats[name] += usage[name]
+        return messages, usage
+
+    def observe(self, usage, response):
+        """
+        Adds the billed tokens of a response to usage and calibrates the scale
+        with them.
+        """
+        billed = getattr(response, "usage_metadata", None) or {}
+        input_tokens = billed.get("input_tokens")
+        if not input_tokens:
+            return usage
+        usage["billed_input"] = input_tokens
+        usage["billed_output"] = billed.get("output_tokens", 0)
+        with self._lock:
+            observed = input_tokens / max(usage["pieces"], 1)
+            self.scale += self.calibration_rate * (observed - self.scale)
+            self.scale = min(max(self.scale, 0.25), 4.0)
+            self.stats["billed_input"] += input_tokens
+            self.stats["billed_output"] += usage["billed_output"]
+        return usage
+
+    def summary(self):
+        """Token totals per component, trimming counters and the current scale"""
+        with self._lock:
+            return {**self.stats, "scale": round(self.scale, 3)}
+
+    def _pieces(self, messages, tool_names):
+        pieces = dict.fromkeys(COMPONENTS, 0)
+        names = self._schema_pieces if tool_names is None else tool_names
+        pieces["tools"] = sum(self._schema_pieces.get(name, 0) for name in names)
+        start = _turn_start(messages)
+        for i, message in enumerate(messages):
+            if isinstance(message, SystemMessage):
+                pieces["system"] += count_pieces(message.content)
+            elif i < start:
+                pieces["history"] += _message_pieces(message)
+            elif i == start:
+                pieces["user"] += _message_pieces(message)
+            elif isinstance(message, ToolMessage):
+                pieces["tool_results"] += _message_pieces(message)
+            else:
+                pieces["tool_calls"] += _message_pieces(message)
+        return pieces
+
+    def _summarize_history(self, messages, excess):
+        """
+        Replaces the oldest history (at user message boundaries) by a summary.
+        Returns (messages, pieces removed).
+        """
+        system = [m for m in messages if isinstance(m, SystemMessage)]
+        rest = [m for m in messages if not isinstance(m, SystemMessage)]
+        start = _turn_start(rest)
+        removed, cut = 0, 0
+        for i in range(start):
+            removed += _message_pieces(rest[i])
+            if isinstance(rest[i + 1], HumanMessage):
+                cut = i + 1
+                if removed >= excess:
+                    break
+        if not cut:
+            return messages, 0
+        dropped = rest[:cut]
+        requests = [
+            str(m.content)[:80] for m in dropped if isinstance(m, HumanMessage)
+        ][-SUMMARY_USER_MESSAGES:]
+        text = "(Earlier conversation shortened."
+        if requests:
+            text += " The user asked: " + "; ".join(f'"{r}"' for r in requests)
+        summary = AIMessage(content=text + ")")
+        removed = sum(_message_pieces(m) for m in dropped) - _message_pieces(summary)
+        return system + [summary] + rest[cut:], removed
+
+    def _truncate_tool_results(self, messages, excess):
+        """
+        Truncates the largest tool results of the current turn (down to
+        tool_result_min tokens each). Returns (messages, pieces removed).
+        """
+        start = _turn_start(messages)
+        results = sorted(
+            (
+                (count_pieces(m.content), i)
+                for i, m in enumerate(messages)
+                if i > start and isinstance(m, ToolMessage)
+            ),
+            reverse=True,
+        )
+        messages = list(messages)
+        minimum = self.tool_result_min / self.scale
+        removed = 0
+        for pieces, i in results:
+            if removed >= excess or pieces <= minimum:
+                break
+            keep = max(minimum, pieces - (excess - removed))
+            content = str(messages[i].content)
+            end = int(len(content) * keep / pieces)
+            messages[i] = messages[i].model_copy(
+                update={
+                    "content": content[:end]
+                    + f"\n[... {len(content) - end} characters truncated]"
+                }
+            )
+            removed += pieces - count_pieces(messages[i].content)
+        return messages, removed
@@ -0,0 +1,360 @@
+"""
+Catalog query pipeline for the chatbot
+"""
+
+import base64
+import hashlib
+import json
+
+import numpy as np
+import pandas as pd
+
+from chatbot import data_loader
+
+EMPTY_POSITIONS = np.empty(0, dtype=np.int64)
+
+
+def query_fingerprint(*parts):
+    """Short digest of the arguments of a query (ties a cursor to its query)"""
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()[:12]
+
+
+def encode_cursor(fingerprint, *position):
+    """Opaque pagination cursor: the query fingerprint and where the page ended"""
+    payload = json.dumps([fingerprint, *position]).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(cursor, fingerprint):
+    """
+    Returns the position stored in a cursor. Raises ValueError when the cursor is
+    malformed or was issued for another query (or an earlier catalog version).
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        stored, *position = json.loads(base64.urlsafe_b64decode(padded))
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+    if stored != fingerprint:
+        raise ValueError(
+            "The cursor is no longer valid (a different search, or the catalog "
+            "changed); search again without a cursor."
+        )
+    return position
+
+
+class CatalogIndex:
+    """
+    Read-only lookup structures over one catalog DataFrame, built lazily per column.
+
+    - keys: lowercase value -> row positions (case-insensitive equality);
+      categorical columns are grouped by their integer codes
+    - values: numeric column as an array of its own type (no float64 copy of
+      the 32-bit catalog columns)
+    - sorted: row positions ordered by a numeric column (range scans)
+
+    version counts the in-place updates of the frame (see invalidate()).
+    """
+
+    def __init__(self, frame):
+        self.frame = frame
+        self.version = 0
+        self._keys = {}
+        self._values = {}
+        self._sorted = {}
+
+    def __len__(self):
+        return len(self.frame)
+
+    def key_positions(self, column):
+        """Returns {lowercase value: row positions} for a column"""
+        if column not in self._keys:
+            series = self.frame[column]
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                self._keys[column] = self._code_positions(series)
+            else:
+                lowered = series.astype(str).str.lower()
+                self._keys[column] = lowered.groupby(lowered, sort=False).indices
+        return self._keys[column]
+
+    @staticmethod
+    def _code_positions(series):
+        """Groups the rows of a categorical column by lowercase label via its codes"""
+        codes = series.cat.codes.to_numpy()
+        labels = series.cat.categories.astype(str).str.lower()
+        order = np.argsort(codes, kind="stable")
+        bounds = np.searchsorted(codes[order], np.arange(len(labels) + 1))
+        groups = {}
+        for code, label in enumerate(labels):
+            positions = order[bounds[code] : bounds[code + 1]]
+            if not len(positions):
+                continue
+            if label in groups:  # Labels differing only in case
+                positions = np.sort(np.concatenate([groups[label], positions]))
+            groups[label] = positions
+        return groups
+
+    def positions(self, column, value):
+        """Returns the row positions whose column equals value (case-insensitive)"""
+        return self.key_positions(column).get(str(value).lower(), EMPTY_POSITIONS)
+
+    def keys(self, column):
+        """Returns the distinct lowercase values of a column (for fuzzy matching)"""
+        return list(self.key_positions(column))
+
+    def label(self, column, value):
+        """Returns the original spelling of a lowercase value (or None)"""
+        positions = self.positions(column, value)
+        return self.frame[column].iat[positions[0]] if len(positions) else None
+
+    def values(self, column):
+        """Returns a numeric column as an array (no copy per call)"""
+        if column not in self._values:
+            series = self.frame[column]
+            if pd.api.types.is_numeric_dtype(series.dtype):
+                self._values[column] = series.to_numpy()
+            else:
+                self._values[column] = series.astype(float).to_numpy(np.float64)
+        return self._values[column]
+
+    def invalidate(self, column):
+        """Forgets the structures of a column whose values were updated in place"""
+        self._keys.pop(column, None)
+        self._values.pop(column, None)
+        self._sorted.pop(column, None)
+        self.version += 1
+
+    def share(self):
+        """
+        Builds the lookup structures of every column and moves their arrays to
+        shared, read-only memory, so processes forked afterwards use them
+        without building or copying them.
+        """
+        for column in self.frame.columns:
+            if pd.api.types.is_numeric_dtype(self.frame[column].dtype):
+                self.range_scan(column, ">=", 0)
+            else:
+                self.key_positions(column)
+        for column, groups in self._keys.items():
+            labels = list(groups)
+            bounds = np.cumsum([0] + [len(groups[label]) for label in labels])
+            flat = data_loader.shared_array(
+                np.concatenate([groups[label] for label in labels])
+                if labels
+                else EMPTY_POSITIONS
+            )
+            self._keys[column] = {
+                label: flat[bounds[i] : bounds[i + 1]] for i, label in enumerate(labels)
+            }
+        for column, values in self._values.items():
+            if values.flags.writeable:  # Columns of a shared frame already are
+                self._values[column] = data_loader.shared_array(values)
+        for column, (order, sorted_values) in self._sorted.items():
+            self._sorted[column] = (
+                data_loader.shared_array(order),
+                data_loader.shared_array(sorted_values),
+            )
+        return self
+
+    def range_scan(self, column, op, bound):
+        """Returns the row positions with column >= bound / <= bound, in value order"""
+        if column not in self._sorted:
+            values = self.values(column)
+            order = np.argsort(values, kind="stable")
+            valid = int(np.count_nonzero(~np.isnan(values)))  # NaN sorts last
+            self._sorted[column] = (order[:valid], values[order[:valid]])
+        order, sorted_values = self._sorted[column]
+        if op == ">=":
+            return order[np.searchsorted(sorted_values, bound, side="left") :]
+        return order[: np.searchsorted(sorted_values, bound, side="right")]
+
+
+class CatalogQuery:
+    """
+    Lazily evaluated, composable filter pipeline over a CatalogIndex.
+
+    Builder methods return a new query and evaluate nothing. On evaluation the
+    equality predicates are answered from the key index, range predicates are
+    applied only to the surviving positions (or answered by a range scan when
+    there is no equality predicate), and only the final rows are materialized.
+    The catalog itself is never copied.
+
+    Ordered results with a limit are selected with a partial top-k, never a
+    full sort. Pages resume after the last (sort key, position) of the previous
+    page (keyset pagination, see cursor / after), so page n costs the same as
+    page 1.
+    """
+
+    def __init__(
+        self,
+        index,
+        equals=(),
+        ranges=(),
+        order=None,
+        limit=None,
+        offset=0,
+        after=None,
+    ):
+        self.index = index
+        self._equals = tuple(equals)  # (column, values): matches any of the values
+        self._ranges = tuple(ranges)
+        self._order = order
+        self._limit = limit
+        self._offset = offset
+        self._after = after  # (sort key, position) of the last row already returned
+        self._positions = None
+        self._total = None
+        self._remaining = None
+
+    def _with(self, **changes):
+        params = {
+            "equals": self._equals,
+            "ranges": self._ranges,
+            "order": self._order,
+            "limit": self._limit,
+            "offset": self._offset,
+            "after": self._after,
+        }
+        params.update(changes)
+        return CatalogQuery(self.index, **params)
+
+    # --- Builders ---
+    def where(self, column, value):
+        """Keeps rows whose column equals value (case-insensitive)"""
+        return self._with(equals=self._equals + ((column, (value,)),))
+
+    def where_any(self, column, values):
+        """Keeps rows whose column equals any of the values (case-insensitive)"""
+        return self._with(equals=self._equals + ((column, tuple(values)),))
+
+    def at_least(self, column, bound):
+        """Keeps rows whose numeric column is >= bound"""
+        return self._with(ranges=self._ranges + ((column, ">=", bound),))
+
+    def at_most(self, column, bound):
+        """Keeps rows whose numeric column is <= bound"""
+        return self._with(ranges=self._ranges + ((column, "<=", bound),))
+
+    def order_by(self, column, ascending=True):
+        """Orders the result by a numeric column (ties keep catalog order)"""
+        return self._with(order=(column, ascending))
+
+    def limit(self, k):
+        """Keeps only the first k rows of the (ordered) result"""
+        return self._with(limit=k)
+
+    def offset(self, n):
+        """Skips the first n rows of the (ordered) result"""
+        return self._with(offset=n)
+
+    def after(self, key, position):
+        """Resumes after the row at position with sort key (see cursor)"""
+        return self._with(after=(key, position))
+
+    # --- Evaluation ---
+    def positions(self):
+        """Evaluates the pipeline and returns the row positions of the result"""
+        if self._positions is None:
+            self._positions = self._evaluate()
+        return self._positions
+
+    def count(self):
+        return len(self.positions())
+
+    def total(self):
+        """Number of matching rows before pagination, offset and limit"""
+        self.positions()
+        return self._total
+
+    def has_more(self):
+        """True when rows remain after the evaluated page"""
+        return self._remaining > self._offset + self.count()
+
+    def cursor(self, fingerprint):
+        """Returns the cursor of the next page (None on the last page)"""
+        if not self.count() or not self.has_more():
+            return None
+        position = int(self.positions()[-1])
+        key = None
+        if self._order is not None:
+            key = self.index.values(self._order[0])[position].item()
+        return encode_cursor(fingerprint, key, position)
+
+    def records(self):
+        """Materializes the result rows as a list of dicts"""
+        return data_loader.catalog_records(self.index.frame.iloc[self.positions()])
+
+    def _evaluate(self):
+        self._total = 0
+        candidates = None
+        for column, values in self._equals:
+            matched = [self.index.positions(column, value) for value in values]
+            matched = (
+                matched[0] if len(matched) == 1 else np.unique(np.concatenate(matched))
+            )
+            candidates = (
+                matched
+                if candidates is None
+                else np.intersect1d(candidates, matched, assume_unique=True)
+            )
+            if not len(candidates):
+                return EMPTY_POSITIONS
+
+        ranges = list(self._ranges)
+        if candidates is None:
+            if ranges:
+                candidates = self.index.range_scan(*ranges.pop(0))
+            else:
+                candidates = np.arange(len(self.index), dtype=np.int64)
+        for column, op, bound in ranges:
+            values = self.index.values(column)[candidates]
+            candidates = candidates[values >= bound if op == ">=" else values <= bound]
+        self._total = len(candidates)
+        if self._after is not None:
+            candidates = self._resume(candidates)
+        self._remaining = len(candidates)
+
+        end = None if self._limit is None else self._offset + self._limit
+        if self._order is None:
+            return np.sort(candidates)[self._offset : end]
+        return self._top(candidates, end)[self._offset :]
+
+    def _sort_keys(self, candidates):
+        column, ascending = self._order
+        keys = self.index.values(column)[candidates]
+        return keys if ascending else -keys
+
+    def _top(self, candidates, k=None):
+        keys = self._sort_keys(candidates)
+        if k is not None and k < len(candidates):
+            # Partial selection of the k best (with every tie of the k-th key,
+            # so the page matches a stable sort), then sort only those
+            kth = np.partition(keys, k - 1)[k - 1]
+            if not np.isnan(kth):  # NaN sorts last: keep every row
+                selected = keys <= kth
+                candidates, keys = candidates[selected], keys[selected]
+        return candidates[np.lexsort((candidates, keys))][:k]
+
+    def _resume(self, candidates):
+        """Keeps the rows after the (sort key, position) of the previous page"""
+        key, position = self._after
+        if self._order is None:
+            return candidates[candidates > position]
+        keys = self._sort_keys(candidates)
+        if not self._order[1]:
+            key = -key
+        return candidates[
+            (keys > key) | ((keys == key) & (candidates > position))
+        ]
+
+
+_catalog_index = None
+
+
+def get_catalog_index():
+    """Returns the index of the loaded catalog (rebuilt when the catalog changes)"""
+    global _catalog_index
+    if _catalog_index is None or _catalog_index.frame is not data_loader.data:
+        _catalog_index = CatalogIndex(data_loader.data)
+    return _catalog_index
@@ -0,0 +1,129 @@
+"""
+Turn recorder for the chatbot
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from chatbot.configs import HISTORY_WINDOW_MESSAGES, RECORD_FILE
+
+
+def conversation_key(messages):
+    """
+    Key of a model request: a hash of the user messages it contains. The same
+    conversation replayed with the same history window gives the same key.
+    """
+    digest = hashlib.sha1()
+    for message in messages:
+        if isinstance(message, HumanMessage):
+            digest.update(str(message.content).encode("utf-8"))
+            digest.update(b"\x1f")
+    return digest.hexdigest()[:16]
+
+
+def _model_output(message):
+    output = {"content": message.content}
+    if message.tool_calls:
+        output["tool_calls"] = [
+            {"name": call["name"], "args": call["args"], "id": call["id"]}
+            for call in message.tool_calls
+        ]
+    best_effort = message.response_metadata.get("best_effort")
+    if best_effort:
+        output["best_effort"] = best_effort  # Built by the graph, not the model
+    return output
+
+
+class TranscriptRecorder:
+    """
+    Appends every turn to a JSONL transcript (one line per turn):
+
+    - session, time, key (conversation_key of the model requests of the turn),
+      window (CHATBOT_HISTORY_WINDOW) and the user message
+    - model: the outputs of the agent node in order (content and tool calls;
+      answers built by the graph are marked best_effort)
+    - tools: the tool results (name, tool call id, content)
+    - reply, cart, prompt tokens (token_usage) and latency_ms of the turn
+
+    Each line is written with one append, so the worker processes of a
+    PreforkServer can share one file. benchmarks/run_replay.py replays a
+    transcript without model calls.
+    """
+
+    def __init__(self, path=RECORD_FILE):
+        self.path = path
+        self.enabled = bool(path)
+        self._lock = threading.Lock()
+        self._fd = None
+
+    def begin(self, messages):
+        """Key of the turn, taken before the graph runs"""
+        return conversation_key(messages), time.perf_counter()
+
+    def record(self, session_id, user_input, begin, events, final_message, state):
+        """Appends the turn made of the graph events (app.stream updates)"""
+        key, start = begin
+        model, tools = [], []
+        for event in events:
+            for node, update in event.items():
+                if not isinstance(update, dict) or node == "update_cart":
+                    continue  # update_cart returns the whole state
+                for message in update.get("messages", ()):
+                    if node == "agent" and isinstance(message, AIMessage):
+                        model.append(_model_output(message))
+                    elif isinstance(message, ToolMessage):
+                        tools.append(
+                            {
+                                "name": message.name,
+                                "tool_call_id": message.tool_call_id,
+                                "content": message.content,
+                            }
+                        )
+        line = {
+            "session": session_id,
+            "time": round(time.time(), 3),
+            "key": key,
+            "window": HISTORY_WINDOW_MESSAGES,
+            "user": user_input,
+            "model": model,
+            "tools": tools,
+            "reply": final_message.content if final_message else "",
+            "cart": [item.to_dict() for item in state.get("cart_items") or ()],
+            "tokens": state.get("token_usage"),
+            "latency_ms": round((time.perf_counter() - start) * 1000, 3),
+        }
+        data = (json.dumps(line, ensure_ascii=False, default=str) + "\n").encode()
+        with self._lock:
+            if self._fd is None:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                self._fd = os.open(
+                    self.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644
+                )
+            os.write(self._fd, data)
+
+    def close(self):
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+
+
+def read_transcript(path):
+    """Returns {session id: [turn, ...]} of a transcript, turns in order"""
+    sessions = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                turn = json.loads(line)
+                sessions.setdefault(turn["session"], []).append(turn)
+    return sessions
+
+
+transcript_recorder = TranscriptRecorder()
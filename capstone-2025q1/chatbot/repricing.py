@@ -0,0 +1,227 @@
+"""
+Cart repricing for the chatbot
+"""
+
+import threading
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from chatbot import data_loader
+from chatbot.cart import Cart
+from chatbot.query import get_catalog_index
+
+
+def sku_key(product_type, brand):
+    """Key of a SKU: its lowercase product type and brand (what add_to_cart matches)"""
+    return (str(product_type).lower(), str(brand).lower())
+
+
+def _lower_ids(series, labels):
+    """Position in labels of the lowercase value of every row (-1 when absent)"""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        ids = labels.get_indexer(series.cat.categories.astype(str).str.lower())
+        ids = np.append(ids, -1)  # Code -1: missing value
+        return ids[series.cat.codes.to_numpy()]
+    return labels.get_indexer(series.astype(str).str.lower())
+
+
+def update_catalog_prices(frame, product_types, brands, prices):
+    """
+    Sets the price of every catalog row of the given SKUs. The rows are matched
+    in one vectorized pass over integer SKU codes (not one mask per update), and
+    the price column is replaced by an updated copy: a column in shared,
+    read-only memory (share_catalog) becomes private to the process.
+
+    Returns:
+        tuple: ({SKU key: new cart price} of the SKUs whose price in a cart
+               changed (the price of their first row, as add_to_cart takes it),
+               number of rows updated)
+    """
+    updates = pd.DataFrame(
+        {
+            "type": pd.Series(product_types, dtype=str).str.strip().str.lower(),
+            "brand": pd.Series(brands, dtype=str).str.strip().str.lower(),
+            "price": pd.to_numeric(pd.Series(prices), errors="coerce"),
+        }
+    )
+    updates = updates[updates["price"] >= 0]  # NaN and negative prices are ignored
+    updates = updates.drop_duplicates(["type", "brand"], keep="last")
+    if updates.empty or frame.empty:
+        return {}, 0
+
+    types = pd.Index(updates["type"].unique())
+    brands = pd.Index(updates["brand"].unique())
+    update_codes = (
+        types.get_indexer(updates["type"]).astype(np.int64) * len(brands)
+        + brands.get_indexer(updates["brand"])
+    )
+    row_types = _lower_ids(frame["product_type"], types)
+    row_brands = _lower_ids(frame["product_brand"], brands)
+    rows = np.flatnonzero((row_types >= 0) & (row_brands >= 0))
+    row_codes = row_types[rows].astype(np.int64) * len(brands) + row_brands[rows]
+    order = np.argsort(update_codes)
+    found = np.minimum(
+        np.searchsorted(update_codes[order], row_codes), len(order) - 1
+    )
+    which = order[found]
+    matched = update_codes[which] == row_codes  # Type and brand of one update
+    rows, which = rows[matched], which[matched]
+    if not len(rows):
+        return {}, 0
+
+    values = frame["product_price"].to_numpy()
+    new_values = updates["price"].to_numpy().astype(values.dtype)[which]
+    changed = values[rows] != new_values
+    # The first row of every SKU is the one a cart holds (rows are in order)
+    _, first = np.unique(row_codes[matched], return_index=True)
+    moved = first[changed[first]]
+    decimals = data_loader.CATALOG_SCHEMA["product_price"]["decimals"]
+    cart_prices = new_values[moved].astype(np.float64).round(decimals)
+    skus = updates.iloc[which[moved]]
+    changed_prices = {
+        (product_type, brand): price
+        for product_type, brand, price in zip(
+            skus["type"], skus["brand"], cart_prices.tolist()
+        )
+    }
+
+    rows = rows[changed]
+    if len(rows):
+        updated = values.copy()
+        updated[rows] = new_values[changed]
+        frame["product_price"] = updated
+    return changed_prices, len(rows)
+
+
+class CartRepricer:
+    """
+    Keeps the carts of live sessions at the current catalog prices.
+
+    - track() keeps a reverse index from SKU to the sessions whose cart holds
+      it, updated after every turn from the SKUs the turn added or removed.
+    - apply() updates the catalog prices and gives the changed prices only to
+      the sessions the index lists for the changed SKUs: the cost grows with
+      the changed SKUs and the carts holding them, not with the number of
+      sessions or the catalog size.
+    - refresh() applies the pending prices of a session to its cart before its
+      next turn, so a spilled session is not loaded back to be repriced and no
+      cart changes while its turn runs. A SKU added at the old price by a turn
+      that overlapped apply() is repriced on the following turn.
+
+    The cart lines store the unit price of the catalog row add_to_cart took;
+    only that price is replaced (quantities and line order are kept).
+    """
+
+    def __init__(self):
+        self.version = 0  # apply() calls that changed a price
+        self._lock = threading.Lock()
+        self._sessions = {}  # SKU key -> set of session ids
+        self._skus = {}  # session id -> frozenset of SKU keys of its cart
+        self._pending = {}  # session id -> {SKU key: price}
+        self._prices = {}  # SKU key -> (version, price) of its last change
+        self.stats = Counter()
+
+    def track(self, session_id, cart, version=None):
+        """
+        Indexes the SKUs of the cart of a session after a turn (version: the
+        one refresh() returned before the turn).
+        """
+        skus = frozenset(
+            sku_key(item.product_type, item.product_brand) for item in cart
+        )
+        with self._lock:
+            previous = self._skus.get(session_id, frozenset())
+            if skus != previous:
+                for sku in previous - skus:
+                    sessions = self._sessions[sku]
+                    sessions.discard(session_id)
+                    if not sessions:
+                        del self._sessions[sku]
+                for sku in skus - previous:
+                    self._sessions.setdefault(sku, set()).add(session_id)
+                if skus:
+                    self._skus[session_id] = skus
+                else:
+                    self._skus.pop(session_id, None)
+            if version is not None and version != self.version:
+                for sku in skus:  # Prices changed while the turn ran
+                    changed = self._prices.get(sku)
+                    if changed is not None and changed[0] > version:
+                        self._pending.setdefault(session_id, {})[sku] = changed[1]
+
+    def forget(self, session_id):
+        """Removes an ended session from the index"""
+        self.track(session_id, ())
+        with self._lock:
+            self._pending.pop(session_id, None)
+
+    def refresh(self, session_id, state):
+        """
+        Reprices the cart of a session with its pending prices (state is updated
+        in place). Returns the version to pass to track() after the turn.
+        """
+        version = self.version
+        if session_id not in self._pending:
+            return version
+        with self._lock:
+            prices = self._pending.pop(session_id, None)
+        if prices:
+            cart, repriced = Cart(state.get("cart_items", ())).reprice(prices)
+            state["cart_items"] = cart
+            with self._lock:
+                self.stats["carts_repriced"] += bool(repriced)
+                self.stats["lines_repriced"] += len(repriced)
+            if repriced:
+                print(
+                    f"[INFO] Cart repriced: "
+                    f"{', '.join(item.describe() for item in repriced)}"
+                )
+        return version
+
+    def apply(self, product_types, brands, prices):
+        """
+        Sets new catalog prices of SKUs (given as parallel sequences) and queues
+        the changed cart prices for the sessions holding them.
+
+        Returns:
+            dict: {"rows": catalog rows updated, "skus": SKUs whose cart price
+                  changed, "sessions": sessions with a cart to reprice}
+        """
+        with self._lock:  # One update at a time; tools read the old column or the new
+            changed, rows = update_catalog_prices(
+                data_loader.data, product_types, brands, prices
+            )
+            if rows:
+                get_catalog_index().invalidate("product_price")
+            if changed:
+                self.version += 1
+            sessions = set()
+            for sku, price in changed.items():
+                self._prices[sku] = (self.version, price)
+                for session_id in self._sessions.get(sku, ()):
+                    self._pending.setdefault(session_id, {})[sku] = price
+                    sessions.add(session_id)
+            self.stats["updates"] += 1
+            self.stats["rows"] += rows
+            self.stats["skus"] += len(changed)
+            self.stats["sessions"] += len(sessions)
+        print(
+            f"[INFO] Prices updated: {rows} rows, {len(changed)} SKUs, "
+            f"{len(sessions)} carts to reprice"
+        )
+        return {"rows": rows, "skus": len(changed), "sessions": len(sessions)}
+
+    def usage(self):
+        """Indexed sessions and SKUs, pending carts and the counters"""
+        with self._lock:
+            return {
+                "indexed_sessions": len(self._skus),
+                "indexed_skus": len(self._sessions),
+                "pending_sessions": len(self._pending),
+                **self.stats,
+            }
+
+
+cart_repricer = CartRepricer()
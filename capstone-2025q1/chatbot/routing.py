@@ -0,0 +1,138 @@
+"""
+Tiered model routing for the chatbot
+"""
+
+import threading
+import time
+from collections import Counter, defaultdict
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+
+def current_turn(messages):
+    """Returns the messages after the last user message"""
+    for i in range(len(messages) - 1, -1, -1):
+        if isinstance(messages[i], HumanMessage):
+            return messages[i + 1 :]
+    return messages
+
+
+def escalation_reason(response, messages):
+    """
+    Returns why a response of a lighter model should be redone by a stronger one
+    (None if it can be kept).
+    """
+    if getattr(response, "invalid_tool_calls", None):
+        return "invalid_tool_call"
+    tool_calls = getattr(response, "tool_calls", None) or []
+    if len(tool_calls) > 1:
+        return "multi_tool"
+    if any(call.get("name") == "fallback" for call in tool_calls):
+        return "fallback"
+    if not tool_calls and not any(
+        isinstance(m, ToolMessage) for m in current_turn(messages)
+    ):
+        # Answers must come from tools; a plain first answer is a weak plan
+        return "no_tool_call"
+    return None
+
+
+class ModelRouter:
+    """
+    Routes each model call of a turn to the cheapest tier that can handle it.
+
+    Tiers are ordered from the lightest to the strongest model. A call starts on
+    the lightest tier unless the tool selection was not confident, or the turn
+    was already escalated (later calls of the turn stay on the tier that
+    planned it). A lighter tier's response is redone on the next tier when it is
+    an invalid or multi-tool plan, a fallback, or a plain answer where a tool
+    call was expected (see escalation_reason), or when the call fails.
+
+    Every call records its tier, latency and token usage; every decision is
+    counted by reason, and responses carry their tier in response_metadata.
+    """
+
+    def __init__(self, tiers):
+        self.tiers = list(tiers)
+        self._lock = threading.Lock()
+        self.routes = Counter()  # initial tier reasons
+        self.escalations = Counter()  # escalation reasons
+        self.latency_ms = defaultdict(list)
+        self.tokens = defaultdict(lambda: {"input": 0, "output": 0})
+
+    @property
+    def strongest(self):
+        return self.tiers[-1]
+
+    def initial_tier(self, messages, confident=True):
+        """Returns (tier, reason) for the first call of a model step"""
+        for message in reversed(current_turn(messages)):
+            if isinstance(message, AIMessage):
+                tier = message.response_metadata.get("model_tier")
+                if tier in self.tiers:
+                    return tier, "turn_tier"
+                break
+        if not confident:
+            return self.strongest, "low_confidence"
+        return self.tiers[0], "default"
+
+    def invoke(self, messages, call, confident=True):
+        """
+        Calls call(tier) -> response on the routed tier, escalating as needed.
+        """
+        tier, reason = self.initial_tier(messages, confident)
+        self._count(self.routes, reason)
+        index = self.tiers.index(tier)
+        while True:
+            tier = self.tiers[index]
+            start = time.perf_counter()
+            try:
+                response = call(tier)
+            except TimeoutError:
+                raise  # The turn is out of time; a stronger model will not help
+            except Exception as e:
+                if tier == self.strongest:
+                    raise
+                reason = "error"
+                print(f"[WARNING] Model tier '{tier}' failed ({e}); escalating.")
+            else:
+                self._record(tier, start, response)
+                reason = None
+                if tier != self.strongest:
+                    reason = escalation_reason(response, messages)
+                if reason is None:
+                    response.response_metadata["model_tier"] = tier
+                    print(f"[INFO] Model tier '{tier}' answered")
+                    return response
+            print(f"[INFO] Escalating from model tier '{tier}' ({reason})")
+            self._count(self.escalations, reason)
+            index += 1
+
+    def summary(self):
+        """Calls, mean latency and tokens per tier, plus the routing counters"""
+        with self._lock:
+            tiers = {
+                tier: {
+                    "calls": len(samples),
+                    "mean_ms": round(sum(samples) / len(samples), 3),
+                    "input_tokens": self.tokens[tier]["input"],
+                    "output_tokens": self.tokens[tier]["output"],
+                }
+                for tier, samples in self.latency_ms.items()
+            }
+            return {
+                "tiers": tiers,
+                "routes": dict(self.routes),
+                "escalations": dict(self.escalations),
+            }
+
+    def _record(self, tier, start, response):
+        usage = getattr(response, "usage_metadata", None) or {}
+        with self._lock:
+            self.latency_ms[tier].append((time.perf_counter() - start) * 1000)
+            self.tokens[tier]["input"] += usage.get("input_tokens", 0)
+            self.tokens[tier]["output"] += usage.get("output_tokens", 0)
+
+    def _count(self, counter, reason):
+        with self._lock:
+            counter[reason] += 1
@@ -0,0 +1,275 @@
+"""
+Session store for the chatbot
+"""
+
+import hashlib
+import io
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import types
+import zlib
+from collections import OrderedDict
+
+from chatbot.configs import (
+    SESSION_IDLE_TTL_SECONDS,
+    SESSION_MEMORY_MB,
+    SESSION_SPILL_DIR,
+)
+
+_LEAVES = (str, bytes, int, float, complex, bool, type(None))
+_SKIPPED = (
+    type,
+    types.ModuleType,
+    types.FunctionType,
+    types.BuiltinFunctionType,
+    types.MethodType,
+)
+
+
+def deep_size(obj, seen=None):
+    """
+    Bytes of obj and of the objects it references (container items, instance
+    __dict__ and __slots__), each counted once. Objects whose id is in seen are
+    not counted; the ids of the counted objects are added to seen.
+    """
+    seen = set() if seen is None else seen
+    size = 0
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, _SKIPPED):
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        if isinstance(obj, _LEAVES):
+            continue
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        else:
+            attributes = getattr(obj, "__dict__", None)
+            if attributes is not None:
+                stack.append(attributes)
+            for cls in type(obj).__mro__:
+                slots = cls.__dict__.get("__slots__", ())
+                for name in (slots,) if isinstance(slots, str) else slots:
+                    if name not in ("__dict__", "__weakref__"):
+                        stack.append(getattr(obj, name, None))
+    return size
+
+
+class _Session:
+    __slots__ = ("state", "history", "bytes", "used")
+
+    def __init__(self, state, history):
+        self.state = state
+        self.history = history
+        self.bytes = 0
+        self.used = time.monotonic()
+
+
+class SessionStore:
+    """
+    Sessions of the chatbot (graph state and conversation history) kept within a
+    memory budget.
+
+    - get() returns the state and history of a session, created with factory
+      (e.g. chatbot.main.new_session) the first time; put() stores them back
+      after a turn and measures the bytes of the session (deep_size).
+    - While the resident sessions take more than budget_bytes, the least
+      recently used ones are spilled to the disk store: pickled and compressed,
+      one file per session. Sessions idle for more than ttl seconds are spilled
+      as well (by put(), get() and sweep()). A spilled session is loaded back by
+      its next get().
+    - The objects of shared (e.g. the system prompt and the welcome message) are
+      counted in no session and pickled by reference: a loaded session uses
+      them instead of its own copy.
+
+    The turns of one session must run in order (one thread at a time per
+    session); different sessions can be used from different threads.
+    """
+
+    def __init__(
+        self,
+        factory,
+        budget_bytes=None,
+        ttl=SESSION_IDLE_TTL_SECONDS,
+        directory=SESSION_SPILL_DIR,
+        shared=(),
+        compression=1,
+    ):
+        if budget_bytes is None:
+            budget_bytes = int(SESSION_MEMORY_MB * 2**20)
+        self.factory = factory
+        self.budget_bytes = budget_bytes  # 0 = no budget
+        self.ttl = ttl  # 0 = no idle limit
+        self.directory = directory  # None = a temporary directory, on first spill
+        self.compression = compression
+        self.shared = tuple(shared)
+        self._shared_ids = {id(obj): i for i, obj in enumerate(self.shared)}
+        self._lock = threading.Lock()
+        self._resident = OrderedDict()  # session id -> _Session, least recent first
+        self._spilled = {}  # session id -> bytes on disk
+        self._temporary = directory is None
+        self.resident_bytes = 0
+        self.stats = {
+            "created": 0,
+            "loaded": 0,
+            "evicted": 0,  # spilled over the budget
+            "expired": 0,  # spilled after ttl
+            "dropped": 0,
+        }
+
+    def get(self, session_id):
+        """Returns (state, history) of a session (loaded or created when needed)"""
+        with self._lock:
+            entry = self._resident.get(session_id)
+            if entry is not None:
+                self._resident.move_to_end(session_id)
+                entry.used = time.monotonic()
+                return entry.state, entry.history
+            if session_id in self._spilled:
+                entry = _Session(*self._load(session_id))
+                self.stats["loaded"] += 1
+            else:
+                entry = _Session(*self.factory())
+                self.stats["created"] += 1
+            self._resident[session_id] = entry
+            self._measure(entry)
+            self._evict(keep=session_id)
+            return entry.state, entry.history
+
+    def put(self, session_id, state, history):
+        """Stores the state and history of a session after a turn"""
+        with self._lock:
+            entry = self._resident.get(session_id)
+            if entry is None:
+                if self._spilled.pop(session_id, None) is not None:
+                    self._remove(session_id)  # Replaced by the given state
+                entry = self._resident[session_id] = _Session(state, history)
+            else:
+                self._resident.move_to_end(session_id)
+                entry.state, entry.history = state, history
+                entry.used = time.monotonic()
+            self._measure(entry)
+            self._evict(keep=session_id)
+
+    def drop(self, session_id):
+        """Forgets a session (in memory and on disk)"""
+        with self._lock:
+            entry = self._resident.pop(session_id, None)
+            if entry is not None:
+                self.resident_bytes -= entry.bytes
+                self.stats["dropped"] += 1
+            elif self._spilled.pop(session_id, None) is not None:
+                self._remove(session_id)
+                self.stats["dropped"] += 1
+
+    def sweep(self):
+        """Spills the sessions idle for more than ttl seconds"""
+        with self._lock:
+            self._evict()
+
+    def session_bytes(self, session_id):
+        """Measured bytes of a resident session (None when it is not resident)"""
+        with self._lock:
+            entry = self._resident.get(session_id)
+            return entry.bytes if entry is not None else None
+
+    def usage(self):
+        """Resident and spilled sessions, their bytes, and the counters"""
+        with self._lock:
+            return {
+                "resident_sessions": len(self._resident),
+                "resident_bytes": self.resident_bytes,
+                "budget_bytes": self.budget_bytes,
+                "spilled_sessions": len(self._spilled),
+                "spilled_bytes": sum(self._spilled.values()),
+                **self.stats,
+            }
+
+    def close(self):
+        """Forgets every session and removes the files of the store"""
+        with self._lock:
+            for session_id in list(self._spilled):
+                self._remove(session_id)
+            self._resident.clear()
+            self._spilled.clear()
+            self.resident_bytes = 0
+            if self._temporary and self.directory:
+                shutil.rmtree(self.directory, ignore_errors=True)
+                self.directory = None
+
+    def __len__(self):
+        with self._lock:
+            return len(self._resident) + len(self._spilled)
+
+    def _measure(self, entry):
+        """Updates the bytes of a session"""
+        seen = set(self._shared_ids)
+        size = deep_size(entry.state, seen) + deep_size(entry.history, seen)
+        self.resident_bytes += size - entry.bytes
+        entry.bytes = size
+
+    def _evict(self, keep=None):
+        """Spills least recently used sessions while over budget or idle too long"""
+        now = time.monotonic()
+        while self._resident:
+            session_id, entry = next(iter(self._resident.items()))
+            if session_id == keep:
+                break  # Only the session in use is left
+            if self.ttl > 0 and now - entry.used > self.ttl:
+                self.stats["expired"] += 1
+            elif 0 < self.budget_bytes < self.resident_bytes:
+                self.stats["evicted"] += 1
+            else:
+                break
+            self._spill(session_id, entry)
+
+    def _spill(self, session_id, entry):
+        buffer = io.BytesIO()
+        pickler = pickle.Pickler(buffer, pickle.HIGHEST_PROTOCOL)
+        pickler.persistent_id = self._persistent_id
+        pickler.dump((entry.state, entry.history))
+        data = zlib.compress(buffer.getbuffer(), self.compression)
+        if self.directory is None:
+            self.directory = tempfile.mkdtemp(prefix="chatbot-sessions-")
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(session_id)
+        with open(path + ".tmp", "wb") as f:
+            f.write(data)
+        os.replace(path + ".tmp", path)
+        del self._resident[session_id]
+        self.resident_bytes -= entry.bytes
+        self._spilled[session_id] = len(data)
+
+    def _load(self, session_id):
+        path = self._path(session_id)
+        with open(path, "rb") as f:
+            data = zlib.decompress(f.read())
+        unpickler = pickle.Unpickler(io.BytesIO(data))
+        unpickler.persistent_load = self.shared.__getitem__
+        state, history = unpickler.load()
+        del self._spilled[session_id]
+        os.remove(path)
+        return state, history
+
+    def _remove(self, session_id):
+        try:
+            os.remove(self._path(session_id))
+        except OSError:
+            pass
+
+    def _persistent_id(self, obj):
+        return self._shared_ids.get(id(obj))
+
+    def _path(self, session_id):
+        name = hashlib.sha1(str(session_id).encode()).hexdigest()
+        return os.path.join(self.directory, f"{name}.session")
@@ -2,11 +2,13 @@
 State for the chatbot
 """
 
-from typing import TypedDict, Annotated, List, Optional, Dict, Any
+from typing import TypedDict, Annotated, Dict, List, Optional
 
 from langchain_core.messages import BaseMessage
 from langgraph.graph.message import add_messages
 
+from chatbot.cart import Cart
+
 
 # Define the state for the chatbot
 class State(TypedDict):
@@ -22,7 +24,15 @@ class State(TypedDict):
     product_price: Optional[float]  # Product price
 
     # Shopping cart
-    cart_items: List[Dict[str, Any]]  # List of items in the cart
+    cart_items: Cart  # Immutable cart (tuple of CartItem)
 
     # Transaction status
     finished: Optional[bool]  # Whether the transaction is complete
+    order_id: Optional[int]  # Last order placed (see chatbot/orders.py)
+    checkout_key: Optional[str]  # Random key of the next order of the cart
+
+    # Time budget
+    turn_deadline: Optional[float]  # time.monotonic() deadline of the current turn
+
+    # Prompt tokens of the current turn, per component (see chatbot/prompt_budget.py)
+    token_usage: Optional[Dict[str, int]]
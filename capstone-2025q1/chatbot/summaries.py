@@ -0,0 +1,78 @@
+"""
+Precomputed catalog summaries for the chatbot
+"""
+
+import numpy as np
+import pandas as pd
+
+from chatbot import data_loader
+from chatbot.query import get_catalog_index
+
+
+class CatalogSummary:
+    """
+    Per-category summaries materialized once per catalog.
+
+    All values come from one grouping of the rows by lowercase category
+    (shared with the catalog index), so the greeting, the product listing and
+    the welcome message no longer filter or sort the catalog on every call.
+    """
+
+    def __init__(self, index, categories):
+        self.index = index
+        self.version = index.version
+        self.categories = list(categories)  # Same order as available_categories
+        self.category_list_text = ", ".join(self.categories)
+        self.category_counts = {}
+        self.products_by_category = {}
+        self.product_listing = []  # (category, product type), paged by the tools
+        self.top_rated = {}
+
+        frame = index.frame
+        groups = index.key_positions("category_type") if not frame.empty else {}
+        ratings = index.values("product_rating") if groups else None
+        product_types = frame["product_type"].to_numpy() if groups else None
+        for category in self.categories:
+            positions = groups.get(category.lower())
+            if positions is None or not len(positions):
+                continue
+            self.category_counts[category] = len(positions)
+            self.products_by_category[category] = pd.unique(
+                product_types[positions]
+            ).tolist()
+            self.product_listing += [
+                (category, product)
+                for product in self.products_by_category[category]
+            ]
+            # Highest rated product (first one in the catalog on ties)
+            category_ratings = ratings[positions]
+            if not np.isnan(category_ratings).all():
+                best = positions[np.nanargmax(category_ratings)]
+                self.top_rated[category] = data_loader.catalog_records(
+                    frame.iloc[[best]]
+                )[0]
+
+    def featured_products(self, n=3):
+        """Returns the top-rated product of each of the first n categories"""
+        return [
+            dict(self.top_rated[category])
+            for category in self.categories[:n]
+            if category in self.top_rated
+        ]
+
+
+_catalog_summary = None
+
+
+def get_catalog_summary():
+    """Returns the summary of the loaded catalog (rebuilt when the catalog changes)"""
+    global _catalog_summary
+    index = get_catalog_index()
+    if (
+        _catalog_summary is None
+        or _catalog_summary.index is not index
+        or _catalog_summary.version != index.version  # e.g. prices updated
+    ):
+        print("[INFO] Building catalog summaries")
+        _catalog_summary = CatalogSummary(index, data_loader.available_categories)
+    return _catalog_summary
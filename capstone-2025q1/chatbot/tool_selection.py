@@ -0,0 +1,273 @@
+"""
+Per-turn tool selection for the chatbot
+"""
+
+import json
+import math
+import re
+import threading
+from collections import Counter, OrderedDict
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from chatbot.query import get_catalog_index
+
+# Extra vocabulary per tool: how users phrase the requests the tool answers
+TOOL_KEYWORDS = {
+    "search_category_by_type": "category section aisle veggies fruit vegetable dairy meat snack __category__",
+    "search_category_by_type_all": "categories all list kinds sections what sell",
+    "search_ingredient_by_brand": "brand brands have sell available is there find __product__ __brand__",
+    "search_ingredient_by_type_all": "all products everything list items catalog whole",
+    "search_ingredient_by_rating": "rating rated stars best quality higher above __product__ __category__",
+    "search_ingredient_by_price": "price cost cheap under below budget less than dollar __price__ __product__",
+    "search_ingredient_by_review": "reviews reviewed popular lots many most __category__",
+    "search_multiple_ingredients": "and both multiple several together __product__",
+    "search_catalog": "cheap highly rated lots reviews under over between sorted filter brands __category__ __price__ __product__ __brand__",
+    "compare_ingredient_by_rating": "compare comparison versus vs which better best rating rated __product__",
+    "compare_ingredient_by_price": "compare comparison versus vs which cheapest cheaper expensive price __product__",
+    "compare_ingredient_by_review": "compare comparison versus vs which most reviewed popular __product__",
+    "view_cart": "cart basket view check contents inside",
+    "add_to_cart": "add put buy want get order cart basket one two __number__ __product__ __brand__",
+    "remove_from_cart": "remove delete drop take out cart basket __product__",
+    "modify_cart": "change make update set quantity instead cart __number__ __product__",
+    "clear_cart": "clear empty reset start over cart basket everything",
+    "checkout": "checkout check out pay place order purchase done finish",
+    "help": "help how use guide what can you do",
+    "greeting": "hello hi hey morning evening greetings",
+    "fallback": "joke weather news recipe history story",
+}
+
+STOP_WORDS = frozenset(
+    "a an the i me you your to of for in on at is are do does can could would "
+    "please some any it its this that with from be my have has show what".split()
+)
+
+TOOL_SELECTION_CACHE_SIZE = 128  # distinct bound subsets kept
+TOOL_SELECTION_CONTEXT_WEIGHT = 0.3  # of a recently called tool name, per word
+
+# General search tools, bound with any cart or compare tool (which need the exact
+# product and brand) and whenever no search tool was selected
+SEARCH_TOOLS = ("search_catalog", "search_ingredient_by_brand")
+
+# Tools bound whenever the cart holds items ("remove those", "two more of it")
+CART_TOOLS = (
+    "view_cart",
+    "add_to_cart",
+    "remove_from_cart",
+    "modify_cart",
+    "clear_cart",
+    "checkout",
+)
+
+
+def tokenize(text):
+    """Lowercase word tokens with a naive plural stemmer"""
+    tokens = []
+    for word in re.findall(r"[a-z0-9_$']+", str(text).lower()):
+        if word in STOP_WORDS:
+            continue
+        if len(word) > 3 and word.endswith("ies"):
+            word = word[:-3] + "y"
+        elif len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        tokens.append(word)
+    return tokens
+
+
+def tool_description(tool):
+    """Returns the summary of a tool docstring (without Args/Returns sections)"""
+    summary = re.split(r"\n\s*(?:Args|Returns):", tool.description or "")[0]
+    return f"{tool.name.replace('_', ' ')} {summary.replace('_', ' ')}"
+
+
+def tool_group(name):
+    """Returns the group of a tool: search, compare, cart or support"""
+    if name.endswith("_cart"):
+        return "cart"
+    prefix = name.split("_")[0]
+    return prefix if prefix in ("search", "compare") else "support"
+
+
+def recent_tool_names(messages):
+    """Names of the tools called since the previous user message (last two turns)"""
+    humans = [i for i, m in enumerate(messages) if isinstance(m, HumanMessage)]
+    start = humans[-2] if len(humans) > 1 else 0
+    return [
+        call["name"]
+        for m in messages[start:]
+        if isinstance(m, AIMessage)
+        for call in m.tool_calls
+    ]
+
+
+def schema_tokens(schemas):
+    """Rough token size of a list of tool declarations (about 4 characters per token)"""
+    return len(json.dumps(schemas)) // 4
+
+
+class ToolSelector:
+    """
+    Picks the tools relevant to a user message and binds only those to the model.
+
+    - Each tool is described by its name, docstring summary and TOOL_KEYWORDS;
+      the user message is scored against them with TF-IDF cosine similarity.
+      Product, brand and category names of the catalog map to marker tokens,
+      so "is there FreshFarm carrot?" still scores the product tools.
+    - Follow-ups ("add two of those", "the cheaper one") name no product:
+      the names of the tools called in the current and previous turn are
+      scored with the message, and the cart tools are kept while the cart
+      holds items.
+    - The top_k best tools above min_score are bound, plus the always-bound
+      tools. When nothing scores above min_score, all tools are bound.
+    - A selection with a cart or compare tool, or without any search tool,
+      also binds the general search tools: "I want to buy 2 apples" needs a
+      brand lookup before add_to_cart.
+    - Every tool is converted to its schema once, and every bound subset is
+      cached (LRU), so a turn never repeats the schema conversion.
+    """
+
+    def __init__(self, llm, tools, top_k=4, min_score=0.1, always=("fallback",)):
+        self.llm = llm
+        self.tools = list(tools)
+        self.names = [tool.name for tool in self.tools]
+        self.top_k = top_k
+        self.min_score = min_score
+        self.always = [name for name in always if name in self.names]
+        self.schemas = {tool.name: convert_to_openai_tool(tool) for tool in self.tools}
+        self._bound = OrderedDict()  # (model id, names) -> bound runnable
+        self._lock = threading.Lock()
+        self._catalog_terms = None
+        self._catalog_index = None
+        self._build_vectors()
+
+    def _build_vectors(self):
+        documents = {
+            tool.name: Counter(
+                tokenize(tool_description(tool))
+                + tokenize(TOOL_KEYWORDS.get(tool.name, ""))
+            )
+            for tool in self.tools
+        }
+        n = len(documents)
+        frequency = Counter(term for doc in documents.values() for term in doc)
+        self.idf = {
+            term: math.log((1 + n) / (1 + df)) + 1 for term, df in frequency.items()
+        }
+        self.vectors = {name: self._normalize(doc) for name, doc in documents.items()}
+
+    def _normalize(self, counts):
+        vector = {
+            term: count * self.idf[term]
+            for term, count in counts.items()
+            if term in self.idf
+        }
+        norm = math.sqrt(sum(w * w for w in vector.values()))
+        return {term: w / norm for term, w in vector.items()} if norm else {}
+
+    def _catalog_markers(self):
+        """Returns {word: marker token} for the words of the loaded catalog"""
+        index = get_catalog_index()
+        if self._catalog_index is not index:
+            terms = {}
+            for column, marker in (
+                ("category_type", "__category__"),
+                ("product_brand", "__brand__"),
+                ("product_type", "__product__"),
+            ):
+                if column in index.frame.columns:
+                    for key in index.keys(column):
+                        for word in tokenize(key):
+                            terms.setdefault(word, marker)
+            self._catalog_terms, self._catalog_index = terms, index
+        return self._catalog_terms
+
+    def message_tokens(self, text):
+        """Tokens of a user message, plus catalog / number / price markers"""
+        tokens = tokenize(text)
+        markers = self._catalog_markers()
+        extra = []
+        for token in tokens:
+            if token in markers:
+                extra.append(markers[token])
+            elif token.startswith("$"):
+                extra.append("__price__")
+            elif token.isdigit():
+                extra.append("__number__")
+        return tokens + extra
+
+    def scores(self, text, context=()):
+        """
+        Returns {tool name: similarity} for a user message, scored with the
+        names of the recently called tools (context)
+        """
+        counts = Counter(self.message_tokens(text))
+        for name in context:  # Weighed below the words of the message
+            for token in tokenize(name.replace("_", " ")):
+                counts[token] += TOOL_SELECTION_CONTEXT_WEIGHT
+        query = self._normalize(counts)
+        return {
+            name: sum(w * vector.get(term, 0.0) for term, w in query.items())
+            for name, vector in self.vectors.items()
+        }
+
+    def select(self, text, context=(), keep=()):
+        """
+        Returns the names of the tools to bind for a user message (context: the
+        recently called tools; keep: tools bound whatever the scores)
+        """
+        scores = self.scores(text, context)
+        ranked = [
+            name
+            for name in sorted(self.names, key=lambda name: -scores[name])
+            if scores[name] >= self.min_score
+        ]
+        if not ranked:
+            return list(self.names)  # Not confident: offer every tool
+        # The best tool of every matching group first (e.g. "put the cheapest milk
+        # in my cart" needs a comparison and a cart tool), then the best overall
+        selected = []
+        for name in ranked:
+            if tool_group(name) not in map(tool_group, selected):
+                selected.append(name)
+        selected = selected[: self.top_k]
+        selected += [name for name in ranked if name not in selected][
+            : self.top_k - len(selected)
+        ]
+        groups = set(map(tool_group, selected))
+        if groups & {"cart", "compare"} or "search" not in groups:
+            keep = [*SEARCH_TOOLS, *keep]
+        extra = [name for name in keep if name in self.names] + self.always
+        return selected + [
+            name for name in dict.fromkeys(extra) if name not in selected
+        ]
+
+    def bind(self, names, llm=None):
+        """Returns the model (default: self.llm) bound to the given tools, cached"""
+        model = llm or self.llm
+        key = (id(model), tuple(sorted(names)))
+        with self._lock:
+            if key in self._bound:
+                self._bound.move_to_end(key)
+                return self._bound[key]
+        bound = model.bind_tools([self.schemas[name] for name in key[1]])
+        with self._lock:
+            self._bound[key] = bound
+            while len(self._bound) > TOOL_SELECTION_CACHE_SIZE:
+                self._bound.popitem(last=False)
+        return bound
+
+    def select_messages(self, messages, cart_items=None):
+        """
+        Returns the tool names for the current user turn of a conversation (and
+        the cart in the state)
+        """
+        text = next(
+            (m.content for m in reversed(messages) if isinstance(m, HumanMessage)), ""
+        )
+        keep = CART_TOOLS if cart_items else ()
+        return self.select(text, recent_tool_names(messages), keep)
+
+    def is_confident(self, names):
+        """False when a selection fell back to every tool"""
+        return len(names) < len(self.names)
@@ -6,14 +6,77 @@ from langchain_core.tools import tool
 from langchain_core.messages import ToolMessage
 
 from typing import List, Dict, Any
-from thefuzz import process
 import traceback
 
 from chatbot.data_loader import available_categories, data
-from chatbot.configs import FUZZY_SCORE_THRESHOLD
+from chatbot.fuzzy import fuzzy_matcher
+from chatbot.query import (
+    CatalogQuery,
+    decode_cursor,
+    encode_cursor,
+    get_catalog_index,
+    query_fingerprint,
+)
+from chatbot.summaries import get_catalog_summary
+from chatbot.configs import (
+    FUZZY_SCORE_THRESHOLD,
+    LISTING_DEFAULT_LIMIT,
+    LISTING_MAX_LIMIT,
+    SEARCH_DEFAULT_LIMIT,
+    SEARCH_MAX_LIMIT,
+)
 from chatbot.state import State
 
 
+# --- Result Pages ---
+def _page_limit(limit, default=SEARCH_DEFAULT_LIMIT, maximum=SEARCH_MAX_LIMIT):
+    """Clamps a requested page size to 1..maximum"""
+    try:
+        return min(max(int(limit), 1), maximum)
+    except (ValueError, TypeError):
+        print("[WARNING] Invalid limit. Using default value.")
+        return default
+
+
+def _paginate(query, limit, cursor, fingerprint):
+    """
+    Limits a query to one page, resuming after the cursor of the previous page.
+    Raises ValueError for a cursor of another search.
+    """
+    query = query.limit(_page_limit(limit))
+    if cursor:
+        query = query.after(*decode_cursor(cursor, fingerprint))
+    return query
+
+
+def _page_info(query, fingerprint):
+    """Total matches and the cursor of the next page (if any) of a query page"""
+    page = {"total": query.total()}
+    next_cursor = query.cursor(fingerprint)
+    if next_cursor:
+        page["next_cursor"] = next_cursor
+    return page
+
+
+def _product_query(query, product_type):
+    """
+    Narrows a query to a product type, matched exactly (case-insensitive) or by
+    fuzzy matching. Returns None when no product type matches.
+    """
+    product_type_lower = product_type.strip().lower()
+    product_query = query.where("product_type", product_type_lower)
+    if product_query.count():
+        return product_query
+    result = fuzzy_matcher.extract_column(
+        product_type_lower, query.index, "product_type"
+    )
+    if result and result[1] >= FUZZY_SCORE_THRESHOLD:
+        matched_product = query.index.label("product_type", result[0])
+        print(f"[INFO] Using fuzzy matched product: {matched_product}")
+        return query.where("product_type", result[0])
+    return None
+
+
 # --- Category Search Tools ---
 @tool
 def search_category_by_type(category_type: str) -> dict:
@@ -55,7 +118,7 @@ def search_category_by_type(category_type: str) -> dict:
             }
 
         # Search for similar categories
-        result = process.extractOne(query, available_categories)
+        result = fuzzy_matcher.extract_one(query, available_categories)
 
         if result:
             best_match, score = result
@@ -193,18 +256,26 @@ def search_multiple_ingredients(product_names: List[str]) -> dict:
 
 
 @tool
-def search_ingredient_by_type_all() -> dict:
+def search_ingredient_by_type_all(
+    limit: int = LISTING_DEFAULT_LIMIT, cursor: str = None
+) -> dict:
     """
     Retrieves and returns the list of all available products across all categories.
     Use this tool when the user asks for all available products or ingredients.
 
+    Args:
+        limit (int, optional): The maximum number of products to return (default 100, at most 500).
+        cursor (str, optional): The 'next_cursor' of a previous result, to get the next products.
+
     Returns:
         dict: A dictionary containing the result.
-              On success: {'status': 'success', 'products': {'XXXXX': ['aaaaa', 'bbbbb'], 'YYYYY': ['ccccc', 'ddddd'], ...}}
+              On success: {'status': 'success', 'products_by_category': {'XXXXX': ['aaaaa', 'bbbbb'], 'YYYYY': ['ccccc', 'ddddd'], ...}, 'total': number of products, 'next_cursor': '...' (only when more products remain)}
               On failure: {'status': 'not_found', 'message': 'No products available.'}
               On error: {'status': 'error', 'message': 'Error message'}
     """
-    print(f"\n[INFO] Executing tool: search_ingredient_by_type_all")
+    print(
+        f"\n[INFO] Executing tool: search_ingredient_by_type_all (Limit: {limit}, Cursor: {cursor})"
+    )
     try:
         if data is None or data.empty:
             print("[ERROR] Data is not available. Cannot perform search.")
@@ -213,23 +284,38 @@ def search_ingredient_by_type_all() -> dict:
                 "message": "Product data could not be loaded or is empty.",
             }
 
-        # Group products by category
-        result = {}
-        for category in available_categories:
-            category_filter = data["category_type"].str.lower() == category.lower()
-            filtered_data = data[category_filter]
-            if not filtered_data.empty:
-                result[category] = filtered_data["product_type"].unique().tolist()
+        # Products by category are precomputed once per catalog
+        summary = get_catalog_summary()
+        listing = summary.product_listing
 
-        if not result:
+        if not listing:
             print("[INFO] No products available.")
             return {
                 "status": "not_found",
                 "message": "No products are available at the moment.",
             }
 
+        # One page of the listing; the cursor stores where the page ended
+        fingerprint = query_fingerprint(
+            "search_ingredient_by_type_all", len(listing), summary.version
+        )
+        limit = _page_limit(limit, LISTING_DEFAULT_LIMIT, LISTING_MAX_LIMIT)
+        start = 0
+        if cursor:
+            try:
+                (start,) = decode_cursor(cursor, fingerprint)
+            except ValueError as e:
+                return {"status": "error", "message": str(e)}
+        result = {}
+        for category, product in listing[start : start + limit]:
+            result.setdefault(category, []).append(product)
+
         print(f"[INFO] Found products in {len(result)} categories")
-        return {"status": "success", "products_by_category": result}
+        page = {"status": "success", "products_by_category": result}
+        page["total"] = len(listing)
+        if start + limit < len(listing):
+            page["next_cursor"] = encode_cursor(fingerprint, start + limit)
+        return page
 
     except Exception as e:
         print(
@@ -266,43 +352,30 @@ def search_ingredient_by_brand(product_type: str, brand: str = None) -> dict:
                 "message": "Product data could not be loaded or is empty.",
             }
 
-        # Search for the product (case-insensitive)
-        product_type_lower = product_type.strip().lower()
-
-        # Filter data by product type (case-insensitive)
-        product_filter = data["product_type"].str.lower() == product_type_lower
-        filtered_data = data[product_filter]
-
-        if filtered_data.empty:
-            # Try fuzzy matching for product type
-            all_products = data["product_type"].unique().tolist()
-            result = process.extractOne(
-                product_type_lower, [p.lower() for p in all_products]
-            )
-            if result and result[1] >= FUZZY_SCORE_THRESHOLD:
-                matched_product = all_products[
-                    [p.lower() for p in all_products].index(result[0])
-                ]
-                product_filter = data["product_type"] == matched_product
-                filtered_data = data[product_filter]
-                print(f"[INFO] Using fuzzy matched product: {matched_product}")
-            else:
-                print(f"[INFO] Product not found: {product_type}")
-                return {
-                    "status": "not_found",
-                    "message": f"Product '{product_type}' not found in our database.",
-                }
+        # Filter by product type (case-insensitive, from the key index)
+        index = get_catalog_index()
+        query = _product_query(CatalogQuery(index), product_type)
+        if query is None:
+            print(f"[INFO] Product not found: {product_type}")
+            return {
+                "status": "not_found",
+                "message": f"Product '{product_type}' not found in our database.",
+            }
 
         # If brand is specified, filter by brand as well
         if brand:
             brand_lower = brand.strip().lower()
-            brand_filter = filtered_data["product_brand"].str.lower() == brand_lower
-            brand_filtered_data = filtered_data[brand_filter]
+            brand_query = query.where("product_brand", brand_lower)
 
-            if brand_filtered_data.empty:
+            if not brand_query.count():
                 # Try fuzzy matching for brand
-                available_brands = filtered_data["product_brand"].unique().tolist()
-                result = process.extractOne(
+                available_brands = (
+                    index.frame["product_brand"]
+                    .iloc[query.positions()]
+                    .unique()
+                    .tolist()
+                )
+                result = fuzzy_matcher.extract_one(
                     brand_lower, [b.lower() for b in available_brands]
                 )
                 if result:
@@ -311,8 +384,7 @@ def search_ingredient_by_brand(product_type: str, brand: str = None) -> dict:
                         matched_brand = available_brands[
                             [b.lower() for b in available_brands].index(best_match)
                         ]
-                        brand_filter = filtered_data["product_brand"] == matched_brand
-                        brand_filtered_data = filtered_data[brand_filter]
+                        brand_query = query.where("product_brand", best_match)
                         print(f"[INFO] Using fuzzy matched brand: {matched_brand}")
                     else:
                         print(
@@ -334,12 +406,12 @@ def search_ingredient_by_brand(product_type: str, brand: str = None) -> dict:
                     }
 
             # Return the specific product details
-            product_data = brand_filtered_data.iloc[0].to_dict()
+            product_data = brand_query.limit(1).records()[0]
             print(f"[INFO] Found product: {product_type} from brand {brand}")
             return {"status": "success", "product": product_data}
         else:
             # Return all brands for this product
-            brands = filtered_data["product_brand"].tolist()
+            brands = index.frame["product_brand"].iloc[query.positions()].tolist()
             print(f"[INFO] Found {len(brands)} brands for product {product_type}")
             return {"status": "success", "product_type": product_type, "brands": brands}
 
@@ -351,7 +423,12 @@ def search_ingredient_by_brand(product_type: str, brand: str = None) -> dict:
 
 
 @tool
-def search_ingredient_by_rating(product_type: str, min_rating: float = 0.0) -> dict:
+def search_ingredient_by_rating(
+    product_type: str,
+    min_rating: float = 0.0,
+    limit: int = SEARCH_DEFAULT_LIMIT,
+    cursor: str = None,
+) -> dict:
     """
     Searches for ingredients by product type and minimum rating.
     Use this tool when the user asks about products with a specific rating or wants to find high-rated products.
@@ -359,15 +436,17 @@ def search_ingredient_by_rating(product_type: str, min_rating: float = 0.0) -> d
     Args:
         product_type (str): The product type to search for (e.g., 'Carrot', 'Milk', 'Chicken Breast').
         min_rating (float, optional): The minimum rating to filter by (0.0-5.0). Default is 0.0 (no filtering).
+        limit (int, optional): The maximum number of products to return (default 10, at most 50).
+        cursor (str, optional): The 'next_cursor' of a previous result, to get the next products.
 
     Returns:
         dict: A dictionary containing the search results.
-              On success: {'status': 'success', 'products': [list of product details]}
+              On success: {'status': 'success', 'products': [list of product details], 'total': number of matches, 'next_cursor': '...' (only when more products remain)}
               On failure: {'status': 'not_found', 'message': 'No products found matching these criteria.'}
               On error: {'status': 'error', 'message': 'Error message'}
     """
     print(
-        f"\n[INFO] Executing tool: search_ingredient_by_rating (Product: {product_type}, Min Rating: {min_rating})"
+        f"\n[INFO] Executing tool: search_ingredient_by_rating (Product: {product_type}, Min Rating: {min_rating}, Limit: {limit}, Cursor: {cursor})"
     )
     try:
         if data is None or data.empty:
@@ -387,53 +466,50 @@ def search_ingredient_by_rating(product_type: str, min_rating: float = 0.0) -> d
             min_rating = 0.0  # Reset to default if conversion fails
             print("[WARNING] Invalid rating value. Using default value 0.0.")
 
-        # Search for the product (case-insensitive)
-        product_type_lower = product_type.strip().lower()
-
-        # Filter data by product type (case-insensitive)
-        product_filter = data["product_type"].str.lower() == product_type_lower
-        filtered_data = data[product_filter]
-
-        if filtered_data.empty:
-            # Try fuzzy matching for product type
-            all_products = data["product_type"].unique().tolist()
-            result = process.extractOne(
-                product_type_lower, [p.lower() for p in all_products]
-            )
-            if result and result[1] >= FUZZY_SCORE_THRESHOLD:
-                matched_product = all_products[
-                    [p.lower() for p in all_products].index(result[0])
-                ]
-                product_filter = data["product_type"] == matched_product
-                filtered_data = data[product_filter]
-                print(f"[INFO] Using fuzzy matched product: {matched_product}")
-            else:
-                print(f"[INFO] Product not found: {product_type}")
-                return {
-                    "status": "not_found",
-                    "message": f"Product '{product_type}' not found in our database.",
-                }
+        # Filter by product type (case-insensitive, from the key index)
+        index = get_catalog_index()
+        query = _product_query(CatalogQuery(index), product_type)
+        if query is None:
+            print(f"[INFO] Product not found: {product_type}")
+            return {
+                "status": "not_found",
+                "message": f"Product '{product_type}' not found in our database.",
+            }
 
         # Filter by minimum rating
         if min_rating > 0:
-            rating_filter = filtered_data["product_rating"].astype(float) >= min_rating
-            filtered_data = filtered_data[rating_filter]
+            query = query.at_least("product_rating", min_rating)
 
-        if filtered_data.empty:
+        if not query.count():
             print(f"[INFO] No products found with rating >= {min_rating}")
             return {
                 "status": "not_found",
                 "message": f"No {product_type} products found with rating {min_rating} or higher.",
             }
 
-        # Sort by rating (highest first)
-        filtered_data = filtered_data.sort_values(by="product_rating", ascending=False)
+        # Highest rated first: one page selected without sorting every match
+        query = query.order_by("product_rating", ascending=False)
+        fingerprint = query_fingerprint(
+            "search_ingredient_by_rating",
+            product_type,
+            min_rating,
+            len(index),
+            index.version,  # Cursors of a reordered catalog are not valid anymore
+        )
+        try:
+            query = _paginate(query, limit, cursor, fingerprint)
+        except ValueError as e:
+            return {"status": "error", "message": str(e)}
 
-        # Convert to list of dictionaries
-        products = filtered_data.to_dict("records")
-        print(f"[INFO] Found {len(products)} products matching criteria")
+        # Materialize only the rows of the page as a list of dictionaries
+        products = query.records()
+        print(f"[INFO] Found {query.total()} products, returning {len(products)}")
 
-        return {"status": "success", "products": products}
+        return {
+            "status": "success",
+            "products": products,
+            **_page_info(query, fingerprint),
+        }
 
     except Exception as e:
         print(
@@ -443,7 +519,12 @@ def search_ingredient_by_rating(product_type: str, min_rating: float = 0.0) -> d
 
 
 @tool
-def search_ingredient_by_price(product_type: str, max_price: float = None) -> dict:
+def search_ingredient_by_price(
+    product_type: str,
+    max_price: float = None,
+    limit: int = SEARCH_DEFAULT_LIMIT,
+    cursor: str = None,
+) -> dict:
     """
     Searches for ingredients by product type and maximum price.
     Use this tool when the user asks about products within a specific price range or wants to know the price of a product.
@@ -451,15 +532,17 @@ def search_ingredient_by_price(product_type: str, max_price: float = None) -> di
     Args:
         product_type (str): The product type to search for (e.g., 'Carrot', 'Milk', 'Chicken Breast').
         max_price (float, optional): The maximum price to filter by. If not provided, all prices are shown.
+        limit (int, optional): The maximum number of products to return (default 10, at most 50).
+        cursor (str, optional): The 'next_cursor' of a previous result, to get the next products.
 
     Returns:
         dict: A dictionary containing the search results.
-              On success: {'status': 'success', 'products': [list of product details]}
+              On success: {'status': 'success', 'products': [list of product details], 'total': number of matches, 'next_cursor': '...' (only when more products remain)}
               On failure: {'status': 'not_found', 'message': 'No products found matching these criteria.'}
               On error: {'status': 'error', 'message': 'Error message'}
     """
     print(
-        f"\n[INFO] Executing tool: search_ingredient_by_price (Product: {product_type}, Max Price: {max_price})"
+        f"\n[INFO] Executing tool: search_ingredient_by_price (Product: {product_type}, Max Price: {max_price}, Limit: {limit}, Cursor: {cursor})"
     )
     try:
         if data is None or data.empty:
@@ -480,53 +563,50 @@ def search_ingredient_by_price(product_type: str, max_price: float = None) -> di
                 max_price = None  # Reset to default if conversion fails
                 print("[WARNING] Invalid price value. Showing all prices.")
 
-        # Search for the product (case-insensitive)
-        product_type_lower = product_type.strip().lower()
-
-        # Filter data by product type (case-insensitive)
-        product_filter = data["product_type"].str.lower() == product_type_lower
-        filtered_data = data[product_filter]
-
-        if filtered_data.empty:
-            # Try fuzzy matching for product type
-            all_products = data["product_type"].unique().tolist()
-            result = process.extractOne(
-                product_type_lower, [p.lower() for p in all_products]
-            )
-            if result and result[1] >= FUZZY_SCORE_THRESHOLD:
-                matched_product = all_products[
-                    [p.lower() for p in all_products].index(result[0])
-                ]
-                product_filter = data["product_type"] == matched_product
-                filtered_data = data[product_filter]
-                print(f"[INFO] Using fuzzy matched product: {matched_product}")
-            else:
-                print(f"[INFO] Product not found: {product_type}")
-                return {
-                    "status": "not_found",
-                    "message": f"Product '{product_type}' not found in our database.",
-                }
+        # Filter by product type (case-insensitive, from the key index)
+        index = get_catalog_index()
+        query = _product_query(CatalogQuery(index), product_type)
+        if query is None:
+            print(f"[INFO] Product not found: {product_type}")
+            return {
+                "status": "not_found",
+                "message": f"Product '{product_type}' not found in our database.",
+            }
 
         # Filter by maximum price
         if max_price is not None:
-            price_filter = filtered_data["product_price"].astype(float) <= max_price
-            filtered_data = filtered_data[price_filter]
+            query = query.at_most("product_price", max_price)
 
-        if filtered_data.empty:
+        if not query.count():
             print(f"[INFO] No products found with price <= {max_price}")
             return {
                 "status": "not_found",
                 "message": f"No {product_type} products found with price {max_price} or lower.",
             }
 
-        # Sort by price (lowest first)
-        filtered_data = filtered_data.sort_values(by="product_price", ascending=True)
+        # Cheapest first: one page selected without sorting every match
+        query = query.order_by("product_price", ascending=True)
+        fingerprint = query_fingerprint(
+            "search_ingredient_by_price",
+            product_type,
+            max_price,
+            len(index),
+            index.version,  # Cursors of a reordered catalog are not valid anymore
+        )
+        try:
+            query = _paginate(query, limit, cursor, fingerprint)
+        except ValueError as e:
+            return {"status": "error", "message": str(e)}
 
-        # Convert to list of dictionaries
-        products = filtered_data.to_dict("records")
-        print(f"[INFO] Found {len(products)} products matching criteria")
+        # Materialize only the rows of the page as a list of dictionaries
+        products = query.records()
+        print(f"[INFO] Found {query.total()} products, returning {len(products)}")
 
-        return {"status": "success", "products": products}
+        return {
+            "status": "success",
+            "products": products,
+            **_page_info(query, fingerprint),
+        }
 
     except Exception as e:
         print(
@@ -537,7 +617,11 @@ def search_ingredient_by_price(product_type: str, max_price: float = None) -> di
 
 @tool
 def search_ingredient_by_review(
-    product_type: str = None, min_reviews: int = 0, category_type: str = None
+    product_type: str = None,
+    min_reviews: int = 0,
+    category_type: str = None,
+    limit: int = SEARCH_DEFAULT_LIMIT,
+    cursor: str = None,
 ) -> dict:
     """
     Searches for ingredients by minimum review count or finds products with the most reviews.
@@ -547,15 +631,17 @@ def search_ingredient_by_review(
         product_type (str, optional): The specific product type to search for. If None, will search across all products.
         min_reviews (int, optional): The minimum number of reviews to filter by. Default is 0 (no filtering).
         category_type (str, optional): The category to search within. If provided, narrows the search to this category.
+        limit (int, optional): The maximum number of products to return (default 10, at most 50).
+        cursor (str, optional): The 'next_cursor' of a previous result, to get the next products.
 
     Returns:
         dict: A dictionary containing the search results.
-              On success: {'status': 'success', 'products': [list of product details]}
+              On success: {'status': 'success', 'products': [list of product details], 'total': number of matches, 'next_cursor': '...' (only when more products remain)}
               On failure: {'status': 'not_found', 'message': 'No products found matching these criteria.'}
               On error: {'status': 'error', 'message': 'Error message'}
     """
     print(
-        f"\n[INFO] Executing tool: search_ingredient_by_review (Product: {product_type}, Min Reviews: {min_reviews}, Category: {category_type})"
+        f"\n[INFO] Executing tool: search_ingredient_by_review (Product: {product_type}, Min Reviews: {min_reviews}, Category: {category_type}, Limit: {limit}, Cursor: {cursor})"
     )
     try:
         if data is None or data.empty:
@@ -575,29 +661,23 @@ def search_ingredient_by_review(
             min_reviews = 0  # Reset to default if conversion fails
             print("[WARNING] Invalid review count. Using default value 0.")
 
-        # Start with all data
-        filtered_data = data.copy()
+        # Build a lazy query over the catalog (no copy, evaluated at the end)
+        index = get_catalog_index()
+        query = CatalogQuery(index)
 
         # Filter by product_type if specified
         if product_type:
             product_type_lower = product_type.strip().lower()
-            product_filter = (
-                filtered_data["product_type"].str.lower() == product_type_lower
-            )
-            product_filtered_data = filtered_data[product_filter]
+            product_query = query.where("product_type", product_type_lower)
 
-            if product_filtered_data.empty:
+            if not product_query.count():
                 # Try fuzzy matching for product type
-                all_products = data["product_type"].unique().tolist()
-                result = process.extractOne(
-                    product_type_lower, [p.lower() for p in all_products]
+                result = fuzzy_matcher.extract_column(
+                    product_type_lower, index, "product_type"
                 )
                 if result and result[1] >= FUZZY_SCORE_THRESHOLD:
-                    matched_product = all_products[
-                        [p.lower() for p in all_products].index(result[0])
-                    ]
-                    product_filter = filtered_data["product_type"] == matched_product
-                    product_filtered_data = filtered_data[product_filter]
+                    product_query = query.where("product_type", result[0])
+                    matched_product = index.label("product_type", result[0])
                     print(f"[INFO] Using fuzzy matched product: {matched_product}")
                 else:
                     print(f"[INFO] Product not found: {product_type}")
@@ -606,7 +686,7 @@ def search_ingredient_by_review(
                         "message": f"Product '{product_type}' not found in our database.",
                     }
 
-            filtered_data = product_filtered_data
+            query = product_query
 
         # Filter by category if specified
         if category_type:
@@ -615,7 +695,7 @@ def search_ingredient_by_review(
             # Check if the category exists
             if category_type_lower not in [cat.lower() for cat in available_categories]:
                 # Try fuzzy matching
-                result = process.extractOne(
+                result = fuzzy_matcher.extract_one(
                     category_type_lower, [cat.lower() for cat in available_categories]
                 )
                 if result and result[1] >= FUZZY_SCORE_THRESHOLD:
@@ -629,12 +709,9 @@ def search_ingredient_by_review(
                     }
 
             # Filter by the category
-            category_filter = (
-                filtered_data["category_type"].str.lower() == category_type_lower
-            )
-            filtered_data = filtered_data[category_filter]
+            query = query.where("category_type", category_type_lower)
 
-            if filtered_data.empty:
+            if not query.count():
                 print(f"[INFO] No products found in category: {category_type}")
                 return {
                     "status": "not_found",
@@ -643,24 +720,39 @@ def search_ingredient_by_review(
 
         # Filter by minimum review count
         if min_reviews > 0:
-            review_filter = filtered_data["product_review"].astype(int) >= min_reviews
-            filtered_data = filtered_data[review_filter]
+            query = query.at_least("product_review", min_reviews)
+
+        # Top reviewed first: one page selected without sorting every match
+        query = query.order_by("product_review", ascending=False)
+        fingerprint = query_fingerprint(
+            "search_ingredient_by_review",
+            product_type,
+            category_type,
+            min_reviews,
+            len(index),
+            index.version,  # Cursors of a reordered catalog are not valid anymore
+        )
+        try:
+            query = _paginate(query, limit, cursor, fingerprint)
+        except ValueError as e:
+            return {"status": "error", "message": str(e)}
 
-        if filtered_data.empty:
+        if not query.total():
             print(f"[INFO] No products found with review count >= {min_reviews}")
             return {
                 "status": "not_found",
                 "message": f"No products found with review count {min_reviews} or higher.",
             }
 
-        # Sort by review count (highest first)
-        filtered_data = filtered_data.sort_values(by="product_review", ascending=False)
-
-        # Convert to list of dictionaries
-        products = filtered_data.to_dict("records")
-        print(f"[INFO] Found {len(products)} products matching criteria")
+        # Materialize only the rows of the page as a list of dictionaries
+        products = query.records()
+        print(f"[INFO] Found {query.total()} products, returning {len(products)}")
 
-        return {"status": "success", "products": products}
+        return {
+            "status": "success",
+            "products": products,
+            **_page_info(query, fingerprint),
+        }
 
     except Exception as e:
         print(
@@ -669,24 +761,252 @@ def search_ingredient_by_review(
         return {"status": "error", "message": str(e)}
 
 
+# Sort keys of search_catalog: column and default direction (ascending)
+SEARCH_SORT_KEYS = {
+    "price": ("product_price", True),
+    "rating": ("product_rating", False),
+    "reviews": ("product_review", False),
+}
+
+# Range arguments of search_catalog: column and operator
+SEARCH_RANGES = {
+    "min_price": ("product_price", ">="),
+    "max_price": ("product_price", "<="),
+    "min_rating": ("product_rating", ">="),
+    "max_rating": ("product_rating", "<="),
+    "min_reviews": ("product_review", ">="),
+    "max_reviews": ("product_review", "<="),
+}
+
+
+def _match_keys(index, column, values, choices=None):
+    """
+    Returns the lowercase catalog value of a column matching each value exactly or
+    by fuzzy matching (against choices, default: every value of the column), or
+    None when nothing scores above the threshold. Misspelled values are matched
+    in one batch.
+    """
+    keys = [str(value).strip().lower() for value in values]
+    missing = [key for key in keys if not len(index.positions(column, key))]
+    matches = {}
+    if missing:
+        if choices is None:
+            results = fuzzy_matcher.extract_many(missing, index=index, column=column)
+        else:
+            if callable(choices):
+                choices = choices()
+            results = fuzzy_matcher.extract_many(missing, choices)
+        for key, result in zip(missing, results):
+            matches[key] = None
+            if result and result[1] >= FUZZY_SCORE_THRESHOLD:
+                print(f"[INFO] Using fuzzy matched {column}: {result[0]}")
+                matches[key] = result[0]
+    return [matches.get(key, key) for key in keys]
+
+
+@tool
+def search_catalog(
+    category_type: str = None,
+    product_type: str = None,
+    brands: List[str] = None,
+    min_price: float = None,
+    max_price: float = None,
+    min_rating: float = None,
+    max_rating: float = None,
+    min_reviews: int = None,
+    max_reviews: int = None,
+    sort_by: str = None,
+    descending: bool = None,
+    limit: int = SEARCH_DEFAULT_LIMIT,
+    cursor: str = None,
+) -> dict:
+    """
+    Searches the catalog with several conditions at once in a single call.
+    Use this tool when the user combines conditions, e.g. "cheap, highly rated dairy with lots of reviews"
+    or "FreshFarm or GreenLeaf carrots under $3 sorted by rating", instead of chaining other search tools.
+    Every argument is optional; only the given conditions are applied.
+
+    Args:
+        category_type (str, optional): The category to search within (e.g., 'Dairy', 'Vegetables').
+        product_type (str, optional): The product type to search for (e.g., 'Carrot', 'Milk').
+        brands (List[str], optional): Brand names to keep (any of them).
+        min_price (float, optional): The minimum price.
+        max_price (float, optional): The maximum price.
+        min_rating (float, optional): The minimum rating (0.0-5.0).
+        max_rating (float, optional): The maximum rating (0.0-5.0).
+        min_reviews (int, optional): The minimum number of reviews.
+        max_reviews (int, optional): The maximum number of reviews.
+        sort_by (str, optional): 'price' (lowest first), 'rating' or 'reviews' (highest first).
+        descending (bool, optional): Reverses the default direction of sort_by.
+        limit (int, optional): The maximum number of products to return (default 10, at most 50).
+        cursor (str, optional): The 'next_cursor' of a previous result, to get the next products.
+
+    Returns:
+        dict: A dictionary containing the search results.
+              On success: {'status': 'success', 'products': [list of product details], 'total': number of matches, 'next_cursor': '...' (only when more products remain)}
+              On failure: {'status': 'not_found', 'message': 'No products found matching these criteria.'}
+              On error: {'status': 'error', 'message': 'Error message'}
+    """
+    print(
+        f"\n[INFO] Executing tool: search_catalog (Category: {category_type}, Product: {product_type}, Brands: {brands}, "
+        f"Price: {min_price}-{max_price}, Rating: {min_rating}-{max_rating}, Reviews: {min_reviews}-{max_reviews}, "
+        f"Sort: {sort_by}, Limit: {limit}, Cursor: {cursor})"
+    )
+    try:
+        if data is None or data.empty:
+            print("[ERROR] Data is not available. Cannot perform search.")
+            return {
+                "status": "error",
+                "message": "Product data could not be loaded or is empty.",
+            }
+
+        # Build one lazy query: equality facets from the key index, then the
+        # ranges on the surviving rows, then a partial top-k sort
+        index = get_catalog_index()
+        query = CatalogQuery(index)
+
+        for column, value, label in (
+            ("category_type", category_type, "Category"),
+            ("product_type", product_type, "Product"),
+        ):
+            if not value:
+                continue
+            (key,) = _match_keys(index, column, [value])
+            if key is None:
+                print(f"[INFO] {label} not found: {value}")
+                return {
+                    "status": "not_found",
+                    "message": f"{label} '{value}' not found in our database.",
+                }
+            query = query.where(column, key)
+
+        unmatched_brands = []
+        if brands:
+            if isinstance(brands, str):
+                brands = [brands]
+            # Misspelled brands are matched among the brands of the rows found so far
+            scope = query if category_type or product_type else None
+            choices = None
+            if scope is not None:
+                choices = lambda: sorted(
+                    set(
+                        index.frame["product_brand"]
+                        .iloc[scope.positions()]
+                        .str.lower()
+                    )
+                )
+            keys = []
+            for brand, key in zip(
+                brands, _match_keys(index, "product_brand", brands, choices)
+            ):
+                if key is None:
+                    unmatched_brands.append(brand)
+                else:
+                    keys.append(key)
+            if not keys:
+                print(f"[INFO] Brands not found: {brands}")
+                return {
+                    "status": "not_found",
+                    "message": f"Brands {brands} not found in our database.",
+                }
+            query = query.where_any("product_brand", keys)
+
+        bounds = {
+            "min_price": min_price,
+            "max_price": max_price,
+            "min_rating": min_rating,
+            "max_rating": max_rating,
+            "min_reviews": min_reviews,
+            "max_reviews": max_reviews,
+        }
+        for name, bound in bounds.items():
+            if bound is None:
+                continue
+            column, op = SEARCH_RANGES[name]
+            bound = float(bound)
+            query = (
+                query.at_least(column, bound)
+                if op == ">="
+                else query.at_most(column, bound)
+            )
+
+        if sort_by:
+            sort_key = str(sort_by).strip().lower()
+            if sort_key not in SEARCH_SORT_KEYS:
+                return {
+                    "status": "error",
+                    "message": f"Invalid sort_by '{sort_by}'. Use one of {list(SEARCH_SORT_KEYS)}.",
+                }
+            column, ascending = SEARCH_SORT_KEYS[sort_key]
+            if descending is not None:
+                ascending = not descending
+            query = query.order_by(column, ascending=ascending)
+
+        # One page of results, resumed after the previous page (if any)
+        fingerprint = query_fingerprint(
+            "search_catalog",
+            category_type,
+            product_type,
+            brands,
+            bounds,
+            sort_by,
+            descending,
+            len(index),
+            index.version,  # Cursors of a reordered catalog are not valid anymore
+        )
+        try:
+            query = _paginate(query, limit, cursor, fingerprint)
+        except ValueError as e:
+            return {"status": "error", "message": str(e)}
+
+        if not query.total():
+            print("[INFO] No products found matching criteria")
+            return {
+                "status": "not_found",
+                "message": "No products found matching these criteria.",
+            }
+
+        # Materialize only the requested page of rows
+        products = query.records()
+        print(f"[INFO] Found {query.total()} products, returning {len(products)}")
+        result = {
+            "status": "success",
+            "products": products,
+            **_page_info(query, fingerprint),
+        }
+        if unmatched_brands:
+            result["unmatched_brands"] = unmatched_brands
+        return result
+
+    except Exception as e:
+        print(
+            f"[ERROR] Exception during search_catalog execution - {e}\n{traceback.format_exc()}"
+        )
+        return {"status": "error", "message": str(e)}
+
+
 # --- Ingredient Comparison Tools ---
 @tool
-def compare_ingredient_by_rating(product_type: str) -> dict:
+def compare_ingredient_by_rating(
+    product_type: str, limit: int = SEARCH_DEFAULT_LIMIT, cursor: str = None
+) -> dict:
     """
     Compares different brands of a product by their ratings.
     Use this tool when the user wants to compare different options for a product based on ratings.
 
     Args:
         product_type (str): The product type to compare (e.g., 'Carrot', 'Milk', 'Chicken Breast').
+        limit (int, optional): The maximum number of products to return (default 10, at most 50).
+        cursor (str, optional): The 'next_cursor' of a previous result, to get the next products.
 
     Returns:
         dict: A dictionary containing the comparison results.
-              On success: {'status': 'success', 'comparisons': [list of products sorted by rating]}
+              On success: {'status': 'success', 'comparisons': [list of products sorted by rating], 'total': number of matches, 'next_cursor': '...' (only when more products remain)}
               On failure: {'status': 'not_found', 'message': 'No products found for comparison.'}
               On error: {'status': 'error', 'message': 'Error message'}
     """
     print(
-        f"\n[INFO] Executing tool: compare_ingredient_by_rating (Product: {product_type})"
+        f"\n[INFO] Executing tool: compare_ingredient_by_rating (Product: {product_type}, Limit: {limit}, Cursor: {cursor})"
     )
     try:
         if data is None or data.empty:
@@ -696,48 +1016,48 @@ def compare_ingredient_by_rating(product_type: str) -> dict:
                 "message": "Product data could not be loaded or is empty.",
             }
 
-        # Search for the product (case-insensitive)
-        product_type_lower = product_type.strip().lower()
-
-        # Filter data by product type (case-insensitive)
-        product_filter = data["product_type"].str.lower() == product_type_lower
-        filtered_data = data[product_filter]
-
-        if filtered_data.empty:
-            # Try fuzzy matching for product type
-            all_products = data["product_type"].unique().tolist()
-            result = process.extractOne(
-                product_type_lower, [p.lower() for p in all_products]
-            )
-            if result and result[1] >= FUZZY_SCORE_THRESHOLD:
-                matched_product = all_products[
-                    [p.lower() for p in all_products].index(result[0])
-                ]
-                product_filter = data["product_type"] == matched_product
-                filtered_data = data[product_filter]
-                print(f"[INFO] Using fuzzy matched product: {matched_product}")
-            else:
-                print(f"[INFO] Product not found: {product_type}")
-                return {
-                    "status": "not_found",
-                    "message": f"Product '{product_type}' not found in our database.",
-                }
+        # Filter by product type (case-insensitive, from the key index)
+        index = get_catalog_index()
+        query = _product_query(CatalogQuery(index), product_type)
+        if query is None:
+            print(f"[INFO] Product not found: {product_type}")
+            return {
+                "status": "not_found",
+                "message": f"Product '{product_type}' not found in our database.",
+            }
 
-        if len(filtered_data) < 2:
+        if query.count() < 2:
             print(f"[INFO] Not enough products for comparison: {product_type}")
             return {
                 "status": "not_found",
                 "message": f"Not enough {product_type} products for comparison.",
             }
 
-        # Sort by rating (highest first)
-        filtered_data = filtered_data.sort_values(by="product_rating", ascending=False)
+        # Highest rated first: one page selected without sorting every match
+        query = query.order_by("product_rating", ascending=False)
+        fingerprint = query_fingerprint(
+            "compare_ingredient_by_rating",
+            product_type,
+            len(index),
+            index.version,  # Cursors of a reordered catalog are not valid anymore
+        )
+        try:
+            query = _paginate(query, limit, cursor, fingerprint)
+        except ValueError as e:
+            return {"status": "error", "message": str(e)}
 
-        # Convert to list of dictionaries
-        comparisons = filtered_data.to_dict("records")
-        print(f"[INFO] Compared {len(comparisons)} products by rating")
+        # Materialize only the rows of the page as a list of dictionaries
+        comparisons = query.records()
+        print(
+            f"[INFO] Compared {query.total()} products by rating, returning {len(comparisons)}"
+        )
 
-        return {"status": "success", "metric": "rating", "comparisons": comparisons}
+        return {
+            "status": "success",
+            "metric": "rating",
+            "comparisons": comparisons,
+            **_page_info(query, fingerprint),
+        }
 
     except Exception as e:
         print(
@@ -747,22 +1067,26 @@ def compare_ingredient_by_rating(product_type: str) -> dict:
 
 
 @tool
-def compare_ingredient_by_price(product_type: str) -> dict:
+def compare_ingredient_by_price(
+    product_type: str, limit: int = SEARCH_DEFAULT_LIMIT, cursor: str = None
+) -> dict:
     """
     Compares different brands of a product by their prices.
     Use this tool when the user wants to compare different options for a product based on prices.
 
     Args:
         product_type (str): The product type to compare (e.g., 'Carrot', 'Milk', 'Chicken Breast').
+        limit (int, optional): The maximum number of products to return (default 10, at most 50).
+        cursor (str, optional): The 'next_cursor' of a previous result, to get the next products.
 
     Returns:
         dict: A dictionary containing the comparison results.
-              On success: {'status': 'success', 'comparisons': [list of products sorted by price]}
+              On success: {'status': 'success', 'comparisons': [list of products sorted by price], 'total': number of matches, 'next_cursor': '...' (only when more products remain)}
               On failure: {'status': 'not_found', 'message': 'No products found for comparison.'}
               On error: {'status': 'error', 'message': 'Error message'}
     """
     print(
-        f"\n[INFO] Executing tool: compare_ingredient_by_price (Product: {product_type})"
+        f"\n[INFO] Executing tool: compare_ingredient_by_price (Product: {product_type}, Limit: {limit}, Cursor: {cursor})"
     )
     try:
         if data is None or data.empty:
@@ -772,48 +1096,48 @@ def compare_ingredient_by_price(product_type: str) -> dict:
                 "message": "Product data could not be loaded or is empty.",
             }
 
-        # Search for the product (case-insensitive)
-        product_type_lower = product_type.strip().lower()
-
-        # Filter data by product type (case-insensitive)
-        product_filter = data["product_type"].str.lower() == product_type_lower
-        filtered_data = data[product_filter]
-
-        if filtered_data.empty:
-            # Try fuzzy matching for product type
-            all_products = data["product_type"].unique().tolist()
-            result = process.extractOne(
-                product_type_lower, [p.lower() for p in all_products]
-            )
-            if result and result[1] >= FUZZY_SCORE_THRESHOLD:
-                matched_product = all_products[
-                    [p.lower() for p in all_products].index(result[0])
-                ]
-                product_filter = data["product_type"] == matched_product
-                filtered_data = data[product_filter]
-                print(f"[INFO] Using fuzzy matched product: {matched_product}")
-            else:
-                print(f"[INFO] Product not found: {product_type}")
-                return {
-                    "status": "not_found",
-                    "message": f"Product '{product_type}' not found in our database.",
-                }
+        # Filter by product type (case-insensitive, from the key index)
+        index = get_catalog_index()
+        query = _product_query(CatalogQuery(index), product_type)
+        if query is None:
+            print(f"[INFO] Product not found: {product_type}")
+            return {
+                "status": "not_found",
+                "message": f"Product '{product_type}' not found in our database.",
+            }
 
-        if len(filtered_data) < 2:
+        if query.count() < 2:
             print(f"[INFO] Not enough products for comparison: {product_type}")
             return {
                 "status": "not_found",
                 "message": f"Not enough {product_type} products for comparison.",
             }
 
-        # Sort by price (lowest first)
-        filtered_data = filtered_data.sort_values(by="product_price", ascending=True)
+        # Cheapest first: one page selected without sorting every match
+        query = query.order_by("product_price", ascending=True)
+        fingerprint = query_fingerprint(
+            "compare_ingredient_by_price",
+            product_type,
+            len(index),
+            index.version,  # Cursors of a reordered catalog are not valid anymore
+        )
+        try:
+            query = _paginate(query, limit, cursor, fingerprint)
+        except ValueError as e:
+            return {"status": "error", "message": str(e)}
 
-        # Convert to list of dictionaries
-        comparisons = filtered_data.to_dict("records")
-        print(f"[INFO] Compared {len(comparisons)} products by price")
+        # Materialize only the rows of the page as a list of dictionaries
+        comparisons = query.records()
+        print(
+            f"[INFO] Compared {query.total()} products by price, returning {len(comparisons)}"
+        )
 
-        return {"status": "success", "metric": "price", "comparisons": comparisons}
+        return {
+            "status": "success",
+            "metric": "price",
+            "comparisons": comparisons,
+            **_page_info(query, fingerprint),
+        }
 
     except Exception as e:
         print(
@@ -823,22 +1147,26 @@ def compare_ingredient_by_price(product_type: str) -> dict:
 
 
 @tool
-def compare_ingredient_by_review(product_type: str) -> dict:
+def compare_ingredient_by_review(
+    product_type: str, limit: int = SEARCH_DEFAULT_LIMIT, cursor: str = None
+) -> dict:
     """
     Compares different brands of a product by their review counts.
     Use this tool when the user wants to compare different options for a product based on popularity.
 
     Args:
         product_type (str): The product type to compare (e.g., 'Carrot', 'Milk', 'Chicken Breast').
+        limit (int, optional): The maximum number of products to return (default 10, at most 50).
+        cursor (str, optional): The 'next_cursor' of a previous result, to get the next products.
 
     Returns:
         dict: A dictionary containing the comparison results.
-              On success: {'status': 'success', 'comparisons': [list of products sorted by review count]}
+              On success: {'status': 'success', 'comparisons': [list of products sorted by review count], 'total': number of matches, 'next_cursor': '...' (only when more products remain)}
               On failure: {'status': 'not_found', 'message': 'No products found for comparison.'}
               On error: {'status': 'error', 'message': 'Error message'}
     """
     print(
-        f"\n[INFO] Executing tool: compare_ingredient_by_review (Product: {product_type})"
+        f"\n[INFO] Executing tool: compare_ingredient_by_review (Product: {product_type}, Limit: {limit}, Cursor: {cursor})"
     )
     try:
         if data is None or data.empty:
@@ -848,51 +1176,47 @@ def compare_ingredient_by_review(product_type: str) -> dict:
                 "message": "Product data could not be loaded or is empty.",
             }
 
-        # Search for the product (case-insensitive)
-        product_type_lower = product_type.strip().lower()
-
-        # Filter data by product type (case-insensitive)
-        product_filter = data["product_type"].str.lower() == product_type_lower
-        filtered_data = data[product_filter]
-
-        if filtered_data.empty:
-            # Try fuzzy matching for product type
-            all_products = data["product_type"].unique().tolist()
-            result = process.extractOne(
-                product_type_lower, [p.lower() for p in all_products]
-            )
-            if result and result[1] >= FUZZY_SCORE_THRESHOLD:
-                matched_product = all_products[
-                    [p.lower() for p in all_products].index(result[0])
-                ]
-                product_filter = data["product_type"] == matched_product
-                filtered_data = data[product_filter]
-                print(f"[INFO] Using fuzzy matched product: {matched_product}")
-            else:
-                print(f"[INFO] Product not found: {product_type}")
-                return {
-                    "status": "not_found",
-                    "message": f"Product '{product_type}' not found in our database.",
-                }
+        # Filter by product type (case-insensitive, from the key index)
+        index = get_catalog_index()
+        query = _product_query(CatalogQuery(index), product_type)
+        if query is None:
+            print(f"[INFO] Product not found: {product_type}")
+            return {
+                "status": "not_found",
+                "message": f"Product '{product_type}' not found in our database.",
+            }
 
-        if len(filtered_data) < 2:
+        if query.count() < 2:
             print(f"[INFO] Not enough products for comparison: {product_type}")
             return {
                 "status": "not_found",
                 "message": f"Not enough {product_type} products for comparison.",
             }
 
-        # Sort by review count (highest first)
-        filtered_data = filtered_data.sort_values(by="product_review", ascending=False)
+        # Most reviewed first: one page selected without sorting every match
+        query = query.order_by("product_review", ascending=False)
+        fingerprint = query_fingerprint(
+            "compare_ingredient_by_review",
+            product_type,
+            len(index),
+            index.version,  # Cursors of a reordered catalog are not valid anymore
+        )
+        try:
+            query = _paginate(query, limit, cursor, fingerprint)
+        except ValueError as e:
+            return {"status": "error", "message": str(e)}
 
-        # Convert to list of dictionaries
-        comparisons = filtered_data.to_dict("records")
-        print(f"[INFO] Compared {len(comparisons)} products by review count")
+        # Materialize only the rows of the page as a list of dictionaries
+        comparisons = query.records()
+        print(
+            f"[INFO] Compared {query.total()} products by review count, returning {len(comparisons)}"
+        )
 
         return {
             "status": "success",
             "metric": "review count",
             "comparisons": comparisons,
+            **_page_info(query, fingerprint),
         }
 
     except Exception as e:
@@ -1019,12 +1343,15 @@ def add_to_cart(product_type: str, brand: str, quantity: int = 1) -> dict:
         product_type_lower = product_type.strip().lower()
         brand_lower = brand.strip().lower()
 
-        # Filter data by product type and brand (case-insensitive)
-        product_filter = data["product_type"].str.lower() == product_type_lower
-        brand_filter = data["product_brand"].str.lower() == brand_lower
-        filtered_data = data[product_filter & brand_filter]
+        # Filter by product type and brand (case-insensitive, from the key index)
+        query = (
+            CatalogQuery(get_catalog_index())
+            .where("product_type", product_type_lower)
+            .where("product_brand", brand_lower)
+            .limit(1)
+        )
 
-        if filtered_data.empty:
+        if not query.count():
             # Try fuzzy matching
             print(f"[INFO] Product not found: {product_type} from {brand}")
             return {
@@ -1033,7 +1360,7 @@ def add_to_cart(product_type: str, brand: str, quantity: int = 1) -> dict:
             }
 
         # Get the product details
-        product = filtered_data.iloc[0].to_dict()
+        product = query.records()[0]
 
         # Create cart item
         cart_item = {
@@ -1176,6 +1503,18 @@ def clear_cart() -> dict:
         return {"status": "error", "message": str(e)}
 
 
+@tool
+def checkout() -> dict:
+    """
+    Places the order for everything in the shopping cart. (Dummy for LLM tool-call; handled in checkout_node)
+    Use this tool when the user wants to check out, pay, or place their order.
+    """
+    return {
+        "status": "dummy",
+        "message": "checkout should be handled by checkout_node!",
+    }
+
+
 # --- Support and Miscellaneous Tools ---
 @tool
 def help() -> dict:
@@ -1202,6 +1541,7 @@ def help() -> dict:
                 "Show me all vegetables",
                 "What brands of milk do you have?",
                 "What's the cheapest brand of chicken?",
+                "Cheap, highly rated dairy with lots of reviews",
                 "Add 2 FreshFarm carrots to my cart",
                 "Show me my cart",
                 "Remove apples from my cart",
@@ -1230,21 +1570,10 @@ def greeting() -> dict:
     """
     print(f"\n[INFO] Executing tool: greeting")
     try:
-        # Get some featured products (random selection)
+        # Get some featured products (highest rated product of the first 3 categories)
         featured_products = []
         if data is not None and not data.empty:
-            # Sample products from different categories
-            for category in available_categories[:3]:  # Limit to 3 categories
-                category_filter = data["category_type"].str.lower() == category.lower()
-                category_data = data[category_filter]
-                if not category_data.empty:
-                    # Get highest rated product in this category
-                    top_product = (
-                        category_data.sort_values(by="product_rating", ascending=False)
-                        .iloc[0]
-                        .to_dict()
-                    )
-                    featured_products.append(top_product)
+            featured_products = get_catalog_summary().featured_products(n=3)
 
         greeting_info = {
             "welcome_message": "Welcome to our Online Grocery Store! How can I help you today?",
@@ -1315,6 +1644,7 @@ all_tools = [
     search_ingredient_by_rating,
     search_ingredient_by_price,
     search_ingredient_by_review,
+    search_catalog,
     # Ingredient Comparison Tools
     compare_ingredient_by_rating,
     compare_ingredient_by_price,
@@ -1325,6 +1655,7 @@ all_tools = [
     remove_from_cart,
     modify_cart,
     clear_cart,
+    checkout,
     # Support and Miscellaneous Tools
     help,
     greeting,
@@ -0,0 +1,84 @@
+"""
+Checkout: a retried checkout places one order, two sessions with the same cart
+place two, and a checkout requested with other tool calls answers all of them
+
+Usage (from capstone-2025q1):
+    python -m unittest discover tests
+"""
+
+import contextlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+DIRECTORY = tempfile.mkdtemp(prefix="chatbot-test-orders-")
+os.environ["CHATBOT_ORDERS_DB"] = os.path.join(DIRECTORY, "orders.db")
+
+with contextlib.redirect_stdout(io.StringIO()):
+    from langchain_core.messages import AIMessage
+
+    from chatbot import graph
+    from chatbot.cart import Cart, CartItem
+    from chatbot.orders import order_store
+
+
+def tearDownModule():
+    order_store.close()
+    shutil.rmtree(DIRECTORY, ignore_errors=True)
+
+
+def checkout(state, session_id, call_id, others=()):
+    """Runs the checkout node for a state; returns (result, state update)"""
+    calls = [{"name": "checkout", "args": {}, "id": call_id}, *others]
+    message = AIMessage(content="", tool_calls=calls)
+    state = dict(state, messages=[message], turn_deadline=time.monotonic() + 30)
+    with contextlib.redirect_stdout(io.StringIO()):
+        config = {"configurable": {"session_id": session_id}}
+        update = graph.checkout_node(state, config)
+    return json.loads(update["messages"][0].content), update
+
+
+class CheckoutTest(unittest.TestCase):
+    def setUp(self):
+        self.cart = Cart([CartItem("Carrot", "FreshFarm", 2.99, 3)])
+
+    def test_retried_checkout_places_one_order(self):
+        state = {"cart_items": self.cart, "checkout_key": graph.new_checkout_key()}
+        first, update = checkout(state, "retry-session", "call-1")
+        # The answer was lost (e.g. the turn timed out): the model checks out again
+        again, _ = checkout(state, "retry-session", "call-2")
+        self.assertEqual(first["status"], "placed")
+        self.assertEqual(again["status"], "duplicate")
+        self.assertEqual(again["order_id"], first["order_id"])
+        self.assertIsNone(update["checkout_key"])
+        self.assertFalse(update["cart_items"])
+
+    def test_sessions_with_the_same_cart_place_two_orders(self):
+        results = [
+            checkout({"cart_items": self.cart}, None, "call-1")[0],
+            checkout({"cart_items": self.cart, "order_id": None}, None, "call-1")[0],
+        ]
+        self.assertEqual([r["status"] for r in results], ["placed", "placed"])
+        self.assertNotEqual(results[0]["order_id"], results[1]["order_id"])
+
+    def test_checkout_with_other_calls_answers_every_call(self):
+        add = {"name": "add_to_cart", "args": {"product_type": "Milk"}, "id": "add"}
+        calls = [add, {"name": "checkout", "args": {}, "id": "c"}]
+        message = AIMessage(content="", tool_calls=calls)
+        with contextlib.redirect_stdout(io.StringIO()):
+            route = graph.should_call_tool({"messages": [message]})
+        self.assertEqual(route, "call_checkout")
+        state = {"cart_items": self.cart}
+        result, update = checkout(state, "mixed-session", "call-1", [add])
+        answered = [m.tool_call_id for m in update["messages"]]
+        self.assertEqual(result["status"], "skipped")
+        self.assertEqual(answered, ["call-1", "add"])
+        self.assertNotIn("order_id", update)
+
+
+if __name__ == "__main__":
+    unittest.main()